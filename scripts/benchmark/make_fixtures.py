@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Regenerate the benchmark fixture corpus under scripts/benchmark/fixtures.
+
+The corpus is checked in; this script only exists so it can be rebuilt (or grown)
+deterministically. It writes:
+- serp/<slug>.json   Custom Search responses (links are "/pages/<file>" paths that
+                     the stand-in server rewrites to its own address)
+- pages/<file>       article HTML of varied size and messiness, plus a few
+                     non-HTML and broken entries
+- manifest.json      per-page status, content type and artificial delay
+"""
+
+import json
+import os
+import random
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+TOPICS = {
+    'plumber sydney': ['plumber', 'plumbing', 'hot water', 'blocked drain', 'gas fitting',
+                       'leak detection', 'emergency plumber', 'pipe relining', 'bathroom renovation',
+                       'licensed plumber', 'sydney', 'water heater', 'call out fee'],
+    'solar panels melbourne': ['solar panels', 'solar inverter', 'battery storage', 'feed in tariff',
+                               'rooftop solar', 'installation cost', 'melbourne', 'solar rebate',
+                               'energy bills', 'panel efficiency', 'grid connection', 'kilowatt hours'],
+    'dentist perth': ['dentist', 'dental clinic', 'teeth whitening', 'root canal', 'dental implants',
+                      'check up', 'perth', 'emergency dentist', 'health fund', 'orthodontics',
+                      'gum disease', 'family dentist'],
+}
+
+FILLER = ('the a and of to in for with on at by from our your this that is are can will '
+          'more most best local quality service services team customers price prices quote '
+          'free fast reliable experienced professional affordable trusted available today '
+          'year years work home business area areas job jobs help need needs call contact').split()
+
+NAV_TEXT = ['Home', 'About Us', 'Services', 'Contact', 'Blog', 'Menu Close Close Menu',
+            'Skip to content', 'Toggle navigation', 'keyboard_arrow_left Back to previous menu']
+
+
+def sentence(rng, topic_terms, length):
+    words = []
+    for _ in range(length):
+        words.append(rng.choice(topic_terms) if rng.random() < 0.25 else rng.choice(FILLER))
+    text = ' '.join(words)
+    return text[0].upper() + text[1:] + rng.choice(['.', '.', '.', '!', '?'])
+
+
+def paragraph(rng, topic_terms, sentences):
+    return ' '.join(sentence(rng, topic_terms, rng.randint(8, 22)) for _ in range(sentences))
+
+
+def clean_article(rng, query, terms, paragraphs):
+    parts = [
+        '<!DOCTYPE html><html lang="en"><head><meta charset="utf-8">',
+        f'<title>{query.title()} | Guide</title></head><body>',
+        '<header><nav><ul>' + ''.join(f'<li><a href="#">{t}</a></li>' for t in NAV_TEXT) + '</ul></nav></header>',
+        f'<main><article><h1>{query.title()}: {rng.choice(terms).title()} Guide</h1>',
+    ]
+    for i in range(paragraphs):
+        if i % 4 == 0:
+            parts.append(f'<h2>{rng.choice(terms).title()} and {rng.choice(terms)}</h2>')
+        if i % 7 == 3:
+            parts.append(f'<h3>How much does {rng.choice(terms)} cost?</h3>')
+        parts.append(f'<p>{paragraph(rng, terms, rng.randint(3, 7))}</p>')
+    parts.append('</article></main><footer><p>Copyright. All rights reserved.</p></footer></body></html>')
+    return '\n'.join(parts)
+
+
+def messy_article(rng, query, terms, paragraphs):
+    """Tag soup: unclosed tags, inline scripts/styles, comments, deep nesting, junk attributes."""
+    parts = [
+        '<html><head><title>' + query.upper(),
+        '<style>' + ' '.join(f'.c{i}{{color:#{i:06x}}}' for i in range(200)) + '</style>',
+        '<script>var tracking = ' + json.dumps({'k': [rng.random() for _ in range(50)]}) + ';</script>',
+        '</head><body class="menu sidebar">',
+        '<div id="nav-menu">' + ' | '.join(NAV_TEXT) + '</div>',
+        '<!-- ' + 'comment ' * 100 + '-->',
+    ]
+    depth = 0
+    for i in range(paragraphs):
+        if i % 5 == 0:
+            parts.append(f'<H2 class=title>{rng.choice(terms).title()} {rng.choice(FILLER)}')
+        if rng.random() < 0.3:
+            parts.append('<div><div><span>')
+            depth += 1
+        if rng.random() < 0.15:
+            parts.append(f'<script>document.write("{rng.choice(FILLER)}");</script>')
+        parts.append(f'<p style="x">{paragraph(rng, terms, rng.randint(2, 6))}')
+        if rng.random() < 0.2:
+            parts.append('<table><tr><td>' + '<td>'.join(rng.choice(terms) for _ in range(6)))
+        if rng.random() < 0.1:
+            parts.append(f'<h3>{rng.choice(terms)} &amp; {rng.choice(terms)} &nbsp;&copy;')
+    parts.append('</span></div></div>' * (depth // 2))
+    parts.append('<div class="footer">Footer links ' + ' '.join(FILLER[:30]) + '</div></body>')
+    return '\n'.join(parts)
+
+
+def no_header_article(rng, query, terms, paragraphs):
+    body = '<br>'.join(paragraph(rng, terms, rng.randint(2, 5)) for _ in range(paragraphs))
+    return f'<html><body><div class="content">{body}</div></body></html>'
+
+
+def build():
+    rng = random.Random(20240611)
+    pages = {}
+    manifest = {}
+    serps = {}
+
+    # (suffix, builder, paragraphs, extra manifest fields)
+    layout = [
+        ('small', clean_article, 6, {}),
+        ('medium', clean_article, 60, {}),
+        ('large', clean_article, 400, {}),
+        ('messy', messy_article, 120, {}),
+        ('messy-large', messy_article, 600, {}),
+        ('noheaders', no_header_article, 40, {}),
+        ('latin1', clean_article, 30, {'charset': 'iso-8859-1'}),
+        ('slow', clean_article, 30, {'delay_ms': 150}),
+    ]
+
+    for query, terms in TOPICS.items():
+        slug = query.replace(' ', '-')
+        items = []
+        for suffix, builder, paragraphs, extra in layout:
+            name = f'{slug}-{suffix}.html'
+            html = builder(rng, query, terms, paragraphs)
+            charset = extra.get('charset', 'utf-8')
+            if charset != 'utf-8':
+                html = html.replace('<meta charset="utf-8">', f'<meta charset="{charset}">')
+                html = html.replace('Guide</h1>', 'Guïde - café</h1>')
+            pages[name] = html.encode(charset, errors='replace')
+            manifest[name] = {'status': 200, 'content_type': f'text/html; charset={charset}'}
+            manifest[name].update({k: v for k, v in extra.items() if k != 'charset'})
+            items.append((name, f'{query.title()} {suffix.replace("-", " ").title()}'))
+
+        # Broken entries: a PDF, a 404 and a 500 mixed into the ranking
+        pdf_name = f'{slug}-brochure.pdf'
+        pages[pdf_name] = b'%PDF-1.4\n' + bytes(rng.getrandbits(8) for _ in range(4000))
+        manifest[pdf_name] = {'status': 200, 'content_type': 'application/pdf'}
+        manifest[f'{slug}-missing.html'] = {'status': 404, 'content_type': 'text/html'}
+        manifest[f'{slug}-error.html'] = {'status': 500, 'content_type': 'text/html'}
+
+        # More than one CSE page worth of results; the stand-in slices by start/num
+        ranked = [items[7], (f'{slug}-missing.html', 'Missing'), items[3], (pdf_name, 'Brochure'),
+                  items[6], items[0], (f'{slug}-error.html', 'Error'), items[1], items[2], items[4],
+                  items[5]]
+        serps[slug] = {
+            'kind': 'customsearch#search',
+            'queries': {'request': [{'searchTerms': query}]},
+            'searchInformation': {'searchTime': 0.31, 'totalResults': str(rng.randint(10**5, 10**7))},
+            'items': [
+                {
+                    'title': title,
+                    'link': f'/pages/{name}',
+                    'displayLink': 'fixtures.local',
+                    'snippet': sentence(rng, terms, 24),
+                }
+                for name, title in ranked
+            ],
+        }
+
+    os.makedirs(os.path.join(FIXTURES_DIR, 'pages'), exist_ok=True)
+    os.makedirs(os.path.join(FIXTURES_DIR, 'serp'), exist_ok=True)
+    for name, body in pages.items():
+        with open(os.path.join(FIXTURES_DIR, 'pages', name), 'wb') as f:
+            f.write(body)
+    for slug, data in serps.items():
+        with open(os.path.join(FIXTURES_DIR, 'serp', f'{slug}.json'), 'w') as f:
+            json.dump(data, f, indent=1)
+    with open(os.path.join(FIXTURES_DIR, 'manifest.json'), 'w') as f:
+        json.dump({'queries': sorted(TOPICS), 'pages': manifest}, f, indent=1, sort_keys=True)
+
+
+if __name__ == '__main__':
+    build()
+    print(f'Fixtures written to {FIXTURES_DIR}')
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the stages of keyword_search.py.
+
+Starts the local stand-in (standin.py) for the Custom Search API and the article
+pages, points keyword_search.py at it and times each stage on its own:
+
+  import                  importing keyword_search in a fresh interpreter (must stay
+                          within --import-budget-ms; heavy dependencies load lazily)
+  google_search_api       one CSE call per fixture query
+  fetch_page_html         every fixture page referenced by the SERPs
+  extract_main_text       main-text extraction of every fetched HTML page
+  parse_document          parsing every fetched HTML page into headers + text
+  analyze_keywords        tokenizing, counting and header matching
+  analyze_documents       the same per scraped document, merged (process pool when large)
+  score_phrases           ranking every phrase of those documents (top 5000)
+  run_research            the whole pipeline, end to end
+
+Each stage is repeated (--repeat) and the median is reported with MB/s or tokens/s
+where it applies and the process peak RSS after the stage. Caches are disabled so
+every run does the full work.
+
+Memory is bounded separately: analyze_document() is traced (tracemalloc) on the
+largest fixture page and on the same text repeated --memory-scale times, and the
+peak allocated while streaming the bigger one may be at most --memory-ratio times
+the smaller one's.
+
+Usage:
+  python scripts/benchmark/run_benchmark.py                  # compare with baseline.json
+  python scripts/benchmark/run_benchmark.py --save-baseline  # record a new baseline
+
+The exit code is 1 when a stage is slower (or a peak RSS larger) than the baseline
+by more than --threshold, when the import takes longer than --import-budget-ms, or
+when the analysis peak memory grows past --memory-ratio.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.dirname(BENCH_DIR)
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+
+# Differences below this are treated as noise when comparing with the baseline
+NOISE_FLOOR_SECONDS = 0.005
+
+# `import keyword_search` must stay cheap: error paths and cache hits should not pay
+# for spaCy/NLTK/NumPy/trafilatura, which are loaded on first use
+IMPORT_BUDGET_MS = int(os.environ.get('KR_IMPORT_BUDGET_MS', '') or 250)
+
+# Analysis streams each document in chunks, so a page MEMORY_SCALE times larger may
+# need at most MEMORY_RATIO times the peak memory
+MEMORY_SCALE = 4
+MEMORY_RATIO = float(os.environ.get('KR_MEMORY_RATIO', '') or 1.5)
+
+sys.path.insert(0, BENCH_DIR)
+from standin import StandinServer  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (None if unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(peak / divisor, 1)
+
+
+def measure(fn, repeat):
+    """Run fn() `repeat` times; return (median seconds, min seconds, last return value)."""
+    timings = []
+    value = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        value = fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), min(timings), value
+
+
+def stage_result(seconds, best, nbytes=None, tokens=None):
+    result = {'seconds': round(seconds, 4), 'min_seconds': round(best, 4)}
+    if nbytes is not None:
+        result['bytes'] = nbytes
+        result['mb_per_s'] = round(nbytes / 1e6 / seconds, 2) if seconds > 0 else None
+    if tokens is not None:
+        result['tokens'] = tokens
+        result['tokens_per_s'] = int(tokens / seconds) if seconds > 0 else None
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def measure_import(repeat):
+    """Time `import keyword_search` in fresh interpreters (what a one-shot spawn pays)."""
+    code = (
+        'import sys, time; sys.path.insert(0, %r); t = time.perf_counter(); '
+        'import keyword_search; print(time.perf_counter() - t)' % SCRIPTS_DIR
+    )
+    timings = []
+    child_rss = None
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=os.environ)
+        if out.returncode != 0:
+            raise RuntimeError(f'import keyword_search failed: {out.stderr[-500:]}')
+        timings.append(float(out.stdout.strip().splitlines()[-1]))
+        if resource is not None:
+            # RUSAGE_CHILDREN reports the largest peak RSS among finished children
+            child_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    result = stage_result(statistics.median(timings), min(timings))
+    if child_rss is not None:
+        divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+        result['peak_rss_mb'] = round(child_rss / divisor, 1)
+    return result
+
+
+def run_stages(ks, queries, repeat):
+    stages = {}
+    search = lambda q: ks.google_search_api(query=q, api_key='bench', cx='bench', num_results=10)
+
+    # google_search_api
+    seconds, best, serps = measure(lambda: [search(q) for q in queries], repeat)
+    stages['google_search_api'] = stage_result(seconds, best)
+    urls = [r['url'] for serp in serps for r in serp.get('results', [])]
+
+    # fetch_page_html
+    seconds, best, pages = measure(lambda: [ks.fetch_page_html(url) for url in urls], repeat)
+    html_pages = [html for html in pages if html]
+    html_bytes = sum(len(html) for html in html_pages)
+    stages['fetch_page_html'] = stage_result(seconds, best, nbytes=html_bytes)
+
+    # extract_main_text
+    def extract_all():
+        ks.reset_extractor_state()
+        return [ks.extract_main_text(html) for html in html_pages]
+    seconds, best, _ = measure(extract_all, repeat)
+    stages['extract_main_text'] = stage_result(seconds, best, nbytes=html_bytes)
+
+    # parse_document
+    seconds, best, _ = measure(lambda: [ks.parse_document(html) for html in html_pages], repeat)
+    stages['parse_document'] = stage_result(seconds, best, nbytes=html_bytes)
+
+    # The results scrape_top_results would keep (already parsed) for the analysis stages
+    scraped = []
+    for serp in serps:
+        results = [dict(r) for r in serp.get('results', [])]
+        ks.reset_extractor_state()
+        ks.scrape_top_results(results, needed=3)
+        scraped.append(results)
+    scraped_bytes = sum(len(r['document'].text.encode('utf-8'))
+                        for results in scraped for r in results if r.get('document') is not None)
+    documents = [ks.extract_combined_text(results) for results in scraped]
+
+    # analyze_keywords
+    def analyze_all():
+        tokens = 0
+        for document in documents:
+            stats = {}
+            ks.analyze_keywords(document, tokenizer_stats=stats)
+            tokens += stats.get('tokens', 0)
+        return tokens
+    seconds, best, tokens = measure(analyze_all, repeat)
+    text_bytes = sum(len(document.text.encode('utf-8')) for document in documents)
+    stages['analyze_keywords'] = stage_result(seconds, best, nbytes=text_bytes, tokens=tokens)
+
+    # analyze_documents, one partial per scraped page as run_research does it
+    document_sets = [ks.extract_documents(results) for results in scraped]
+    def analyze_documents_all():
+        tokens = 0
+        for contents in document_sets:
+            stats = {}
+            ks.analyze_documents(contents, tokenizer_stats=stats)
+            tokens += stats.get('tokens', 0)
+        return tokens
+    seconds, best, tokens = measure(analyze_documents_all, repeat)
+    stages['analyze_documents'] = stage_result(seconds, best, nbytes=scraped_bytes, tokens=tokens)
+
+    # score_phrases, with a top-N far above the default so the ranking cost shows
+    partial_sets = [[ks.analyze_document(content) for content in contents] for contents in document_sets]
+    seconds, best, _ = measure(lambda: [ks.score_phrases(partials, top_n=5000) for partials in partial_sets], repeat)
+    stages['score_phrases'] = stage_result(seconds, best)
+
+    # run_research end to end
+    def research_all():
+        outputs = [ks.run_research({'keyword': q, 'location': ''}) for q in queries]
+        failed = [o for o in outputs if o.get('status') != 'success']
+        if failed:
+            raise RuntimeError(f'run_research failed: {failed[0].get("message")}')
+        return outputs
+    seconds, best, _ = measure(research_all, repeat)
+    stages['run_research'] = stage_result(seconds, best, nbytes=scraped_bytes)
+
+    return stages
+
+
+def measure_memory_bound(ks, scale=MEMORY_SCALE):
+    """Peak traced memory of analyze_document() on the largest fixture page and on `scale` copies of it.
+
+    The text is grown to a few tokenizer chunks first so both runs are streamed. The
+    copies repeat the same words, so this bounds the working memory, not the counts.
+    """
+    pages_dir = os.path.join(BENCH_DIR, 'fixtures', 'pages')
+    largest = None
+    for name in sorted(os.listdir(pages_dir)):
+        with open(os.path.join(pages_dir, name), 'rb') as f:
+            document = ks.parse_document(f.read())
+        if largest is None or len(document.text) > len(largest.text):
+            largest = document
+    text = largest.text
+    while len(text) < 2 * ks.TOKENIZE_CHUNK_CHARS:
+        text = f'{text} {largest.text}'
+
+    peaks = []
+    for copies in (1, scale):
+        document = ks.ParsedDocument(largest.headers, ' '.join([text] * copies))
+        ks.analyze_document(document)  # warm-up (model, vocab, regex caches)
+        tracemalloc.start()
+        try:
+            ks.analyze_document(document)
+            peaks.append(tracemalloc.get_traced_memory()[1] / (1024 * 1024))
+        finally:
+            tracemalloc.stop()
+    return {
+        'chars': len(text),
+        'scale': scale,
+        'peak_mb': round(peaks[0], 1),
+        'scaled_peak_mb': round(peaks[1], 1),
+        'ratio': round(peaks[1] / peaks[0], 2) if peaks[0] else None,
+    }
+
+
+def compare(stages, baseline, threshold):
+    """Return a list of regression messages against the baseline stages."""
+    regressions = []
+    for name, current in stages.items():
+        base = baseline.get('stages', {}).get(name)
+        if not base:
+            continue
+        if (current['seconds'] > base['seconds'] * (1 + threshold)
+                and current['seconds'] - base['seconds'] > NOISE_FLOOR_SECONDS):
+            regressions.append(f"{name}: {current['seconds']:.4f}s vs baseline {base['seconds']:.4f}s")
+        if (current.get('peak_rss_mb') and base.get('peak_rss_mb')
+                and current['peak_rss_mb'] > base['peak_rss_mb'] * (1 + threshold)):
+            regressions.append(f"{name}: peak RSS {current['peak_rss_mb']}MB vs baseline {base['peak_rss_mb']}MB")
+    return regressions
+
+
+def print_table(stages, baseline):
+    base_stages = (baseline or {}).get('stages', {})
+    print(f"{'stage':<24}{'median s':>10}{'min s':>10}{'MB/s':>9}{'tokens/s':>11}{'RSS MB':>9}{'vs base':>9}")
+    for name, r in stages.items():
+        base = base_stages.get(name)
+        delta = f"{(r['seconds'] / base['seconds'] - 1) * 100:+.0f}%" if base and base['seconds'] else ''
+        print(f"{name:<24}{r['seconds']:>10.4f}{r['min_seconds']:>10.4f}"
+              f"{r.get('mb_per_s') or '':>9}{r.get('tokens_per_s') or '':>11}"
+              f"{r.get('peak_rss_mb') or '':>9}{delta:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark for keyword_search.py')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per stage (median is reported)')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline JSON path')
+    parser.add_argument('--save-baseline', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown before failing (0.25 = 25%%)')
+    parser.add_argument('--import-budget-ms', type=int, default=IMPORT_BUDGET_MS,
+                        help='maximum median import time (default %(default)s, env KR_IMPORT_BUDGET_MS)')
+    parser.add_argument('--memory-ratio', type=float, default=MEMORY_RATIO,
+                        help='maximum analysis peak-memory growth for a %dx larger page '
+                             '(default %%(default)s, env KR_MEMORY_RATIO)' % MEMORY_SCALE)
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    with StandinServer() as server:
+        # Everything keyword_search reads at import time must be set before importing it
+        os.environ['KR_CSE_ENDPOINT'] = server.cse_endpoint
+        os.environ['GOOGLE_CSE_API_KEY'] = 'bench'
+        os.environ['GOOGLE_CSE_CX'] = 'bench'
+        os.environ['KR_CSE_CACHE'] = '0'
+        os.environ['KR_PAGE_CACHE'] = '0'
+        os.environ['KR_ARTIFACT_CACHE'] = '0'
+        # Every fixture page is on 127.0.0.1; the 500 pages must not open its circuit
+        os.environ['KR_HOST_HEALTH'] = '0'
+        # The stand-in has no quota; repeated runs must not drain the real bucket
+        os.environ['KR_CSE_LIMITER'] = '0'
+
+        stages = {'import': measure_import(args.repeat)}
+        sys.path.insert(0, SCRIPTS_DIR)
+        import keyword_search as ks
+
+        queries = list(server.httpd.manifest['queries'])
+        stages.update(run_stages(ks, queries, args.repeat))
+        memory = measure_memory_bound(ks)
+        requests_served = dict(server.counters)
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+            'queries': len(queries),
+            'tokenizer': 'spacy' if ks.get_nlp() is not None and os.environ.get('KR_TOKENIZER') != 'regex' else 'regex',
+            'html_parser': 'lxml' if ks.lxml_html is not None else 'bs4',
+            'extractor': ks.get_extractor()[2],
+            'numpy': ks.get_numpy() is not None,
+            # The benchmark runs like a one-shot run: no preload(), so no analysis pool
+            'analysis_processes': ks.ANALYSIS_PROCESSES if ks._analysis_pool is not None else 1,
+            'import_budget_ms': args.import_budget_ms,
+            'requests_served': requests_served,
+        },
+        'stages': stages,
+        'memory': memory,
+    }
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_table(stages, baseline)
+        print(f"analysis memory: {memory['peak_mb']}MB peak for {memory['chars']} chars, "
+              f"{memory['scaled_peak_mb']}MB for {memory['scale']}x ({memory['ratio']}x)")
+
+    regressions = []
+    import_ms = stages['import']['seconds'] * 1000
+    if import_ms > args.import_budget_ms:
+        regressions.append(f'import: {import_ms:.0f}ms exceeds the {args.import_budget_ms}ms budget')
+    if memory['ratio'] and memory['ratio'] > args.memory_ratio:
+        regressions.append(f"memory: {memory['scale']}x larger page needs {memory['ratio']}x the peak "
+                           f"(limit {args.memory_ratio}x)")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Baseline saved to {args.baseline}')
+    elif baseline is None:
+        print('No baseline yet; run with --save-baseline to record one.')
+    else:
+        regressions.extend(compare(stages, baseline, args.threshold))
+    for message in regressions:
+        print(f'REGRESSION {message}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Local HTTP stand-in for the Custom Search API and the article pages.
+
+Serves the fixture corpus so the pipeline can run without network access:
+- GET /customsearch/v1?q=...&start=&num=   SERP JSON from fixtures/serp (links are
+                                           rewritten to this server's /pages/ URLs)
+- GET /pages/<file>                        fixture bytes with the manifest's status,
+                                           content type and delay; ETag / 304 supported
+
+Run it standalone (prints the base URL) or use StandinServer from the benchmark.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_corpus(fixtures_dir=FIXTURES_DIR):
+    """Load manifest, SERPs and page bytes into memory."""
+    with open(os.path.join(fixtures_dir, 'manifest.json')) as f:
+        manifest = json.load(f)
+    serps = {}
+    for query in manifest['queries']:
+        with open(os.path.join(fixtures_dir, 'serp', query.replace(' ', '-') + '.json')) as f:
+            serps[query] = json.load(f)
+    pages = {}
+    for name in manifest['pages']:
+        path = os.path.join(fixtures_dir, 'pages', name)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                pages[name] = f.read()
+    return manifest, serps, pages
+
+
+def match_query(serps, q):
+    """Find the fixture SERP whose query is contained in q (the pipeline appends the location)."""
+    q = ' '.join(q.lower().split())
+    for query in sorted(serps, key=len, reverse=True):
+        if query in q:
+            return serps[query]
+    return None
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    server_version = 'KRStandin/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b'', content_type='text/plain', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if body:
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client stopped reading (non-HTML, size cap or deadline)
+                pass
+
+    def do_GET(self):
+        parsed = urllib.parse.urlsplit(self.path)
+        if parsed.path == '/customsearch/v1':
+            return self._serve_search(urllib.parse.parse_qs(parsed.query))
+        if parsed.path.startswith('/pages/'):
+            return self._serve_page(urllib.parse.unquote(parsed.path[len('/pages/'):]))
+        self._send(404, b'not found')
+
+    def _serve_search(self, params):
+        self.server.counters['cse'] += 1
+        serp = match_query(self.server.serps, params.get('q', [''])[0])
+        if serp is None:
+            data = {'kind': 'customsearch#search', 'searchInformation': {'searchTime': 0.1, 'totalResults': '0'}}
+        else:
+            start = max(1, int(params.get('start', ['1'])[0] or 1))
+            num = max(1, min(10, int(params.get('num', ['10'])[0] or 10)))
+            data = dict(serp)
+            data['items'] = [
+                dict(item, link=self.server.base_url + item['link'])
+                for item in serp['items'][start - 1:start - 1 + num]
+            ]
+            if not data['items']:
+                del data['items']
+        self._send(200, json.dumps(data).encode('utf-8'), 'application/json; charset=UTF-8')
+
+    def _serve_page(self, name):
+        self.server.counters['pages'] += 1
+        meta = self.server.manifest['pages'].get(name)
+        if meta is None:
+            return self._send(404, b'not found')
+        if meta.get('delay_ms'):
+            time.sleep(meta['delay_ms'] / 1000.0)
+        body = self.server.pages.get(name, b'')
+        if meta['status'] != 200:
+            return self._send(meta['status'], b'<html><body>error</body></html>', meta['content_type'])
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+        if self.headers.get('If-None-Match') == etag:
+            return self._send(304, headers={'ETag': etag})
+        self._send(200, body, meta['content_type'], {'ETag': etag})
+
+
+class StandinServer:
+    """Threaded stand-in bound to 127.0.0.1 on a free port (use as a context manager)."""
+
+    def __init__(self, fixtures_dir=FIXTURES_DIR, port=0):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), StandinHandler)
+        self.httpd.daemon_threads = True
+        manifest, serps, pages = load_corpus(fixtures_dir)
+        self.httpd.manifest = manifest
+        self.httpd.serps = serps
+        self.httpd.pages = pages
+        self.httpd.counters = {'cse': 0, 'pages': 0}
+        self.base_url = 'http://127.0.0.1:%d' % self.httpd.server_address[1]
+        self.httpd.base_url = self.base_url
+        self.thread = None
+
+    @property
+    def cse_endpoint(self):
+        return self.base_url + '/customsearch/v1'
+
+    @property
+    def counters(self):
+        return self.httpd.counters
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    server = StandinServer(port=port)
+    print(f'Stand-in serving {FIXTURES_DIR}')
+    print(f'KR_CSE_ENDPOINT={server.cse_endpoint}')
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -175,6 +175,28 @@ CREATE TABLE IF NOT EXISTS `keyword_research_html` (
   CONSTRAINT `keyword_research_html_ibfk_1` FOREIGN KEY (`keyword_research_id`) REFERENCES `keyword_research`(`id`) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+CREATE TABLE IF NOT EXISTS `keyword_research_metrics` (
+  `keyword_research_id` INT NOT NULL,
+  `total_ms` INT DEFAULT NULL,             -- wall time of the Python run (metrics.total.wall_ms)
+  `metrics` LONGTEXT,                      -- JSON metrics block from keyword_search.py (stages, pages, bytes, tokens)
+  `created_at` DATETIME DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`keyword_research_id`),
+  KEY `idx_total_ms` (`total_ms`),
+  CONSTRAINT `keyword_research_metrics_ibfk_1` FOREIGN KEY (`keyword_research_id`) REFERENCES `keyword_research`(`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Inverted index over keyword_research: phrase / word / result URL -> research rows.
+-- Filled on insert by src/lib/keywordIndex.js; rebuild with scripts/rebuild_keyword_index.mjs
+CREATE TABLE IF NOT EXISTS `keyword_research_terms` (
+  `term_type` ENUM('phrase', 'word', 'url') NOT NULL,
+  `term` VARCHAR(512) COLLATE utf8mb4_bin NOT NULL,  -- normalized (lowercased phrases/words, URLs without fragment)
+  `keyword_research_id` INT NOT NULL,
+  `frequency` INT NOT NULL DEFAULT 1,               -- occurrences in that research (1 per URL)
+  PRIMARY KEY (`term_type`, `term`, `keyword_research_id`),
+  KEY `idx_keyword_research_id` (`keyword_research_id`),
+  CONSTRAINT `keyword_research_terms_ibfk_1` FOREIGN KEY (`keyword_research_id`) REFERENCES `keyword_research`(`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 -- ---------------------------------------------------------------------
 -- SYSTEM PROMPTS (used by KR flow)
 -- ---------------------------------------------------------------------
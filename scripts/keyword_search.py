@@ -15,15 +15,16 @@ MAIN FUNCTIONS:
 - google_search_api(): Performs Google Custom Search API calls
 - fetch_page_html(): Downloads and extracts HTML content from URLs
 - extract_main_text(): Extracts clean text content using trafilatura
-- analyze_keywords(): Main keyword analysis with spaCy NLP processing
+- analyze_keywords(): Main keyword analysis with spaCy tokenization
 - find_phrase_in_headers(): Checks if keywords/phrases appear in headers
 - extract_header_hierarchy(): Extracts H1, H2, H3 structure from HTML
+- parse_document(): Parses a page once into headers + cleaned text (lxml)
 
 KEY FEATURES:
 - Keyword presence checking in article headers
 - Quality scoring based on header hierarchy (H1=3pts, H2=1.5pts, H3=0.5pts)
 - Content extraction from top 3 accessible articles
-- NLP processing with spaCy for accurate keyword extraction
+- NLP processing with the spaCy tokenizer (regex fallback) for keyword extraction
 - Phrase analysis with n-grams (2-4 words)
 - Header hierarchy analysis for SEO optimization
 
@@ -31,19 +32,39 @@ INPUT: keyword, location, search_engine
 OUTPUT: JSON with search results, keyword analysis, and header data
 """
 
+import time
+# Import/model-load cost is reported in every run's metrics
+_IMPORT_STARTED = (time.perf_counter(), time.process_time())
+
 import json
 import sys
-import requests
 import urllib.parse
 import random
 import re
+import queue
+import threading
+import hashlib
+import codecs
+import io
+import copy
+import sqlite3
+import zlib
+import heapq
+import math
+from itertools import chain, compress
+from contextlib import contextmanager, nullcontext
+from collections import namedtuple, OrderedDict
 from collections import Counter
-import nltk
-from nltk.util import ngrams
-# import spacy  # Moved to try/except block below
+# Heavy dependencies (requests, spaCy, NLTK, NumPy, trafilatura, bs4) are imported
+# on first use, so bad input, error paths and cache hits never pay for them.
 import logging
 import os
-from bs4 import BeautifulSoup
+
+try:
+    import lxml.html as lxml_html
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_html = None
 
 # Flexible environment loader (no hardcoded single filename)
 try:
@@ -91,49 +112,162 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-# Set a custom NLTK data path in the project directory where web server has permissions
-nltk_data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nltk_data')
-os.makedirs(nltk_data_dir, exist_ok=True)
-nltk.data.path.insert(0, nltk_data_dir)
-logging.info(f"Using custom NLTK data directory: {nltk_data_dir}")
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+# NLTK data lives in the project directory where the web server has permissions
+nltk_data_dir = os.path.join(SCRIPT_DIR, 'nltk_data')
 
-# Download necessary NLTK data if not already downloaded
-try:
+# Prebuilt stopword lists (NLTK English + our custom words); see build_stopwords_artifact()
+STOPWORDS_PATH = os.environ.get('KR_STOPWORDS_FILE') or os.path.join(SCRIPT_DIR, 'stopwords.json')
+CUSTOM_STOPWORDS = [
+    'get', 'us', 'click', 'also', 'one', 'way', 'new',
+    'whether', 'want', 'you', 'job', 'gregory', 'brw'
+]
+
+# Only the tokenizer is used, so the tagger/parser/NER are never loaded
+SPACY_MODEL = 'en_core_web_sm'
+SPACY_EXCLUDE = ['tok2vec', 'tagger', 'parser', 'attribute_ruler', 'lemmatizer', 'ner', 'senter']
+
+_lazy_lock = threading.Lock()
+_nlp = None
+_nlp_loaded = False
+_stop_words = None
+_numpy = None
+_orjson = None
+# (wall, cpu) seconds of the spaCy load, once it has happened
+MODEL_LOAD_TIMES = None
+
+def get_nlp():
+    """Load the spaCy tokenizer on first use; None if spaCy or the model is unavailable.
+
+    Never downloads anything: a missing model falls back to the regex tokenizer until
+    `keyword_search.py --warm-up` has installed it.
+    """
+    global _nlp, _nlp_loaded, MODEL_LOAD_TIMES
+    if _nlp_loaded:
+        return _nlp
+    with _lazy_lock:
+        if _nlp_loaded:
+            return _nlp
+        started = (time.perf_counter(), time.process_time())
+        try:
+            import spacy
+            _nlp = spacy.load(SPACY_MODEL, exclude=SPACY_EXCLUDE)
+            logging.info("spaCy model loaded successfully")
+        except ImportError as e:
+            logging.warning(f"spaCy not available, using regex tokenizer: {str(e)}")
+        except OSError as e:
+            logging.warning(f"spaCy model not found (run keyword_search.py --warm-up), using regex tokenizer: {str(e)}")
+        except Exception as e:
+            logging.error(f"Failed to load spaCy model: {str(e)}")
+        MODEL_LOAD_TIMES = (time.perf_counter() - started[0], time.process_time() - started[1])
+        _nlp_loaded = True
+    return _nlp
+
+def get_numpy():
+    """Import NumPy on first use; None when it is not installed (pure-Python counting)."""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+def get_orjson():
+    """Import orjson on first use; None when it is not installed or KR_ORJSON=0 (json is used)."""
+    global _orjson
+    if _orjson is None:
+        _orjson = False
+        if os.environ.get('KR_ORJSON', '1') != '0':
+            try:
+                import orjson
+                _orjson = orjson
+            except ImportError:
+                pass
+    return _orjson or None
+
+def _nltk_stopwords():
+    """Read NLTK's English stopwords from nltk_data (LookupError if not downloaded)."""
+    import nltk
+    if nltk_data_dir not in nltk.data.path:
+        nltk.data.path.insert(0, nltk_data_dir)
     nltk.data.find('corpora/stopwords')
-    logging.info("NLTK stopwords found")
-except LookupError:
-    logging.warning("NLTK stopwords not found, downloading...")
-    nltk.download('stopwords', download_dir=nltk_data_dir, quiet=True)
-    logging.info("NLTK stopwords downloaded successfully")
+    return nltk.corpus.stopwords.words('english')
 
-# Load spaCy model with better error handling
-try:
-    import spacy
-    nlp = spacy.load('en_core_web_sm')
-    logging.info("spaCy model loaded successfully")
-except ImportError as e:
-    logging.warning(f"spaCy not available: {str(e)}")
-    logging.info("Falling back to simple NLP processing without spaCy")
-    nlp = None
-except OSError as e:
-    logging.warning(f"spaCy model not found: {str(e)}")
+def load_stop_words():
+    """Stopwords for keyword counting, read once from the prebuilt artifact.
+
+    Without the artifact the NLTK corpus is read directly (if it has been downloaded);
+    failing that only the custom stopwords are used and an error is logged.
+    """
+    global _stop_words
+    if _stop_words is not None:
+        return _stop_words
+    words = set(CUSTOM_STOPWORDS)
     try:
-        logging.info("Attempting to download spaCy model...")
-        import subprocess
-        subprocess.check_call([
-            sys.executable, 
-            "-m", "spacy", "download", "en_core_web_sm", 
-            "--user"  # Install in user directory to avoid permission issues
-        ])
-        nlp = spacy.load('en_core_web_sm')
-        logging.info("spaCy model downloaded and loaded successfully")
-    except Exception as download_error:
-        logging.error(f"Failed to download spaCy model: {str(download_error)}")
-        logging.info("Falling back to simple NLP processing without spaCy")
-        nlp = None
-except Exception as e:
-    logging.error(f"Failed to load spaCy model: {str(e)}")
-    nlp = None
+        with open(STOPWORDS_PATH, encoding='utf-8') as f:
+            artifact = json.load(f)
+        words.update(artifact['nltk_english'])
+        words.update(artifact['custom'])
+    except (OSError, ValueError, KeyError) as e:
+        logging.warning(f"Stopwords artifact unavailable ({str(e)}), reading NLTK data")
+        try:
+            words.update(_nltk_stopwords())
+        except Exception as nltk_error:
+            logging.error(f"NLTK stopwords unavailable, run keyword_search.py --warm-up: {str(nltk_error)}")
+    _stop_words = frozenset(words)
+    return _stop_words
+
+def build_stopwords_artifact(path=STOPWORDS_PATH):
+    """Write the stopwords artifact from the NLTK corpus and CUSTOM_STOPWORDS."""
+    artifact = {
+        'nltk_english': sorted(set(_nltk_stopwords())),
+        'custom': sorted(set(CUSTOM_STOPWORDS)),
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(artifact, f, indent=1)
+        f.write('\n')
+    return artifact
+
+def warm_up():
+    """Install what the pipeline needs ahead of time (run once per deploy, never per request).
+
+    Downloads the NLTK stopwords and the spaCy model if missing, writes the stopwords
+    artifact if it does not exist yet, and checks that everything loads.
+    """
+    import subprocess
+    summary = {'status': 'ok'}
+
+    import nltk
+    os.makedirs(nltk_data_dir, exist_ok=True)
+    if nltk_data_dir not in nltk.data.path:
+        nltk.data.path.insert(0, nltk_data_dir)
+    try:
+        nltk.data.find('corpora/stopwords')
+    except LookupError:
+        logging.info("Downloading NLTK stopwords")
+        nltk.download('stopwords', download_dir=nltk_data_dir, quiet=True)
+    if not os.path.exists(STOPWORDS_PATH):
+        build_stopwords_artifact()
+    summary['stopwords'] = len(load_stop_words())
+
+    try:
+        import spacy
+        if not spacy.util.is_package(SPACY_MODEL):
+            logging.info("Downloading spaCy model")
+            subprocess.check_call([
+                sys.executable,
+                "-m", "spacy", "download", SPACY_MODEL,
+                "--user"  # Install in user directory to avoid permission issues
+            ])
+    except Exception as e:
+        logging.error(f"spaCy warm-up failed: {str(e)}")
+        summary['status'] = 'degraded'
+        summary['spacy_error'] = str(e)
+    summary['spacy_model'] = get_nlp() is not None
+    summary['extractor'] = get_extractor()[2]
+    return summary
 
 # List of user agents for rotating to avoid detection
 USER_AGENTS = [
@@ -148,9 +282,851 @@ def get_random_user_agent():
     """Return a random user agent from the list."""
     return random.choice(USER_AGENTS)
 
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session():
+    """Process-wide requests.Session so keep-alive connections are reused across fetches and requests."""
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                import requests
+                import requests.adapters
+                session = requests.Session()
+                pool_size = max(10, FETCH_CONCURRENCY * 2)
+                adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _http_session = session
+    return _http_session
+
+# Article hosts get their own session (keep-alive pool and cookies), least recently used
+# ones are closed beyond this many
+HOST_SESSIONS_MAX = 64
+_host_sessions = OrderedDict()
+
+def get_host_session(host):
+    """requests.Session for fetching pages from one host, reused across fetches and requests."""
+    with _http_session_lock:
+        session = _host_sessions.get(host)
+        if session is not None:
+            _host_sessions.move_to_end(host)
+            return session
+        import requests
+        import requests.adapters
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(2, FETCH_CONCURRENCY))
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _host_sessions[host] = session
+        while len(_host_sessions) > HOST_SESSIONS_MAX:
+            _, evicted = _host_sessions.popitem(last=False)
+            evicted.close()
+    return session
+
+# --- Local caches (SQLite files under scripts/.cache) ----------------------
+CACHE_DIR = os.environ.get('KR_CACHE_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+
+def open_cache_db(filename):
+    """Open (creating if needed) a SQLite database under CACHE_DIR, shared across threads."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(CACHE_DIR, filename), timeout=10, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+class SearchCache:
+    """TTL'd, size-bounded cache of successful Custom Search responses.
+
+    Entries are keyed by the normalized q/cx/lr/cr/num/start/safe params (never the API key)
+    and evicted least-recently-used once more than `max_entries` are stored.
+    """
+
+    KEY_PARAMS = ('q', 'cx', 'lr', 'cr', 'num', 'start', 'safe')
+
+    def __init__(self, filename='cse_cache.sqlite3', ttl=None, max_entries=None):
+        self.ttl = ttl if ttl is not None else int(os.environ.get('KR_CSE_CACHE_TTL', '21600') or 21600)
+        self.max_entries = max_entries or int(os.environ.get('KR_CSE_CACHE_MAX_ENTRIES', '5000') or 5000)
+        self.lock = threading.Lock()
+        self.conn = open_cache_db(filename)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS cse_cache ('
+            ' key TEXT PRIMARY KEY, response TEXT NOT NULL,'
+            ' created_at REAL NOT NULL, last_access REAL NOT NULL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_cse_cache_last_access ON cse_cache (last_access)')
+        self.conn.commit()
+
+    @classmethod
+    def make_key(cls, params):
+        normalized = {}
+        for name in cls.KEY_PARAMS:
+            value = params.get(name)
+            if value is None:
+                continue
+            value = str(value).strip()
+            if name == 'q':
+                value = re.sub(r'\s+', ' ', value.lower())
+            normalized[name] = value
+        return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def get(self, params):
+        key = self.make_key(params)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT response, created_at FROM cse_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if not row:
+                return None
+            if now - row[1] > self.ttl:
+                self.conn.execute('DELETE FROM cse_cache WHERE key = ?', (key,))
+                self.conn.commit()
+                return None
+            self.conn.execute('UPDATE cse_cache SET last_access = ? WHERE key = ?', (now, key))
+            self.conn.commit()
+        return json.loads(row[0])
+
+    def put(self, params, response):
+        key = self.make_key(params)
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO cse_cache (key, response, created_at, last_access) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(response), now, now)
+            )
+            # Drop expired rows, then trim to the size bound (least recently used first)
+            self.conn.execute('DELETE FROM cse_cache WHERE created_at < ?', (now - self.ttl,))
+            self.conn.execute(
+                'DELETE FROM cse_cache WHERE key IN ('
+                ' SELECT key FROM cse_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+            self.conn.commit()
+
+class PageCache:
+    """Size-bounded cache of fetched article HTML for conditional GETs.
+
+    Bodies (UTF-8 bytes) are stored zlib-compressed together with ETag / Last-Modified. Within
+    `fresh_seconds` of the last validation a page is served without any request;
+    after that it is revalidated with If-None-Match / If-Modified-Since. The total
+    compressed size is kept under `max_bytes` by evicting least recently used pages.
+    """
+
+    def __init__(self, filename='page_cache.sqlite3', max_bytes=None, fresh_seconds=None):
+        self.max_bytes = max_bytes or int(os.environ.get('KR_PAGE_CACHE_MAX_BYTES', '') or 256 * 1024 * 1024)
+        self.fresh_seconds = fresh_seconds if fresh_seconds is not None else int(os.environ.get('KR_PAGE_CACHE_FRESH_SECONDS', '3600') or 3600)
+        self.lock = threading.Lock()
+        self.conn = open_cache_db(filename)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS page_cache ('
+            ' url TEXT PRIMARY KEY, body BLOB NOT NULL, etag TEXT, last_modified TEXT,'
+            ' validated_at REAL NOT NULL, last_access REAL NOT NULL, size INTEGER NOT NULL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_page_cache_last_access ON page_cache (last_access)')
+        self.conn.commit()
+
+    def get(self, url):
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT body, etag, last_modified, validated_at FROM page_cache WHERE url = ?', (url,)
+            ).fetchone()
+            if not row:
+                return None
+            self.conn.execute('UPDATE page_cache SET last_access = ? WHERE url = ?', (time.time(), url))
+            self.conn.commit()
+        return {
+            'body': zlib.decompress(row[0]),
+            'etag': row[1],
+            'last_modified': row[2],
+            'fresh': time.time() - row[3] < self.fresh_seconds,
+        }
+
+    def touch(self, url):
+        """Mark a cached page as revalidated (after a 304)."""
+        now = time.time()
+        with self.lock:
+            self.conn.execute('UPDATE page_cache SET validated_at = ?, last_access = ? WHERE url = ?', (now, now, url))
+            self.conn.commit()
+
+    def put(self, url, body, etag=None, last_modified=None):
+        blob = zlib.compress(body, 6)
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO page_cache (url, body, etag, last_modified, validated_at, last_access, size)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (url, blob, etag, last_modified, now, now, len(blob))
+            )
+            # Keep the most recently used pages whose running total fits in max_bytes
+            self.conn.execute(
+                'DELETE FROM page_cache WHERE url IN ('
+                ' SELECT url FROM (SELECT url, SUM(size) OVER (ORDER BY last_access DESC, url) AS running'
+                ' FROM page_cache) WHERE running > ?)',
+                (self.max_bytes,)
+            )
+            self.conn.commit()
+
+class ArtifactStore:
+    """Per-page artifacts keyed by URL + content hash, shared by every keyword.
+
+    Overlapping keywords hit the same pages, so what was derived from a page version
+    (its extract_main_text() output, or its DocumentAnalysis: headers and full word /
+    n-gram counts) is stored once under an artifact `kind` and reused. Kinds embed the
+    extractor / tokenizer settings, so changing those simply misses. Values are
+    zlib-compressed JSON; a new version of a page replaces the old one, and the total
+    size is kept under `max_bytes` by evicting least recently used rows.
+    """
+
+    def __init__(self, filename='artifact_cache.sqlite3', max_bytes=None):
+        self.max_bytes = max_bytes or int(os.environ.get('KR_ARTIFACT_CACHE_MAX_BYTES', '') or 256 * 1024 * 1024)
+        self.lock = threading.Lock()
+        self.conn = open_cache_db(filename)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS artifacts ('
+            ' url TEXT NOT NULL, content_hash TEXT NOT NULL, kind TEXT NOT NULL, value BLOB NOT NULL,'
+            ' last_access REAL NOT NULL, size INTEGER NOT NULL, PRIMARY KEY (url, content_hash, kind))'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_artifacts_last_access ON artifacts (last_access)')
+        self.conn.commit()
+
+    def get(self, url, content_hash, kind):
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT value FROM artifacts WHERE url = ? AND content_hash = ? AND kind = ?',
+                (url, content_hash, kind)
+            ).fetchone()
+            if not row:
+                return None
+            self.conn.execute(
+                'UPDATE artifacts SET last_access = ? WHERE url = ? AND content_hash = ? AND kind = ?',
+                (time.time(), url, content_hash, kind)
+            )
+            self.conn.commit()
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, url, content_hash, kind, value):
+        blob = zlib.compress(json.dumps(value, separators=(',', ':')).encode('utf-8'), 6)
+        if len(blob) > self.max_bytes:
+            return
+        with self.lock:
+            # Older versions of the page are never asked for again
+            self.conn.execute(
+                'DELETE FROM artifacts WHERE url = ? AND kind = ? AND content_hash != ?',
+                (url, kind, content_hash)
+            )
+            self.conn.execute(
+                'INSERT OR REPLACE INTO artifacts (url, content_hash, kind, value, last_access, size)'
+                ' VALUES (?, ?, ?, ?, ?, ?)',
+                (url, content_hash, kind, blob, time.time(), len(blob))
+            )
+            self.conn.execute(
+                'DELETE FROM artifacts WHERE rowid IN ('
+                ' SELECT rowid FROM (SELECT rowid, SUM(size) OVER (ORDER BY last_access DESC, rowid) AS running'
+                ' FROM artifacts) WHERE running > ?)',
+                (self.max_bytes,)
+            )
+            self.conn.commit()
+
+class FingerprintIndex:
+    """SimHash fingerprints of the pages analyzed so far, shared by every run.
+
+    Each row is one page version (URL + content hash) with its 64-bit fingerprint
+    split into four 16-bit bands. Two fingerprints within 3 bits of each other agree
+    on at least one band, so near() only compares the rows sharing a band with the
+    query. A new version of a page replaces the old one, and only the `max_entries`
+    most recently seen pages are kept.
+    """
+
+    BANDS = 4
+
+    def __init__(self, filename='fingerprints.sqlite3', max_entries=None):
+        self.max_entries = max_entries or int(os.environ.get('KR_DEDUP_INDEX_MAX_ENTRIES', '') or 50000)
+        self.lock = threading.Lock()
+        self.conn = open_cache_db(filename)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS fingerprints ('
+            ' url TEXT NOT NULL, content_hash TEXT NOT NULL, simhash INTEGER NOT NULL,'
+            ' band0 INTEGER NOT NULL, band1 INTEGER NOT NULL, band2 INTEGER NOT NULL, band3 INTEGER NOT NULL,'
+            ' seen_at REAL NOT NULL, PRIMARY KEY (url, content_hash))'
+        )
+        for band in range(self.BANDS):
+            self.conn.execute(f'CREATE INDEX IF NOT EXISTS idx_fingerprints_band{band} ON fingerprints (band{band})')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_fingerprints_seen_at ON fingerprints (seen_at)')
+        self.conn.commit()
+
+    @classmethod
+    def bands(cls, fingerprint):
+        return [(fingerprint >> (16 * band)) & 0xFFFF for band in range(cls.BANDS)]
+
+    def add(self, url, content_hash, fingerprint):
+        # SQLite integers are signed 64-bit
+        signed = fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+        with self.lock:
+            self.conn.execute('DELETE FROM fingerprints WHERE url = ? AND content_hash != ?', (url, content_hash))
+            self.conn.execute(
+                'INSERT OR REPLACE INTO fingerprints'
+                ' (url, content_hash, simhash, band0, band1, band2, band3, seen_at)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, content_hash, signed, *self.bands(fingerprint), time.time())
+            )
+            self.conn.execute(
+                'DELETE FROM fingerprints WHERE rowid IN ('
+                ' SELECT rowid FROM fingerprints ORDER BY seen_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+            self.conn.commit()
+
+    def near(self, fingerprint, max_distance=3, exclude_url=None):
+        """Closest stored page within max_distance bits, as (url, content_hash, distance), or None."""
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT url, content_hash, simhash FROM fingerprints'
+                ' WHERE band0 = ? OR band1 = ? OR band2 = ? OR band3 = ?',
+                self.bands(fingerprint)
+            ).fetchall()
+        best = None
+        for url, page_hash, stored in rows:
+            if url == exclude_url:
+                continue
+            distance = hamming_distance(fingerprint, stored & ((1 << 64) - 1))
+            if distance <= max_distance and (best is None or distance < best[2]):
+                best = (url, page_hash, distance)
+        return best
+
+class HostHealth:
+    """Persisted fetch health per article host: latency, failure counts and last status.
+
+    It drives three things in fetch_page_html():
+    - an adaptive timeout, a multiple of the host's typical (EWMA) latency once a few
+      successful fetches are known, never above the caller's timeout;
+    - a circuit breaker: after `failure_threshold` consecutive failures (403/429/5xx,
+      timeouts, connection errors) the host is skipped for a cooldown that doubles with
+      every further failure; a 429 Retry-After opens it for at least that long. Once the
+      cooldown is over one attempt is let through, and a success closes the circuit;
+    - the user agent the host is sent, kept stable and rotated after a 403.
+    Rows are read from SQLite on every lookup so concurrent processes share them.
+    """
+
+    EWMA_ALPHA = 0.3
+    MIN_SAMPLES = 3
+    TIMEOUT_FACTOR = 4.0
+    MIN_TIMEOUT = 2.0
+    MAX_COOLDOWN = 24 * 3600
+    COLUMNS = ('host', 'requests', 'failures', 'consecutive_failures', 'latency_ms', 'last_status',
+               'user_agent', 'open_until', 'updated_at')
+
+    def __init__(self, filename='host_health.sqlite3', failure_threshold=None, cooldown=None):
+        self.failure_threshold = failure_threshold or int(os.environ.get('KR_HOST_FAILURE_THRESHOLD', '') or 3)
+        self.cooldown = cooldown or int(os.environ.get('KR_HOST_COOLDOWN', '') or 900)
+        self.lock = threading.Lock()
+        self.conn = open_cache_db(filename)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS host_health ('
+            ' host TEXT PRIMARY KEY, requests INTEGER NOT NULL, failures INTEGER NOT NULL,'
+            ' consecutive_failures INTEGER NOT NULL, latency_ms REAL, last_status TEXT,'
+            ' user_agent INTEGER NOT NULL, open_until REAL NOT NULL, updated_at REAL NOT NULL)'
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def default_user_agent(host):
+        """Index into USER_AGENTS a host starts with (stable, so it always sees the same one)."""
+        return int(hashlib.sha1(host.encode('utf-8')).hexdigest()[:8], 16) % len(USER_AGENTS)
+
+    def _select(self, host):
+        row = self.conn.execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM host_health WHERE host = ?", (host,)
+        ).fetchone()
+        return dict(zip(self.COLUMNS, row)) if row else None
+
+    def get(self, host):
+        with self.lock:
+            return self._select(host)
+
+    # The lookups below take a row from get() (None for a host never fetched)
+    def allow(self, row):
+        """False while the host's circuit is open."""
+        return row is None or row['open_until'] <= time.time()
+
+    def timeout_for(self, row, default):
+        if not row or row['latency_ms'] is None or row['requests'] - row['failures'] < self.MIN_SAMPLES:
+            return default
+        return max(self.MIN_TIMEOUT, min(default, row['latency_ms'] / 1000 * self.TIMEOUT_FACTOR))
+
+    def user_agent(self, host, row):
+        return USER_AGENTS[(row['user_agent'] if row else self.default_user_agent(host)) % len(USER_AGENTS)]
+
+    def record(self, host, status, latency=None, failed=False, retry_after=None):
+        """Record one fetch outcome; status is the HTTP status or 'timeout' / 'error'."""
+        now = time.time()
+        with self.lock:
+            row = self._select(host) or {
+                'host': host, 'requests': 0, 'failures': 0, 'consecutive_failures': 0, 'latency_ms': None,
+                'last_status': None, 'user_agent': self.default_user_agent(host), 'open_until': 0.0,
+                'updated_at': now,
+            }
+            row['requests'] += 1
+            row['last_status'] = str(status)
+            row['updated_at'] = now
+            if failed:
+                row['failures'] += 1
+                row['consecutive_failures'] += 1
+                if status == 403:
+                    row['user_agent'] = (row['user_agent'] + 1) % len(USER_AGENTS)
+                cooldown = 0
+                if row['consecutive_failures'] >= self.failure_threshold:
+                    extra = row['consecutive_failures'] - self.failure_threshold
+                    cooldown = min(self.MAX_COOLDOWN, self.cooldown * 2 ** min(extra, 16))
+                if retry_after:
+                    cooldown = max(cooldown, min(self.MAX_COOLDOWN, retry_after))
+                if cooldown:
+                    row['open_until'] = now + cooldown
+            else:
+                row['consecutive_failures'] = 0
+                row['open_until'] = 0.0
+                if latency is not None:
+                    latency_ms = latency * 1000
+                    row['latency_ms'] = latency_ms if row['latency_ms'] is None else (
+                        self.EWMA_ALPHA * latency_ms + (1 - self.EWMA_ALPHA) * row['latency_ms']
+                    )
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO host_health ({', '.join(self.COLUMNS)})"
+                f" VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                tuple(row[column] for column in self.COLUMNS)
+            )
+            self.conn.commit()
+
+class CseQuotaExceeded(Exception):
+    """The daily Custom Search budget is spent and will not reset within the allowed wait."""
+
+class CseRateLimiter:
+    """Token bucket for Custom Search calls, shared by every process using the cache dir.
+
+    `per_minute` tokens refill continuously (bucket size `per_minute`), and at most
+    `daily_budget` calls are made per quota day (Google resets at midnight Pacific).
+    acquire() queues the caller until a token is free instead of failing; it only
+    gives up (CseQuotaExceeded) when the wait would exceed `max_wait` seconds, i.e.
+    when the daily budget is gone. State lives in one SQLite row updated under
+    BEGIN IMMEDIATE, so concurrent workers draw from the same bucket.
+    """
+
+    POLL_SECONDS = 1.0
+
+    def __init__(self, filename='cse_quota.sqlite3', daily_budget=None, per_minute=None, max_wait=None):
+        self.daily_budget = daily_budget or int(os.environ.get('KR_CSE_DAILY_BUDGET', '') or 100)
+        self.per_minute = per_minute or float(os.environ.get('KR_CSE_PER_MINUTE', '') or 60)
+        self.max_wait = max_wait if max_wait is not None else float(os.environ.get('KR_CSE_MAX_WAIT', '') or 120)
+        self.lock = threading.Lock()
+        self.conn = open_cache_db(filename)
+        self.conn.isolation_level = None  # explicit BEGIN IMMEDIATE below
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS cse_quota ('
+            ' id INTEGER PRIMARY KEY CHECK (id = 1), tokens REAL NOT NULL, updated_at REAL NOT NULL,'
+            ' day TEXT NOT NULL, day_calls INTEGER NOT NULL)'
+        )
+
+    @staticmethod
+    def quota_day(now):
+        """(quota day, seconds until the next reset) for a Unix time."""
+        from datetime import datetime, timedelta, timezone
+        try:
+            from zoneinfo import ZoneInfo
+            tz = ZoneInfo('America/Los_Angeles')
+        except Exception:
+            tz = timezone.utc
+        local = datetime.fromtimestamp(now, tz)
+        midnight = (local + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        return local.strftime('%Y-%m-%d'), (midnight - local).total_seconds()
+
+    def _take(self):
+        """Try to take one token. Returns (0, remaining today) or (seconds to wait, remaining)."""
+        now = time.time()
+        day, until_reset = self.quota_day(now)
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self.conn.execute('SELECT tokens, updated_at, day, day_calls FROM cse_quota WHERE id = 1').fetchone()
+                tokens, updated_at, row_day, day_calls = row or (self.per_minute, now, day, 0)
+                tokens = min(self.per_minute, tokens + max(0.0, now - updated_at) * self.per_minute / 60)
+                if row_day != day:
+                    day_calls = 0
+                if day_calls >= self.daily_budget:
+                    wait = until_reset
+                elif tokens >= 1:
+                    tokens -= 1
+                    day_calls += 1
+                    wait = 0.0
+                else:
+                    wait = (1 - tokens) * 60 / self.per_minute
+                self.conn.execute(
+                    'INSERT OR REPLACE INTO cse_quota (id, tokens, updated_at, day, day_calls) VALUES (1, ?, ?, ?, ?)',
+                    (tokens, now, day, day_calls)
+                )
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+        return wait, self.daily_budget - day_calls
+
+    def acquire(self):
+        """Block until a call may be made. Returns (seconds waited, calls left today)."""
+        started = time.monotonic()
+        while True:
+            wait, remaining = self._take()
+            waited = time.monotonic() - started
+            if not wait:
+                return waited, remaining
+            if waited + wait > self.max_wait:
+                raise CseQuotaExceeded(
+                    f"Custom Search budget of {self.daily_budget} calls/day is used up"
+                    if remaining <= 0 else f"Custom Search rate limit: no call slot within {self.max_wait:.0f}s"
+                )
+            # Poll: other processes may take the token first, so re-check before calling
+            time.sleep(min(wait, self.POLL_SECONDS) + random.uniform(0, 0.05))
+
+    def remaining(self):
+        """Calls left in the current quota day."""
+        day, _ = self.quota_day(time.time())
+        with self.lock:
+            row = self.conn.execute('SELECT day, day_calls FROM cse_quota WHERE id = 1').fetchone()
+        return self.daily_budget - (row[1] if row and row[0] == day else 0)
+
+def content_hash(html):
+    """Hash identifying one version of a page's HTML (bytes, or str hashed as UTF-8)."""
+    if isinstance(html, str):
+        html = html.encode('utf-8', errors='replace')
+    return hashlib.sha1(html).hexdigest()
+
+def hit_rate(stats):
+    """hits / (hits + misses), or None before any lookup."""
+    lookups = stats.get('hits', 0) + stats.get('misses', 0)
+    return round(stats.get('hits', 0) / lookups, 3) if lookups else None
+
+_search_cache = None
+_page_cache = None
+_artifact_store = None
+_host_health = None
+_cse_limiter = None
+_fingerprint_index = None
+_stats_lock = threading.Lock()
+
+def count_stat(stats, name, amount=1):
+    """Increment a counter in an optional stats dict (safe to call from fetch threads)."""
+    if stats is None:
+        return
+    with _stats_lock:
+        stats[name] = stats.get(name, 0) + amount
+
+def get_search_cache():
+    """Return the process-wide CSE cache, or None when disabled (KR_CSE_CACHE=0) or unavailable."""
+    global _search_cache
+    if os.environ.get('KR_CSE_CACHE') == '0':
+        return None
+    if _search_cache is None:
+        try:
+            _search_cache = SearchCache()
+        except Exception as e:
+            logging.warning(f"CSE cache unavailable: {str(e)}")
+            return None
+    return _search_cache
+
+def get_page_cache():
+    """Return the process-wide page cache, or None when disabled (KR_PAGE_CACHE=0) or unavailable."""
+    global _page_cache
+    if os.environ.get('KR_PAGE_CACHE') == '0':
+        return None
+    if _page_cache is None:
+        try:
+            _page_cache = PageCache()
+        except Exception as e:
+            logging.warning(f"Page cache unavailable: {str(e)}")
+            return None
+    return _page_cache
+
+def get_host_health():
+    """Return the process-wide host health table, or None when disabled (KR_HOST_HEALTH=0) or unavailable."""
+    global _host_health
+    if os.environ.get('KR_HOST_HEALTH') == '0':
+        return None
+    if _host_health is None:
+        try:
+            _host_health = HostHealth()
+        except Exception as e:
+            logging.warning(f"Host health table unavailable: {str(e)}")
+            return None
+    return _host_health
+
+def get_cse_limiter():
+    """Return the process-wide CSE rate limiter, or None when disabled (KR_CSE_LIMITER=0) or unavailable."""
+    global _cse_limiter
+    if os.environ.get('KR_CSE_LIMITER') == '0':
+        return None
+    if _cse_limiter is None:
+        try:
+            _cse_limiter = CseRateLimiter()
+        except Exception as e:
+            logging.warning(f"CSE rate limiter unavailable: {str(e)}")
+            return None
+    return _cse_limiter
+
+def get_artifact_store():
+    """Return the process-wide artifact store, or None when disabled (KR_ARTIFACT_CACHE=0) or unavailable."""
+    global _artifact_store
+    if os.environ.get('KR_ARTIFACT_CACHE') == '0':
+        return None
+    if _artifact_store is None:
+        try:
+            _artifact_store = ArtifactStore()
+        except Exception as e:
+            logging.warning(f"Artifact store unavailable: {str(e)}")
+            return None
+    return _artifact_store
+
+def get_fingerprint_index():
+    """Return the process-wide page fingerprint index, or None when disabled (KR_DEDUP=0 or KR_DEDUP_INDEX=0) or unavailable."""
+    global _fingerprint_index
+    if not DEDUP or os.environ.get('KR_DEDUP_INDEX') == '0':
+        return None
+    if _fingerprint_index is None:
+        try:
+            _fingerprint_index = FingerprintIndex()
+        except Exception as e:
+            logging.warning(f"Fingerprint index unavailable: {str(e)}")
+            return None
+    return _fingerprint_index
+
+def load_artifact(artifacts, key, kind, stat_name):
+    """Stored artifact for a (url, content_hash) key, or None; the lookup is counted
+    under artifacts['stats'][stat_name]. `artifacts` is {'store', 'stats', 'refresh'}."""
+    value = None
+    if not artifacts.get('refresh'):
+        try:
+            value = artifacts['store'].get(key[0], key[1], kind)
+        except Exception as e:
+            logging.warning(f"Artifact store read failed for {key[0]}: {str(e)}")
+    count_stat((artifacts.get('stats') or {}).get(stat_name), 'hits' if value is not None else 'misses')
+    return value
+
+def store_artifact(artifacts, key, kind, value):
+    try:
+        artifacts['store'].put(key[0], key[1], kind, value)
+    except Exception as e:
+        logging.warning(f"Artifact store write failed for {key[0]}: {str(e)}")
+
+# --- Run metrics and profiling -----------------------------------------------
+class RunMetrics:
+    """Wall and CPU time per pipeline stage for one research run.
+
+    Stages may be timed from fetch threads; CPU time is that thread's own
+    (time.thread_time), so concurrent fetches do not inflate each other.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = (time.perf_counter(), time.process_time())
+        self.stages = {}
+        self.pages = []
+        self.counters = {'bytes_downloaded': 0, 'tokens': 0}
+
+    def add(self, name, wall, cpu):
+        with self._lock:
+            stage = self.stages.setdefault(name, {'wall_ms': 0.0, 'cpu_ms': 0.0, 'calls': 0})
+            stage['wall_ms'] += wall * 1000
+            stage['cpu_ms'] += cpu * 1000
+            stage['calls'] += 1
+
+    @contextmanager
+    def stage(self, name):
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - wall, time.thread_time() - cpu)
+
+    def count(self, name, amount):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def merge(self, stages):
+        """Add stage totals collected elsewhere (e.g. {name: {wall_ms, cpu_ms, calls}} from a pool worker)."""
+        with self._lock:
+            for name, v in stages.items():
+                stage = self.stages.setdefault(name, {'wall_ms': 0.0, 'cpu_ms': 0.0, 'calls': 0})
+                stage['wall_ms'] += v['wall_ms']
+                stage['cpu_ms'] += v['cpu_ms']
+                stage['calls'] += v['calls']
+
+    def add_page(self, info):
+        with self._lock:
+            self.pages.append(info)
+
+    def as_dict(self):
+        """Snapshot for the JSON output (late writes from abandoned fetches are not included)."""
+        with self._lock:
+            return {
+                'import': import_metrics(),
+                'stages': {
+                    name: {'wall_ms': round(v['wall_ms'], 1), 'cpu_ms': round(v['cpu_ms'], 1), 'calls': v['calls']}
+                    for name, v in self.stages.items()
+                },
+                'pages': [dict(p) for p in self.pages],
+                **self.counters,
+                'total': {
+                    'wall_ms': round((time.perf_counter() - self._started[0]) * 1000, 1),
+                    'cpu_ms': round((time.process_time() - self._started[1]) * 1000, 1),
+                },
+            }
+
+def stage_timer(metrics, name):
+    """metrics.stage(name), or a no-op when no RunMetrics is being collected."""
+    return metrics.stage(name) if metrics is not None else nullcontext()
+
+# Optional profile capture per run: KR_PROFILE (or input "profile") = cprofile | tracemalloc
+PROFILE_MODES = ('cprofile', 'tracemalloc')
+PROFILE_DIR = os.environ.get('KR_PROFILE_DIR') or os.path.join(CACHE_DIR, 'profiles')
+
+@contextmanager
+def profile_capture(mode, label, info):
+    """Profile the enclosed block and write the capture under PROFILE_DIR.
+
+    cprofile writes a .prof file (open with pstats/snakeviz); tracemalloc writes the
+    top allocation sites and the traced peak to a .txt file. `info` receives the mode
+    and path. Unknown modes are ignored.
+    """
+    if mode not in PROFILE_MODES:
+        yield
+        return
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r'[^a-z0-9]+', '-', label.lower()).strip('-')[:60] or 'run'
+    base = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{slug}")
+    if mode == 'cprofile':
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            path = base + '.prof'
+            profiler.dump_stats(path)
+            info.update({'mode': mode, 'path': path})
+    else:
+        import tracemalloc
+        started_here = not tracemalloc.is_tracing()
+        if started_here:
+            tracemalloc.start(10)
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            if started_here:
+                tracemalloc.stop()
+            path = base + '.txt'
+            with open(path, 'w') as f:
+                f.write(f"traced current={current} peak={peak} bytes\n")
+                for stat in snapshot.statistics('lineno')[:50]:
+                    f.write(f"{stat}\n")
+            info.update({'mode': mode, 'path': path, 'traced_peak_bytes': peak})
+
+# Custom Search endpoint (KR_CSE_ENDPOINT points it at a local stand-in, e.g. for benchmarks)
+CSE_ENDPOINT = os.environ.get('KR_CSE_ENDPOINT') or "https://www.googleapis.com/customsearch/v1"
+
+# The API returns at most 10 results per call and only the first 100 of a query
+CSE_PAGE_SIZE = 10
+CSE_MAX_RESULTS = 100
+
+def normalize_result_url(url):
+    """URL identity for de-duplicating SERP results (scheme/host case and fragment ignored)."""
+    parts = urllib.parse.urlsplit(url.strip())
+    return urllib.parse.urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', parts.query, ''))
+
+def _search_page(params, cache=None, cache_stats=None, refresh_cache=False, call_stats=None, limiter=None):
+    """One Custom Search call (a single `start` offset), through the cache and rate limiter when given."""
+    if cache is not None:
+        cached = None
+        if not refresh_cache:
+            try:
+                cached = cache.get(params)
+            except Exception as e:
+                logging.warning(f"CSE cache read failed: {str(e)}")
+        count_stat(cache_stats, 'hits' if cached else 'misses')
+        if cached:
+            return cached
+
+    if limiter is not None:
+        # Queues until the shared token bucket allows a call; fails only when the day's budget is gone
+        try:
+            waited, remaining = limiter.acquire()
+        except CseQuotaExceeded as e:
+            return {'status': 'error', 'message': str(e), 'code': 'CSE_QUOTA_EXCEEDED'}
+        except Exception as e:
+            logging.warning(f"CSE rate limiter failed, calling anyway: {str(e)}")
+            waited, remaining = 0.0, None
+        count_stat(call_stats, 'quota_wait_ms', round(waited * 1000, 1))
+        if call_stats is not None and remaining is not None:
+            call_stats['quota_remaining'] = remaining
+
+    try:
+        # Set up headers with random user agent to avoid detection
+        headers = {
+            'User-Agent': get_random_user_agent()
+        }
+        
+        # Make the request
+        count_stat(call_stats, 'calls')
+        response = get_http_session().get(CSE_ENDPOINT, params=params, headers=headers)
+        
+        if response.status_code == 200:
+            data = response.json()
+            
+            # Extract search results
+            results = []
+            if 'items' in data:
+                for item in data['items']:
+                    result = {
+                        'title': item.get('title', 'No title'),
+                        'url': item.get('link', ''),
+                        'snippet': item.get('snippet', 'No snippet available'),
+                        'displayLink': item.get('displayLink', '')
+                    }
+                    results.append(result)
+            
+            response_data = {
+                'status': 'success',
+                'results': results,
+                'total_results': data.get('searchInformation', {}).get('totalResults', '0'),
+                'search_time': data.get('searchInformation', {}).get('searchTime', 0),
+                'query': params['q']
+            }
+            if cache is not None:
+                try:
+                    cache.put(params, response_data)
+                except Exception as e:
+                    logging.warning(f"CSE cache write failed: {str(e)}")
+            return response_data
+        else:
+            return {
+                'status': 'error',
+                'message': f"API Error: {response.status_code}",
+                'details': response.text
+            }
+            
+    except Exception as e:
+        return {
+            'status': 'error',
+            'message': str(e)
+        }
+
 def google_search_api(query, api_key, cx, num_results=10, start_index=1, search_type=None, 
                      file_type=None, site_search=None, safe_search='off', language='lang_en', 
-                     country_restrict='countryAU'):
+                     country_restrict='countryAU', cache=None, cache_stats=None,
+                     refresh_cache=False, seen_urls=None, limiter=None):
     """
     Perform a Google search using the official Google Custom Search JSON API.
     
@@ -158,7 +1134,8 @@ def google_search_api(query, api_key, cx, num_results=10, start_index=1, search_
         query: The search query
         api_key: Your Google API key
         cx: Your Custom Search Engine ID
-        num_results: Total number of results to return (may require multiple API calls)
+        num_results: Total number of results to return; beyond 10 the later `start`
+            offsets are requested concurrently (the API serves the first 100 at most)
         start_index: Starting index for search results (1-based)
         search_type: Type of search ('image' for image search)
         file_type: Filter by file type (e.g., 'pdf', 'doc', 'xls')
@@ -166,16 +1143,17 @@ def google_search_api(query, api_key, cx, num_results=10, start_index=1, search_
         safe_search: Safe search level ('off', 'medium', 'high')
         language: Language restriction (e.g., 'lang_en' for English)
         country_restrict: Country restriction (e.g., 'countryAU' for Australia)
+        cache: Optional SearchCache; successful responses are served from / stored in it
+        cache_stats: Optional dict whose 'hits'/'misses' counters are incremented
+        refresh_cache: Skip the cache read (the fresh response is still stored)
+        seen_urls: URLs already in hand (e.g. from shallower pages); they are dropped
+        limiter: Optional CseRateLimiter every API call waits for (cache hits do not)
     
     Returns:
-        A list of dictionaries containing search result data
+        A dict with the results of all pages merged in rank order and de-duplicated by
+        URL, plus 'cse_calls', the number of API requests made (cache hits are free),
+        and with a limiter 'quota_wait_ms' and 'quota_remaining' (calls left today)
     """
-    # Build the API URL
-    url = "https://www.googleapis.com/customsearch/v1"
-    
-    # Prepare to collect all results
-    all_results = []
-    
     # Modify query if site search is specified
     if site_search:
         query = f"{query} site:{site_search}"
@@ -189,8 +1167,6 @@ def google_search_api(query, api_key, cx, num_results=10, start_index=1, search_
         'q': query,
         'key': api_key,
         'cx': cx,
-        'num': min(num_results, 10),  # Max 10 results per request
-        'start': start_index,
         'safe': safe_search
     }
     
@@ -203,78 +1179,146 @@ def google_search_api(query, api_key, cx, num_results=10, start_index=1, search_
     if country_restrict:
         params['cr'] = country_restrict
 
+    # One call per page of (at most) 10 results
+    pages = []
+    start = start_index
+    end = min(start_index + num_results, CSE_MAX_RESULTS + 1)
+    while start < end:
+        pages.append(dict(params, start=start, num=min(CSE_PAGE_SIZE, end - start)))
+        start += CSE_PAGE_SIZE
+    if not pages:
+        return {'status': 'success', 'results': [], 'total_results': '0', 'search_time': 0,
+                'query': query, 'cse_calls': 0}
+
+    call_stats = {'calls': 0}
+    fetch = lambda page_params: _search_page(page_params, cache, cache_stats, refresh_cache, call_stats, limiter)
+    if len(pages) == 1:
+        responses = [fetch(pages[0])]
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=len(pages)) as pool:
+            responses = list(pool.map(fetch, pages))
+
+    first = responses[0]
+    usage = {'cse_calls': call_stats['calls']}
+    if limiter is not None:
+        usage['quota_wait_ms'] = round(call_stats.get('quota_wait_ms', 0), 1)
+        usage['quota_remaining'] = call_stats.get('quota_remaining')
+    if first.get('status') != 'success':
+        return dict(first, **usage)
+
+    all_results = []
+    seen = {normalize_result_url(url) for url in (seen_urls or ()) if url}
+    for page_params, response in zip(pages, responses):
+        if response.get('status') != 'success':
+            logging.warning(f"CSE page at start={page_params['start']} failed: {response.get('message')}")
+            continue
+        for result in response['results']:
+            key = normalize_result_url(result['url']) if result['url'] else None
+            if key in seen:
+                continue
+            if key:
+                seen.add(key)
+            all_results.append(dict(result))
+
+    return dict(first, results=all_results, query=query, **usage)
+
+# --- Document model ---------------------------------------------------------
+# One parse per page yields everything the analysis needs: headers in document
+# order (level, lowercased text) and the cleaned visible text. lxml is used when
+# available (several times faster than html.parser); KR_HTML_PARSER=html.parser
+# forces the BeautifulSoup path.
+ParsedDocument = namedtuple('ParsedDocument', ['headers', 'text'])
+
+HEADER_TAGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+EMPTY_DOCUMENT = ParsedDocument([], '')
+
+def utf8_html_parser(**options):
+    """An lxml HTML parser for UTF-8 bytes (the fetched pages), ignoring any other <meta> charset.
+
+    Parsers are not thread-safe, so callers on fetch threads get their own.
+    """
+    return lxml_html.HTMLParser(encoding='utf-8', **options)
+
+def _parse_document_lxml(html_content):
     try:
-        # Set up headers with random user agent to avoid detection
-        headers = {
-            'User-Agent': get_random_user_agent()
-        }
-        
-        # Make the request
-        response = requests.get(url, params=params, headers=headers)
+        if isinstance(html_content, bytes):
+            root = lxml_html.document_fromstring(html_content, parser=utf8_html_parser())
+        else:
+            root = lxml_html.document_fromstring(html_content)
+    except ValueError:
+        # Unicode strings with an XML encoding declaration must be passed as bytes
+        root = lxml_html.document_fromstring(html_content.encode('utf-8'))
+    except lxml_etree.ParserError:
+        # "Document is empty"
+        return EMPTY_DOCUMENT
+    # Drop what BeautifulSoup's get_text() would not return
+    lxml_etree.strip_elements(
+        root, lxml_etree.Comment, lxml_etree.ProcessingInstruction,
+        'script', 'style', 'template', with_tail=False
+    )
+    headers = []
+    for tag in root.iter(*HEADER_TAGS):
+        header_text = ''.join(part.strip() for part in tag.itertext())
+        if header_text:
+            headers.append((int(tag.tag[1]), header_text.lower()))
+    # Whitespace is collapsed part by part, so the text is built in one join
+    text = ' '.join(filter(None, (' '.join(part.split()) for part in root.itertext())))
+    return ParsedDocument(headers, text)
+
+def _parse_document_bs4(html_content):
+    from bs4 import BeautifulSoup
+    if isinstance(html_content, bytes):
+        soup = BeautifulSoup(html_content, 'html.parser', from_encoding='utf-8')
+    else:
+        soup = BeautifulSoup(html_content, 'html.parser')
+    # Remove script and style elements
+    for script in soup(["script", "style"]):
+        script.extract()
+    headers = []
+    for tag in soup.find_all(list(HEADER_TAGS)):
+        header_text = tag.get_text(strip=True)
+        if header_text:
+            headers.append((int(tag.name[1]), header_text.lower()))
+    text = soup.get_text(separator=" ", strip=True)
+    return ParsedDocument(headers, re.sub(r'\s+', ' ', text))
+
+def parse_document(html_content):
+    """Parse HTML (str, or UTF-8 bytes as fetched) once into a ParsedDocument (ordered headers + cleaned text)."""
+    if isinstance(html_content, ParsedDocument):
+        return html_content
+    if not html_content or not html_content.strip():
+        return EMPTY_DOCUMENT
+    try:
+        if lxml_html is not None and os.environ.get('KR_HTML_PARSER') != 'html.parser':
+            return _parse_document_lxml(html_content)
+        return _parse_document_bs4(html_content)
+    except Exception as e:
+        logging.error(f"Error parsing document: {str(e)}")
+        return EMPTY_DOCUMENT
+
+def merge_documents(documents):
+    """Concatenate parsed documents in order (same result as parsing the joined HTML)."""
+    headers = []
+    texts = []
+    for doc in documents:
+        headers.extend(doc.headers)
+        if doc.text:
+            texts.append(doc.text)
+    return ParsedDocument(headers, ' '.join(texts))
+
+def extract_header_hierarchy(html_content):
+    """Extract header tags and their hierarchical relationships (HTML or ParsedDocument)."""
+    try:
+        doc = parse_document(html_content)
+
+        # Process hierarchical relationships
+        header_hierarchy = {}
+        current_parent = {1: None, 2: None, 3: None, 4: None, 5: None, 6: None}
         
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Extract search results
-            results = []
-            if 'items' in data:
-                for item in data['items']:
-                    result = {
-                        'title': item.get('title', 'No title'),
-                        'url': item.get('link', ''),
-                        'snippet': item.get('snippet', 'No snippet available'),
-                        'displayLink': item.get('displayLink', '')
-                    }
-                    results.append(result)
-                    all_results.append(result)
-            
-            return {
-                'status': 'success',
-                'results': all_results,
-                'total_results': data.get('searchInformation', {}).get('totalResults', '0'),
-                'search_time': data.get('searchInformation', {}).get('searchTime', 0),
-                'query': query
-            }
-        else:
-            return {
-                'status': 'error',
-                'message': f"API Error: {response.status_code}",
-                'details': response.text
-            }
-            
-    except Exception as e:
-        return {
-            'status': 'error',
-            'message': str(e)
-        }
-
-def extract_header_hierarchy(html_content):
-    """Extract header tags and their hierarchical relationships from HTML content."""
-    try:
-        soup = BeautifulSoup(html_content, 'html.parser')
-        headers = []
-        
-        # Find all header tags in order of appearance
-        for tag in soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
-            if tag.get_text(strip=True):
-                header_level = int(tag.name[1])
-                header_text = tag.get_text(strip=True).lower()
-                headers.append({
-                    'text': header_text,
-                    'level': header_level,
-                    'tag': tag.name
-                })
-        
-        # Process hierarchical relationships
-        header_hierarchy = {}
-        current_parent = {1: None, 2: None, 3: None, 4: None, 5: None, 6: None}
-        
-        for i, header in enumerate(headers):
-            level = header['level']
-            text = header['text']
-            
-            # Update current parent for this level
-            current_parent[level] = text
+        for i, (level, text) in enumerate(doc.headers):
+            # Update current parent for this level
+            current_parent[level] = text
             
             # Clear all child levels
             for l in range(level + 1, 7):
@@ -301,31 +1345,22 @@ def extract_header_hierarchy(html_content):
         return {}
 
 def extract_headers_from_html(html_content):
-    """Extract header tags from HTML content."""
+    """Extract h1/h2/h3 header text (HTML or ParsedDocument)."""
     try:
-        soup = BeautifulSoup(html_content, 'html.parser')
-        headers = {
-            'h1': [h.get_text(strip=True).lower() for h in soup.find_all('h1') if h.get_text(strip=True)],
-            'h2': [h.get_text(strip=True).lower() for h in soup.find_all('h2') if h.get_text(strip=True)],
-            'h3': [h.get_text(strip=True).lower() for h in soup.find_all('h3') if h.get_text(strip=True)]
-        }
+        doc = parse_document(html_content)
+        headers = {'h1': [], 'h2': [], 'h3': []}
+        for level, text in doc.headers:
+            if level <= 3:
+                headers[f'h{level}'].append(text)
         return headers
     except Exception as e:
         logging.error(f"Error extracting headers: {str(e)}")
         return {'h1': [], 'h2': [], 'h3': []}
 
 def clean_html(content):
-    """Clean and normalize HTML text."""
+    """Clean and normalize HTML text (HTML or ParsedDocument)."""
     try:
-        soup = BeautifulSoup(content, 'html.parser')
-        # Remove script and style elements
-        for script in soup(["script", "style"]):
-            script.extract()
-        # Get text
-        text = soup.get_text(separator=" ", strip=True)
-        # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text)
-        return text
+        return parse_document(content).text
     except Exception as e:
         logging.error(f"Error cleaning HTML: {str(e)}")
         return content
@@ -357,100 +1392,406 @@ def find_phrase_in_headers(phrase, header_hierarchy):
     
     return hierarchy_levels, common_parent
 
-def analyze_keywords(content, min_length=3, ngram_range=(2, 4)):
-    """Analyze content to get keyword and phrase frequencies with hierarchical information."""
+class PhraseMatcher:
+    """Aho-Corasick automaton over a fixed set of phrases.
+
+    Built once per analysis; count_in() then finds every phrase in a text with a
+    single left-to-right scan instead of one substring search per phrase.
+    """
+
+    def __init__(self, phrases):
+        self.phrases = list(dict.fromkeys(p for p in phrases if p))
+        self.lengths = [len(p) for p in self.phrases]
+        goto = [{}]
+        out = [None]
+        for pid, phrase in enumerate(self.phrases):
+            state = 0
+            for ch in phrase:
+                edges = goto[state]
+                nxt = edges.get(ch)
+                if nxt is None:
+                    nxt = edges[ch] = len(goto)
+                    goto.append({})
+                    out.append(None)
+                state = nxt
+            out[state] = pid
+
+        # Breadth-first failure links, plus a link to the nearest state on the
+        # failure chain that ends a phrase (so scans skip output-less states)
+        fail = [0] * len(goto)
+        out_link = [0] * len(goto)
+        order = list(goto[0].values())
+        for state in order:
+            for ch, nxt in goto[state].items():
+                order.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                target = goto[f].get(ch, 0) if state else 0
+                fail[nxt] = target
+                out_link[nxt] = target if out[target] is not None else out_link[target]
+        self.goto = goto
+        self.fail = fail
+        self.out = out
+        self.out_link = out_link
+
+    def count_in(self, text):
+        """Return {phrase: count} with the same non-overlapping counts as str.count()."""
+        goto, fail, out, out_link, lengths = self.goto, self.fail, self.out, self.out_link, self.lengths
+        counts = {}
+        next_free = {}
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            hit = state if out[state] is not None else out_link[state]
+            while hit:
+                pid = out[hit]
+                start = i - lengths[pid] + 1
+                # str.count() resumes after each match, so overlapping hits are skipped
+                if start >= next_free.get(pid, 0):
+                    counts[pid] = counts.get(pid, 0) + 1
+                    next_free[pid] = i + 1
+                hit = out_link[hit]
+        return {self.phrases[pid]: n for pid, n in counts.items()}
+
+def match_phrases_in_headers(phrases, headers, header_hierarchy):
+    """Header metadata for many phrases at once.
+
+    Returns {phrase: {'in_h1'.., 'h1_frequency'.., 'hierarchy_levels', 'common_parent_header'}},
+    identical to running find_phrase_in_headers() plus the per-level any()/count()
+    checks for every phrase, but with one automaton pass over each distinct header.
+    """
+    patterns = []
+    for phrase in phrases:
+        patterns.append(phrase)
+        patterns.append(phrase.lower())
+    matcher = PhraseMatcher(patterns)
+
+    texts = set(header_hierarchy)
+    for level in ('h1', 'h2', 'h3'):
+        texts.update(headers.get(level, []))
+    hits = {text: matcher.count_in(text) for text in texts}
+    hits_lower = {text: matcher.count_in(text.lower()) for text in header_hierarchy if text.lower() != text}
+
+    metadata = {}
+    for phrase in phrases:
+        metadata[phrase] = {
+            'in_h1': False, 'in_h2': False, 'in_h3': False,
+            'h1_frequency': 0, 'h2_frequency': 0, 'h3_frequency': 0,
+            'hierarchy_levels': [], 'common_parent_header': None,
+        }
+
+    for level in ('h1', 'h2', 'h3'):
+        for text in headers.get(level, []):
+            for phrase, n in hits[text].items():
+                meta = metadata.get(phrase)
+                if meta is not None:
+                    meta[f'in_{level}'] = True
+                    meta[f'{level}_frequency'] += n
+
+    # Hierarchy matching is case-insensitive, like find_phrase_in_headers()
+    by_lower = {}
+    for phrase in phrases:
+        by_lower.setdefault(phrase.lower(), []).append(phrase)
+    matching = {}
+    for text, info in header_hierarchy.items():
+        for pattern in hits_lower.get(text, hits[text]):
+            for phrase in by_lower.get(pattern, ()):
+                matching.setdefault(phrase, []).append(info)
+    for phrase, infos in matching.items():
+        infos.sort(key=lambda x: x['index'])
+        metadata[phrase]['hierarchy_levels'] = [h['level'] for h in infos]
+        metadata[phrase]['common_parent_header'] = infos[0]['parent']
+    return metadata
+
+# --- Tokenization -----------------------------------------------------------
+# Text is fed to spaCy in whitespace-aligned chunks so no single call comes near
+# nlp.max_length; chunk boundaries fall on spaces, so tokens are the same as for
+# one big call. Without spaCy (or with KR_TOKENIZER=regex) a compiled regex is used.
+TOKENIZE_CHUNK_CHARS = 100000
+WORD_TOKEN_RE = re.compile(r'\w+')
+
+def iter_text_chunks(text, chunk_chars=TOKENIZE_CHUNK_CHARS):
+    """Split text into chunks of roughly chunk_chars, cutting only at whitespace.
+
+    A run without spaces longer than chunk_chars is kept whole rather than split.
+    """
+    start = 0
+    length = len(text)
+    while start < length:
+        end = start + chunk_chars
+        if end < length:
+            cut = text.rfind(' ', start, end)
+            if cut <= start:
+                cut = text.find(' ', end)
+            end = cut + 1 if cut != -1 else length
+        yield text[start:end]
+        start = end
+
+def tokenize_words(text, stats=None):
+    """Return word tokens (no punctuation/space tokens) from cleaned text.
+
+    stats, if given, is filled with the engine used, token count and tokens/second.
+    """
+    started = time.perf_counter()
+    nlp = get_nlp() if os.environ.get('KR_TOKENIZER') != 'regex' else None
+    if nlp is not None:
+        engine = 'spacy'
+        words = []
+        for doc in nlp.pipe(iter_text_chunks(text), batch_size=8):
+            words.extend(token.text for token in doc if not token.is_punct and not token.is_space)
+    else:
+        engine = 'regex'
+        words = WORD_TOKEN_RE.findall(text)
+    elapsed = time.perf_counter() - started
+    if stats is not None:
+        stats.update({
+            'engine': engine,
+            'tokens': len(words),
+            'seconds': round(elapsed, 4),
+            'tokens_per_second': int(len(words) / elapsed) if elapsed > 0 else None,
+        })
+    return words
+
+# --- N-gram counting ----------------------------------------------------------
+# Navigation / UI garbage that should never take a keyword slot
+DIRTY_TOKENS = {
+    'menu', 'close', 'keyboard_arrow_left', 'keyboard_arrow_right',
+    'back', 'previous'
+}
+
+def _count_ngrams_numpy(words, stop_words, min_length, ngram_range):
+    np = get_numpy()
+    vocab = {}
+    ids = np.fromiter((vocab.setdefault(w, len(vocab)) for w in words), dtype=np.int64, count=len(words))
+    id2word = list(vocab)
+    size = len(id2word)
+    is_stop = np.fromiter((w.lower() in stop_words for w in id2word), dtype=bool, count=size)
+    is_dirty = np.fromiter((w.lower() in DIRTY_TOKENS for w in id2word), dtype=bool, count=size)
+    is_long = np.fromiter((len(w) >= min_length for w in id2word), dtype=bool, count=size)
+
+    counts = np.bincount(ids[~is_stop[ids] & ~is_dirty[ids] & is_long[ids]], minlength=size).tolist()
+    word_counts = {id2word[i]: c for i, c in enumerate(counts) if c}
+
+    stop_at = is_stop[ids]
+    clean_at = ~is_dirty[ids]
+    total = len(ids)
+    phrase_counts = []
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        windows = total - n + 1
+        grams = {}
+        if windows > 0:
+            valid = ~stop_at[:windows] & ~stop_at[n - 1:n - 1 + windows]
+            for j in range(n):
+                valid &= clean_at[j:j + windows]
+            starts = np.nonzero(valid)[0]
+            if len(starts):
+                columns = [ids[starts + j] for j in range(n)]
+                if size ** n < 2 ** 63:
+                    keys = np.zeros(len(starts), dtype=np.int64)
+                    for column in columns:
+                        keys = keys * size + column
+                    _, first, gram_counts = np.unique(keys, return_index=True, return_counts=True)
+                else:
+                    _, first, gram_counts = np.unique(np.stack(columns, axis=1), axis=0,
+                                                      return_index=True, return_counts=True)
+                # First-occurrence order, like a Counter fed in text order
+                order = np.argsort(first, kind='stable')
+                positions = starts[first[order]]
+                columns = [[id2word[t] for t in ids[positions + j].tolist()] for j in range(n)]
+                grams = dict(zip(map(' '.join, zip(*columns)), gram_counts[order].tolist()))
+        phrase_counts.append(grams)
+    return word_counts, phrase_counts
+
+def _count_ngrams_python(words, stop_words, min_length, ngram_range):
+    word_counts = dict(Counter(
+        w for w in words
+        if w.lower() not in stop_words and w.lower() not in DIRTY_TOKENS and len(w) >= min_length
+    ))
+    end_ok = [w.lower() not in stop_words for w in words]
+    dirty_before = [0]
+    for w in words:
+        dirty_before.append(dirty_before[-1] + (w.lower() in DIRTY_TOKENS))
+    phrase_counts = []
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        keep = [
+            first and last and dirty_end == dirty_start
+            for first, last, dirty_start, dirty_end in zip(end_ok, end_ok[n - 1:], dirty_before, dirty_before[n:])
+        ]
+        grams = Counter(compress(zip(*(words[j:] for j in range(n))), keep))
+        phrase_counts.append({' '.join(gram): count for gram, count in grams.items()})
+    return word_counts, phrase_counts
+
+def count_ngrams(words, stop_words, min_length=3, ngram_range=(2, 4)):
+    """Full (untruncated) counts for one document, for merging with other documents.
+
+    Returns (word_counts, phrase_counts): a {word: count} dict and one {phrase: count}
+    dict per n-gram size, each in first-occurrence order. Stopword and DIRTY_TOKENS
+    filtering happens before counting: single words drop both, phrases may not
+    start/end with a stopword or contain a dirty token. Tokens are integer-encoded
+    and n-grams counted as packed integer keys with NumPy; the pure-Python path is
+    used when NumPy is not installed.
+    """
+    if words and get_numpy() is not None:
+        return _count_ngrams_numpy(words, stop_words, min_length, ngram_range)
+    return _count_ngrams_python(words, stop_words, min_length, ngram_range)
+
+def count_keywords(words, stop_words, min_length=3, ngram_range=(2, 4), top_words=150, top_phrases=200):
+    """Top single words and 2-4 word phrases of count_ngrams() as (text, frequency) lists.
+
+    Ties are ordered as Counter.most_common() would order them: by first
+    occurrence, shorter phrases first.
+    """
+    word_counts, phrase_counts = count_ngrams(words, stop_words, min_length, ngram_range)
+    phrases = {}
+    for counts in phrase_counts:
+        phrases.update(counts)  # sizes never share a phrase
+    single = heapq.nlargest(top_words, word_counts.items(), key=lambda item: item[1])
+    return single, heapq.nlargest(top_phrases, phrases.items(), key=lambda item: item[1])
+
+class NgramCounter:
+    """count_ngrams() fed one token chunk at a time.
+
+    The last ngram_range[1] - 1 tokens of every chunk are carried into the next one,
+    so n-grams across a chunk boundary are counted once, and whatever the carried
+    tokens already contributed is subtracted again. result() equals count_ngrams()
+    over all chunks joined, first-occurrence order included, while only one chunk's
+    tokens are held at a time.
+    """
+
+    def __init__(self, stop_words, min_length=3, ngram_range=(2, 4)):
+        self.args = (stop_words, min_length, ngram_range)
+        self.keep = ngram_range[1] - 1
+        self.carry = []
+        self.word_counts = {}
+        self.phrase_counts = [{} for _ in range(ngram_range[0], ngram_range[1] + 1)]
+
+    @staticmethod
+    def _add(totals, counts, seen):
+        for key, count in counts.items():
+            count -= seen.get(key, 0)
+            if count:
+                totals[key] = totals.get(key, 0) + count
+
+    def feed(self, words):
+        """Count the next chunk of tokens. The list is extended in place, not copied."""
+        if not words:
+            return
+        words[:0] = self.carry
+        word_counts, phrase_counts = count_ngrams(words, *self.args)
+        if self.carry:
+            seen_words, seen_phrases = count_ngrams(self.carry, *self.args)
+        else:
+            seen_words, seen_phrases = {}, [{}] * len(phrase_counts)
+        self._add(self.word_counts, word_counts, seen_words)
+        for totals, counts, seen in zip(self.phrase_counts, phrase_counts, seen_phrases):
+            self._add(totals, counts, seen)
+        self.carry = words[-self.keep:] if self.keep else []
+
+    def result(self):
+        return self.word_counts, self.phrase_counts
+
+def normalize_for_counting(text):
+    """Lowercase and drop punctuation and digits before tokenizing."""
+    text = text.lower()
+    text = re.sub(r'[^\w\s]', '', text)  # Remove punctuation
+    return re.sub(r'\d+', '', text)      # Remove numbers
+
+def _document_words(doc, tokenizer_stats=None, metrics=None):
+    """Clean and tokenize one ParsedDocument's text."""
+    with stage_timer(metrics, 'clean'):
+        cleaned_content = normalize_for_counting(clean_html(doc))
+    # Tokenize (spaCy tokenizer only, or the regex fallback)
+    if not _nlp_loaded and os.environ.get('KR_TOKENIZER') != 'regex':
+        # First use in this process loads the model; time it on its own
+        with stage_timer(metrics, 'model_load'):
+            get_nlp()
+    with stage_timer(metrics, 'tokenize'):
+        words = tokenize_words(cleaned_content, stats=tokenizer_stats)
+    if metrics is not None:
+        metrics.count('tokens', len(words))
+    return words
+
+def iter_document_words(doc, tokenizer_stats=None, metrics=None):
+    """Clean and tokenize one ParsedDocument's text a chunk at a time, yielding each chunk's tokens.
+
+    Only one chunk's normalized text and tokens are alive at once; tokenizer_stats
+    receives the totals for the whole text.
+    """
+    if not _nlp_loaded and os.environ.get('KR_TOKENIZER') != 'regex':
+        with stage_timer(metrics, 'model_load'):
+            get_nlp()
+    totals = {'engine': None, 'tokens': 0, 'seconds': 0.0}
+    # Chunks are cut at spaces and normalizing works character by character,
+    # so the tokens are the same as for the whole text at once
+    for chunk in iter_text_chunks(doc.text) if doc.text else ('',):
+        with stage_timer(metrics, 'clean'):
+            cleaned = normalize_for_counting(chunk)
+        stats = {}
+        with stage_timer(metrics, 'tokenize'):
+            words = tokenize_words(cleaned, stats=stats)
+        del cleaned
+        totals['engine'] = stats['engine']
+        totals['tokens'] += stats['tokens']
+        totals['seconds'] += stats['seconds']
+        if metrics is not None:
+            metrics.count('tokens', len(words))
+        yield words
+        del words  # not alive next to the next chunk's tokens
+    if tokenizer_stats is not None:
+        seconds = totals['seconds']
+        tokenizer_stats.update(totals, seconds=round(seconds, 4),
+                               tokens_per_second=int(totals['tokens'] / seconds) if seconds > 0 else None)
+
+def analyze_keywords(content, min_length=3, ngram_range=(2, 4), tokenizer_stats=None, metrics=None):
+    """Analyze content (HTML or ParsedDocument) to get keyword and phrase frequencies with hierarchical information.
+
+    metrics, if given, is a RunMetrics that receives the parse / clean / tokenize /
+    ngram_count / header_match stage timings and the token count.
+    """
     # logging.info("Starting keyword analysis")
     # logging.debug(f"Content length: {len(content)} characters")
     
-    if not nlp:
-        logging.error("spaCy model not available, cannot perform keyword analysis")
-        return [], [], {'h1': [], 'h2': [], 'h3': []}, {}
-    
     try:
-        # Extract header hierarchy from original HTML
-        header_hierarchy = extract_header_hierarchy(content)
-        # logging.info(f"Extracted header hierarchy with {len(header_hierarchy)} headers")
-        
-        # Extract headers from original HTML (for backward compatibility)
-        headers = extract_headers_from_html(content)
-        # logging.info(f"Extracted headers: {sum(len(h) for h in headers.values())} total headers found")
-        
-        # Clean and normalize text for keyword analysis
-        cleaned_content = clean_html(content)
-        cleaned_content = cleaned_content.lower()
-        cleaned_content = re.sub(r'[^\w\s]', '', cleaned_content)  # Remove punctuation
-        cleaned_content = re.sub(r'\d+', '', cleaned_content)      # Remove numbers
-        # logging.debug("Text cleaned and normalized")
+        # Parse once; every step below reads the same document model
+        with stage_timer(metrics, 'parse'):
+            doc = parse_document(content)
+
+            # Extract header hierarchy from original HTML
+            header_hierarchy = extract_header_hierarchy(doc)
+            # logging.info(f"Extracted header hierarchy with {len(header_hierarchy)} headers")
+
+            # Extract headers from original HTML (for backward compatibility)
+            headers = extract_headers_from_html(doc)
+            # logging.info(f"Extracted headers: {sum(len(h) for h in headers.values())} total headers found")
         
-        # Tokenize with spaCy
-        # logging.info("Starting spaCy tokenization")
-        doc = nlp(cleaned_content)
-        words = [token.text for token in doc if not token.is_punct and not token.is_space]
+        # Clean, normalize and tokenize the text for keyword analysis
+        words = _document_words(doc, tokenizer_stats, metrics)
         # logging.debug(f"Found {len(words)} tokens after spaCy processing")
         
-        # Define stop words
-        stop_words = set(nltk.corpus.stopwords.words('english'))
-        custom_stopwords = {
-            'get', 'us', 'click', 'also', 'one', 'way', 'new',
-            'whether', 'want', 'you', 'job', 'gregory', 'brw'
-        }
-        stop_words.update(custom_stopwords)
+        # Stop words (NLTK English + custom, from the prebuilt artifact)
+        stop_words = load_stop_words()
         # logging.debug(f"Using {len(stop_words)} stop words")
         
-        # Single-word keywords
-        single_words = [word for word in words if word.lower() not in stop_words and len(word) >= min_length]
-        single_word_freq = Counter(single_words)
-        # logging.info(f"Found {len(single_word_freq)} unique single words")
-        
-        # Multi-word phrases
-        phrases = []
-        for n in range(ngram_range[0], ngram_range[1] + 1):
-            n_grams = ngrams(words, n)
-            valid_phrases = [
-                ' '.join(gram) for gram in n_grams 
-                if gram[0].lower() not in stop_words 
-                and gram[-1].lower() not in stop_words
-            ]
-            phrases.extend(valid_phrases)
-        phrase_freq = Counter(phrases)
-        # logging.info(f"Found {len(phrase_freq)} unique phrases")
-        
-        # Get top results - increased to 150 from 30
-        top_single_words = single_word_freq.most_common(150)
-        top_phrases_raw = phrase_freq.most_common(200)  # Get more phrases to account for filtering
+        # Single words and multi-word phrases (top 150 / top 200 to account for filtering)
+        with stage_timer(metrics, 'ngram_count'):
+            top_single_words, top_phrases_raw = count_keywords(
+                words, stop_words, min_length=min_length, ngram_range=ngram_range,
+                top_words=150, top_phrases=200
+            )
         
         # Enhance phrase data with hierarchical information
+        # (one automaton pass over the headers covers every phrase)
+        with stage_timer(metrics, 'header_match'):
+            header_matches = match_phrases_in_headers(
+                [phrase for phrase, _ in top_phrases_raw], headers, header_hierarchy
+            )
         top_phrases = []
         for phrase, freq in top_phrases_raw:
-            # Find hierarchy levels and common parent for the phrase
-            hierarchy_levels, common_parent = find_phrase_in_headers(phrase, header_hierarchy)
-            
-            # Check presence in h1, h2, h3 tags
-            in_h1 = any(phrase in h for h in headers['h1'])
-            in_h2 = any(phrase in h for h in headers['h2'])
-            in_h3 = any(phrase in h for h in headers['h3'])
-            
-            # Count frequency in h1, h2, h3 tags
-            h1_freq = sum(h.count(phrase) for h in headers['h1'])
-            h2_freq = sum(h.count(phrase) for h in headers['h2'])
-            h3_freq = sum(h.count(phrase) for h in headers['h3'])
-            
             # Create enhanced phrase data
-            phrase_data = [
-                phrase, 
-                freq,
-                {
-                    'in_h1': in_h1,
-                    'in_h2': in_h2,
-                    'in_h3': in_h3,
-                    'h1_frequency': h1_freq,
-                    'h2_frequency': h2_freq,
-                    'h3_frequency': h3_freq,
-                    'hierarchy_levels': hierarchy_levels,
-                    'common_parent_header': common_parent
-                }
-            ]
-            top_phrases.append(phrase_data)
+            top_phrases.append([phrase, freq, header_matches[phrase]])
         
         # Keep only top 150 phrases
         top_phrases = top_phrases[:150]
@@ -465,141 +1806,880 @@ def analyze_keywords(content, min_length=3, ngram_range=(2, 4)):
         logging.error(f"Error in keyword analysis: {str(e)}")
         return [], [], {'h1': [], 'h2': [], 'h3': []}, {}
 
+# --- Per-document analysis ------------------------------------------------------
+# Each page / snippet block is analyzed on its own (n-grams never span two documents)
+# into a DocumentAnalysis; the partials are merged in document order, so ties rank
+# exactly as they would in one Counter fed the documents one after another.
+DocumentAnalysis = namedtuple(
+    'DocumentAnalysis', ['headers', 'word_counts', 'phrase_counts', 'tokenizer_stats', 'stages']
+)
+
+# Worker processes for analysis in the persistent modes, started by preload()
+# (1 = analyze in-process). One-shot and batch runs always analyze in-process:
+# starting a pool there would cost more than the analysis itself.
+ANALYSIS_PROCESSES = max(1, int(os.environ.get('KR_ANALYSIS_PROCESSES', '') or min(4, os.cpu_count() or 1)))
+# Below this much page text in total, process start-up/pickling costs more than it saves
+ANALYSIS_PARALLEL_MIN_CHARS = int(os.environ.get('KR_ANALYSIS_PARALLEL_MIN_CHARS', '') or 100000)
+# Documents smaller than this (snippet blocks, short pages) stay in-process
+ANALYSIS_POOL_MIN_DOC_CHARS = 20000
+
+_analysis_pool = None
+_analysis_pool_lock = threading.Lock()
+
+def analyze_document(content, min_length=3, ngram_range=(2, 4)):
+    """Parse, tokenize and fully count one document (HTML or ParsedDocument).
+
+    The text is streamed through iter_document_words() into an NgramCounter, so
+    memory beyond the document itself stays at about one chunk's worth whatever its
+    size. Picklable in and out, so it runs unchanged in the analysis pool.
+    """
+    metrics = RunMetrics()
+    tokenizer_stats = {}
+    with metrics.stage('parse'):
+        doc = parse_document(content)
+    counter = NgramCounter(load_stop_words(), min_length, ngram_range)
+    for words in iter_document_words(doc, tokenizer_stats, metrics):
+        with metrics.stage('ngram_count'):
+            counter.feed(words)
+        del words  # dropped before the next chunk is tokenized
+    word_counts, phrase_counts = counter.result()
+    return DocumentAnalysis(doc.headers, word_counts, phrase_counts, tokenizer_stats, metrics.stages)
+
+def merge_analyses(partials, top_words=150, top_phrases=200):
+    """Reduce DocumentAnalysis partials (in document order) to top words, top phrases and headers."""
+    word_counts = Counter()
+    for partial in partials:
+        word_counts.update(partial.word_counts)
+    # Phrase insertion order: every document's 2-grams, then 3-grams, then 4-grams
+    phrase_counts = Counter()
+    sizes = max((len(partial.phrase_counts) for partial in partials), default=0)
+    for size in range(sizes):
+        for partial in partials:
+            phrase_counts.update(partial.phrase_counts[size])
+    headers = [header for partial in partials for header in partial.headers]
+    single = heapq.nlargest(top_words, word_counts.items(), key=lambda item: item[1])
+    phrases = heapq.nlargest(top_phrases, phrase_counts.items(), key=lambda item: item[1])
+    return single, phrases, headers
+
+def analysis_artifact_kind(min_length=3, ngram_range=(2, 4)):
+    """Artifact kind of stored DocumentAnalysis values: every setting the counts depend on."""
+    parser = 'lxml' if lxml_html is not None and os.environ.get('KR_HTML_PARSER') != 'html.parser' else 'bs4'
+    engine = 'spacy' if os.environ.get('KR_TOKENIZER') != 'regex' and get_nlp() is not None else 'regex'
+    stop_words = hashlib.sha1('\n'.join(sorted(load_stop_words())).encode('utf-8')).hexdigest()[:12]
+    return f"analysis:1:{parser}:{engine}:{stop_words}:{min_length}:{ngram_range[0]}-{ngram_range[1]}"
+
+def analysis_to_artifact(partial):
+    return {'headers': partial.headers, 'words': partial.word_counts, 'phrases': partial.phrase_counts}
+
+def analysis_from_artifact(value):
+    # JSON keeps dict order, so merged ties rank as if the page had been analyzed again
+    headers = [tuple(header) for header in value['headers']]
+    return DocumentAnalysis(headers, value['words'], value['phrases'], {}, {})
+
+# --- Phrase scoring -------------------------------------------------------------
+# Every phrase is scored across the documents it came from: a sparse phrase x document
+# matrix of body counts plus one presence channel per header level is reduced in bulk
+# (NumPy bincounts over COO triplets) to TF-IDF, document coverage and header points.
+HEADER_POINTS = {'h1': 3.0, 'h2': 1.5, 'h3': 0.5}
+# Ranked phrases returned per run (overridden by "score_top_n" in the input)
+SCORE_TOP_N = int(os.environ.get('KR_SCORE_TOP_N', '') or 150)
+
+def header_phrases(headers, stop_words, min_length=3, ngram_range=(2, 4), token_cache=None):
+    """{'h1': set, 'h2': set, 'h3': set} of the phrases in one document's headers.
+
+    Header text is normalized, tokenized and filtered like body text, one header at a
+    time so no phrase spans two headers. token_cache maps header text to its tokens.
+    """
+    found = {level: set() for level in HEADER_POINTS}
+    for level, text in headers:
+        phrases = found.get(f'h{level}')
+        if phrases is None:
+            continue
+        words = token_cache.get(text) if token_cache is not None else None
+        if words is None:
+            words = tokenize_words(normalize_for_counting(text))
+            if token_cache is not None:
+                token_cache[text] = words
+        # Headers are a few words long: the NumPy set-up would cost more than it saves
+        for grams in _count_ngrams_python(words, stop_words, min_length, ngram_range)[1]:
+            phrases.update(grams)
+    return found
+
+def phrase_matrix(partials, min_length=3, ngram_range=(2, 4)):
+    """COO triplets of the phrase x document matrix built from DocumentAnalysis partials.
+
+    Returns (terms, body, header_cells): terms in first-occurrence order (every
+    document's 2-grams, then 3-grams, ..., as merge_analyses() counts them), body as
+    (column, term ids, counts) blocks, and per header level (term ids, columns) lists
+    of the documents whose headers contain the term.
+    """
+    stop_words = load_stop_words()
+    blocks = []
+    sizes = max((len(partial.phrase_counts) for partial in partials), default=0)
+    for size in range(sizes):
+        for column, partial in enumerate(partials):
+            if size < len(partial.phrase_counts) and partial.phrase_counts[size]:
+                blocks.append((column, partial.phrase_counts[size]))
+    # Ids are assigned in one C-level pass over every block's keys
+    vocab = dict.fromkeys(chain.from_iterable(counts for _, counts in blocks))
+    vocab = dict(zip(vocab, range(len(vocab))))
+    body = [(column, list(map(vocab.__getitem__, counts)), list(counts.values())) for column, counts in blocks]
+    header_cells = {level: ([], []) for level in HEADER_POINTS}
+    token_cache = {}
+    for column, partial in enumerate(partials):
+        found = header_phrases(partial.headers, stop_words, min_length, ngram_range, token_cache)
+        for level, phrases in found.items():
+            rows, columns = header_cells[level]
+            for phrase in phrases:
+                rows.append(vocab.setdefault(phrase, len(vocab)))
+                columns.append(column)
+    return list(vocab), body, header_cells
+
+def _score_numpy(n_terms, n_docs, body, header_cells):
+    np = get_numpy()
+    rows = np.concatenate([np.asarray(ids, dtype=np.int64) for _, ids, _ in body] or [np.zeros(0, np.int64)])
+    columns = np.concatenate([np.full(len(ids), column, dtype=np.int64) for column, ids, _ in body]
+                             or [np.zeros(0, np.int64)])
+    counts = np.concatenate([np.asarray(c, dtype=np.float64) for _, _, c in body] or [np.zeros(0)])
+    frequency = np.bincount(rows, weights=counts, minlength=n_terms)
+    # Sublinear term frequency per document (1 + ln tf), summed over documents
+    sublinear = np.bincount(rows, weights=1 + np.log(counts), minlength=n_terms)
+
+    # Body cells are unique per (phrase, document); header cells only add the
+    # documents where a phrase is in a header but not in the body text
+    scored = {}
+    header_keys = []
+    for level, (header_rows, header_columns) in header_cells.items():
+        header_rows = np.asarray(header_rows, dtype=np.int64)
+        header_keys.append(header_rows * n_docs + np.asarray(header_columns, dtype=np.int64))
+        # Each (phrase, document) pair is listed once per level already
+        scored[level] = np.bincount(header_rows, minlength=n_terms)
+    header_keys = np.unique(np.concatenate(header_keys))
+    touched = np.zeros(n_terms, dtype=bool)
+    touched[header_keys // n_docs] = True
+    body_keys = (rows * n_docs + columns)[touched[rows]]
+    header_only = np.setdiff1d(header_keys, body_keys, assume_unique=True)
+    documents = np.bincount(rows, minlength=n_terms) + np.bincount(header_only // n_docs, minlength=n_terms)
+
+    idf = np.log((1 + n_docs) / (1 + documents)) + 1
+    scored['frequency'] = frequency.astype(np.int64)
+    scored['documents'] = documents
+    scored['coverage'] = documents / n_docs
+    scored['tfidf'] = sublinear * idf
+    scored['header_points'] = sum(HEADER_POINTS[level] * scored[level] for level in HEADER_POINTS)
+    scored['score'] = scored['tfidf'] * scored['coverage'] + scored['header_points']
+    return scored
+
+def _rank_numpy(scored, top_n):
+    np = get_numpy()
+    score, frequency = scored['score'], scored['frequency']
+    ids = np.arange(len(score))
+    # Only phrases that can still reach the top N are sorted (ties at the cut are kept)
+    if len(score) > top_n:
+        floor = np.partition(score, len(score) - top_n)[len(score) - top_n]
+        ids = np.nonzero(score >= floor)[0]
+    order = np.lexsort((ids, -frequency[ids], -score[ids]))
+    return ids[order][:top_n].tolist()
+
+def _score_python(n_terms, n_docs, body, header_cells):
+    frequency = [0] * n_terms
+    sublinear = [0.0] * n_terms
+    present = [set() for _ in range(n_terms)]
+    for column, ids, counts in body:
+        for i, count in zip(ids, counts):
+            frequency[i] += count
+            sublinear[i] += 1 + math.log(count)
+            present[i].add(column)
+    scored = {}
+    for level, (header_rows, header_columns) in header_cells.items():
+        per_level = [0] * n_terms
+        for i, column in zip(header_rows, header_columns):
+            per_level[i] += 1
+            present[i].add(column)
+        scored[level] = per_level
+    documents = [len(columns) for columns in present]
+    idf = [math.log((1 + n_docs) / (1 + df)) + 1 for df in documents]
+    scored['frequency'] = frequency
+    scored['documents'] = documents
+    scored['coverage'] = [df / n_docs for df in documents]
+    scored['tfidf'] = [sub * w for sub, w in zip(sublinear, idf)]
+    scored['header_points'] = [
+        sum(HEADER_POINTS[level] * scored[level][i] for level in HEADER_POINTS) for i in range(n_terms)
+    ]
+    scored['score'] = [t * c + h for t, c, h in zip(scored['tfidf'], scored['coverage'], scored['header_points'])]
+    return scored
+
+def _rank_python(scored, top_n):
+    score, frequency = scored['score'], scored['frequency']
+    return heapq.nsmallest(top_n, range(len(score)), key=lambda i: (-score[i], -frequency[i], i))
+
+def score_phrases(partials, min_length=3, ngram_range=(2, 4), top_n=None):
+    """Rank every phrase of the documents by quality score; the top_n as dicts.
+
+    Per phrase: `frequency` (body occurrences), `documents` (documents containing it in
+    body or headers), `coverage` (documents / all documents), `tfidf` (sum over
+    documents of 1 + ln tf, times the smoothed idf ln((1 + N) / (1 + df)) + 1), and
+    `h1`/`h2`/`h3` (documents with it in a header of that level) worth
+    `header_points` (H1=3, H2=1.5, H3=0.5 per document). score = tfidf * coverage +
+    header_points; ties rank by frequency, then first occurrence.
+    """
+    top_n = SCORE_TOP_N if top_n is None else top_n
+    partials = list(partials)
+    if not partials or top_n <= 0:
+        return []
+    terms, body, header_cells = phrase_matrix(partials, min_length, ngram_range)
+    if not terms:
+        return []
+    if get_numpy() is not None:
+        scored = _score_numpy(len(terms), len(partials), body, header_cells)
+        ranked = _rank_numpy(scored, top_n)
+        # Only the ranked rows leave NumPy
+        picked = {name: values[ranked].tolist() for name, values in scored.items()}
+    else:
+        scored = _score_python(len(terms), len(partials), body, header_cells)
+        ranked = _rank_python(scored, top_n)
+        picked = {name: [values[i] for i in ranked] for name, values in scored.items()}
+    return [{
+        'phrase': terms[i],
+        'score': round(picked['score'][j], 4),
+        'tfidf': round(picked['tfidf'][j], 4),
+        'coverage': round(picked['coverage'][j], 4),
+        'header_points': round(picked['header_points'][j], 4),
+        'frequency': picked['frequency'][j],
+        'documents': picked['documents'][j],
+        'h1': picked['h1'][j],
+        'h2': picked['h2'][j],
+        'h3': picked['h3'][j],
+    } for j, i in enumerate(ranked)]
+
+def score_top_n(input_data):
+    """Number of ranked phrases requested ("score_top_n" in the input, else SCORE_TOP_N)."""
+    try:
+        value = int(input_data.get('score_top_n') or SCORE_TOP_N)
+    except (TypeError, ValueError):
+        return SCORE_TOP_N
+    return max(0, value)
+
+def _init_analysis_worker():
+    # Forked workers inherit these already loaded; spawned ones load them once here
+    get_nlp()
+    load_stop_words()
+
+def start_analysis_pool():
+    """Start the process pool for analyze_document() (None when disabled or it fails).
+
+    Only preload() calls this, before the persistent modes start any request
+    thread, so forking cannot copy a lock held by another thread. With the fork
+    start method the model is loaded first so workers share it copy-on-write, and
+    every worker is forked before this returns (ProcessPoolExecutor would otherwise
+    fork at the first submit(), from whichever thread makes it).
+    KR_ANALYSIS_START_METHOD forces a start method.
+    """
+    global _analysis_pool
+    if ANALYSIS_PROCESSES <= 1:
+        return None
+    with _analysis_pool_lock:
+        if _analysis_pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            methods = multiprocessing.get_all_start_methods()
+            method = os.environ.get('KR_ANALYSIS_START_METHOD') or (
+                'fork' if 'fork' in methods else 'spawn'
+            )
+            if method == 'fork':
+                get_nlp()
+                load_stop_words()
+                get_numpy()
+            pool = ProcessPoolExecutor(
+                max_workers=ANALYSIS_PROCESSES,
+                mp_context=multiprocessing.get_context(method),
+                initializer=_init_analysis_worker,
+            )
+            try:
+                # The first task starts the workers (with fork, all of them at once)
+                pool.submit(os.getpid).result()
+            except Exception as e:
+                logging.warning(f"Analysis pool failed to start, analyzing in-process: {str(e)}")
+                pool.shutdown(wait=False, cancel_futures=True)
+                return None
+            _analysis_pool = pool
+            logging.info(f"Started analysis pool with {ANALYSIS_PROCESSES} {method} workers")
+    return _analysis_pool
+
+def _discard_analysis_pool(pool):
+    """Drop a broken pool; analysis stays in-process from then on (no fork from a request thread)."""
+    global _analysis_pool
+    with _analysis_pool_lock:
+        if _analysis_pool is pool:
+            _analysis_pool = None
+    try:
+        pool.shutdown(wait=False, cancel_futures=True)
+    except Exception:
+        pass
+
+def document_chars(content):
+    """Size of one analysis input: text length of a ParsedDocument, else of the HTML."""
+    if isinstance(content, ParsedDocument):
+        return len(content.text)
+    return len(content) if isinstance(content, (str, bytes)) else 0
+
+def _run_document_analyses(contents, min_length, ngram_range):
+    """analyze_document() for every content, large ones in the pool. Returns (partials, pooled count).
+
+    Only a pool preload() already started is used; without one everything stays in-process.
+    """
+    pool = _analysis_pool
+    if pool is not None and (len(contents) < 2 or sum(map(document_chars, contents)) < ANALYSIS_PARALLEL_MIN_CHARS):
+        pool = None
+
+    futures = {}
+    if pool is not None:
+        try:
+            for i, content in enumerate(contents):
+                if document_chars(content) >= ANALYSIS_POOL_MIN_DOC_CHARS:
+                    futures[i] = pool.submit(analyze_document, content, min_length, ngram_range)
+        except Exception as e:
+            logging.warning(f"Analysis pool unavailable, analyzing in-process: {str(e)}")
+            _discard_analysis_pool(pool)
+
+    # Small documents are analyzed here while the pool works on the large ones
+    partials = [None] * len(contents)
+    for i, content in enumerate(contents):
+        if i not in futures:
+            partials[i] = analyze_document(content, min_length, ngram_range)
+    pooled = 0
+    for i, future in futures.items():
+        try:
+            partials[i] = future.result()
+            pooled += 1
+        except Exception as e:
+            logging.warning(f"Analysis worker failed, analyzing in-process: {str(e)}")
+            _discard_analysis_pool(pool)
+            partials[i] = analyze_document(contents[i], min_length, ngram_range)
+    return partials, pooled
+
+def analyze_documents(contents, min_length=3, ngram_range=(2, 4), tokenizer_stats=None, metrics=None,
+                      artifact_keys=None, artifacts=None, scores=None, score_top_n=None):
+    """Analyze each page / snippet block on its own and merge the results.
+
+    Same return value as analyze_keywords(). Documents are analyzed in the process
+    pool when there is enough HTML to be worth it; n-grams never cross documents.
+    With `artifacts` ({'store', 'stats', 'refresh'}), documents whose artifact_keys
+    entry is a (url, content_hash) pair are loaded from the ArtifactStore when they
+    were analyzed before, and stored after analysis otherwise.
+    `scores`, if given, is a list that receives the score_top_n best phrases from
+    score_phrases().
+    """
+    try:
+        contents = list(contents)
+        partials = [None] * len(contents)
+        keys = list(artifact_keys or []) if artifacts and artifacts.get('store') is not None else []
+        keys += [None] * (len(contents) - len(keys))
+        kind = analysis_artifact_kind(min_length, ngram_range) if any(keys) else None
+        if kind:
+            with stage_timer(metrics, 'artifact_load'):
+                for i, key in enumerate(keys):
+                    if key:
+                        value = load_artifact(artifacts, key, kind, 'analysis')
+                        partials[i] = analysis_from_artifact(value) if value is not None else None
+
+        # Only documents without a stored analysis are tokenized and counted
+        missing = [i for i, partial in enumerate(partials) if partial is None]
+        fresh, pooled = _run_document_analyses([contents[i] for i in missing], min_length, ngram_range)
+        for i, partial in zip(missing, fresh):
+            partials[i] = partial
+        if kind:
+            with stage_timer(metrics, 'artifact_store'):
+                for i in missing:
+                    if keys[i]:
+                        store_artifact(artifacts, keys[i], kind, analysis_to_artifact(partials[i]))
+
+        stats = [partial.tokenizer_stats for partial in fresh if partial.tokenizer_stats]
+        if metrics is not None:
+            for partial in partials:
+                metrics.merge(partial.stages)
+            metrics.count('tokens', sum(s.get('tokens', 0) for s in stats))
+        if tokenizer_stats is not None:
+            if stats:
+                tokens = sum(s.get('tokens', 0) for s in stats)
+                seconds = sum(s.get('seconds', 0) for s in stats)
+                tokenizer_stats.update({
+                    'engine': stats[0].get('engine'),
+                    'tokens': tokens,
+                    'seconds': round(seconds, 4),
+                    'tokens_per_second': int(tokens / seconds) if seconds > 0 else None,
+                })
+            tokenizer_stats.update({
+                'documents': len(partials),
+                'pooled_documents': pooled,
+                'cached_documents': len(partials) - len(missing),
+            })
+
+        with stage_timer(metrics, 'merge'):
+            top_single_words, top_phrases_raw, all_headers = merge_analyses(partials)
+            headers_doc = ParsedDocument(all_headers, '')
+            header_hierarchy = extract_header_hierarchy(headers_doc)
+            headers = extract_headers_from_html(headers_doc)
+
+        with stage_timer(metrics, 'header_match'):
+            header_matches = match_phrases_in_headers(
+                [phrase for phrase, _ in top_phrases_raw], headers, header_hierarchy
+            )
+        top_phrases = [[phrase, freq, header_matches[phrase]] for phrase, freq in top_phrases_raw]
+
+        if scores is not None:
+            with stage_timer(metrics, 'score'):
+                scores.extend(score_phrases(partials, min_length, ngram_range, top_n=score_top_n))
+        return top_single_words, top_phrases[:150], headers, header_hierarchy
+    except Exception as e:
+        logging.error(f"Error in keyword analysis: {str(e)}")
+        return [], [], {'h1': [], 'h2': [], 'h3': []}, {}
+
+def extract_documents(search_results):
+    """What to analyze for each search result, one entry per document.
+
+    Fetched pages contribute their parsed `document` (or raw `html`, if a caller still
+    passes that); results without one contribute their title and snippet as small
+    pseudo-HTML blocks (twice, with h1/h2/h3 spread, when no page was fetched at all,
+    as before).
+    """
+    documents = []
+    html_available = False
+    for result in search_results:
+        page = result.get('document')
+        if page is None:
+            page = result.get('html') or None
+        if page is not None:
+            html_available = True
+            documents.append(page)
+        else:
+            # Create structured HTML for non-HTML content
+            documents.append(
+                f"<div class='search-result'>"
+                f"<h1>{result.get('title', '')}</h1>"
+                f"<p>{result.get('snippet', '')}</p>"
+                "</div>"
+            )
+
+    if not html_available:
+        # If no HTML is available, create more structured pseudo-HTML
+        # with different header levels to enable header hierarchy analysis
+        for i, result in enumerate(search_results):
+            # Distribute headers across h1, h2, h3 to ensure we have content in each
+            # (first result in each group gets h1, second h2, third h3)
+            tag = ('h1', 'h2', 'h3')[i % 3]
+            documents.append(
+                "<div class='search-result'>"
+                f"<{tag}>{result.get('title', '')}</{tag}>"
+                f"<p>{result.get('snippet', '')}</p>"
+                "</div>"
+            )
+    return documents
+
 def extract_combined_text(search_results):
-    """Extract text from search results for keyword analysis."""
+    """Build one ParsedDocument from search results for keyword analysis.
+
+    Fetched pages arrive already parsed; results without one contribute their
+    title/snippet as small pseudo-HTML blocks, as before.
+    """
     # logging.info("Extracting combined text from search results")
-    combined_text = ""
     try:
-        # First, try to extract and process all available HTML content
-        html_available = False
-        
-        for result in search_results:
-            if 'html' in result and result['html']:
-                html_available = True
-                # Clean the HTML before adding it
-                soup = BeautifulSoup(result['html'], 'html.parser')
-                # Remove script and style elements
-                for script in soup(["script", "style"]):
-                    script.extract()
-                # Add the cleaned HTML
-                combined_text += str(soup) + " "
-            else:
-                # Create structured HTML for non-HTML content
-                combined_text += f"<div class='search-result'>"
-                combined_text += f"<h1>{result.get('title', '')}</h1>"
-                combined_text += f"<p>{result.get('snippet', '')}</p>"
-                combined_text += "</div> "
-        
-        if not html_available:
-            # If no HTML is available, create more structured pseudo-HTML 
-            # with different header levels to enable header hierarchy analysis
-            for i, result in enumerate(search_results):
-                # Create a structured div for each result
-                combined_text += "<div class='search-result'>"
-                
-                # Distribute headers across h1, h2, h3 to ensure we have content in each
-                if i % 3 == 0:
-                    # First result in each group gets h1
-                    combined_text += f"<h1>{result.get('title', '')}</h1>"
-                elif i % 3 == 1:
-                    # Second result gets h2
-                    combined_text += f"<h2>{result.get('title', '')}</h2>"
-                else:
-                    # Third result gets h3
-                    combined_text += f"<h3>{result.get('title', '')}</h3>"
-                
-                # Add snippet as paragraph
-                combined_text += f"<p>{result.get('snippet', '')}</p>"
-                combined_text += "</div> "
-        
-        # Wrap everything in a proper HTML structure
-        combined_text = f"<html><body>{combined_text}</body></html>"
-        
-        # logging.debug(f"Extracted {len(combined_text)} characters of combined text")
-        return combined_text
+        combined = merge_documents([parse_document(html) for html in extract_documents(search_results)])
+        # logging.debug(f"Extracted {len(combined.text)} characters of combined text")
+        return combined
     except Exception as e:
         logging.error(f"Error extracting combined text: {str(e)}")
-        return ""
+        return EMPTY_DOCUMENT
+
+# --- Page fetching -------------------------------------------------------------
+# Pages are streamed: non-HTML responses are dropped on their headers, bodies are cut
+# at KR_FETCH_MAX_BYTES and the whole fetch is bounded by KR_FETCH_DEADLINE seconds.
+# The body stays bytes end to end (cache, content hash, parser, extractor): it is
+# normalized to UTF-8 once, using only the Content-Type / <meta> charset, never a
+# statistical detector.
+FETCH_MAX_BYTES = int(os.environ.get('KR_FETCH_MAX_BYTES', '') or 5 * 1024 * 1024)
+FETCH_DEADLINE = float(os.environ.get('KR_FETCH_DEADLINE', '') or 20)
+FETCH_CHUNK_BYTES = 64 * 1024
+
+HEADER_CHARSET_RE = re.compile(r'charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+META_CHARSET_RE = re.compile(rb'<meta[^>]*?charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+# Browsers only look for the <meta> charset near the top of the document
+META_SNIFF_BYTES = 4096
+BOM_CHARSETS = ((b'\xef\xbb\xbf', 'utf-8'), (b'\xff\xfe', 'utf-16'), (b'\xfe\xff', 'utf-16'))
 
-# NEW: helper to fetch full HTML page so we can send full text of top articles to Gemini
-def fetch_page_html(url: str, timeout: int = 10) -> str:
-    """Download the HTML for a page. Returns empty string on failure."""
+def _known_charset(name):
     try:
-        headers = {"User-Agent": get_random_user_agent()}
-        resp = requests.get(url, headers=headers, timeout=timeout, allow_redirects=True)
-        if resp.status_code == 200 and "text/html" in resp.headers.get("content-type", ""):
-            return resp.text
-    except Exception as e:
-        logging.warning(f"Failed to fetch {url}: {str(e)}")
-    return ""
+        return codecs.lookup(name).name
+    except (LookupError, TypeError):
+        return None
 
-# Robust main-content extractor (tries trafilatura → readability-lxml → fallback BS4)
-try:
-    import trafilatura  # type: ignore
+def detect_charset(content_type, body):
+    """Charset of an HTML body from its BOM, Content-Type header or <meta> tag (UTF-8 otherwise)."""
+    for bom, charset in BOM_CHARSETS:
+        if body.startswith(bom):
+            return charset
+    match = HEADER_CHARSET_RE.search(content_type or '')
+    charset = match and _known_charset(match.group(1))
+    if charset:
+        return charset
+    match = META_CHARSET_RE.search(body[:META_SNIFF_BYTES])
+    charset = match and _known_charset(match.group(1).decode('ascii', 'ignore'))
+    return charset or 'utf-8'
 
-    def extract_main_text(html: str, max_chars: int = 20000) -> str:
-        if not html:
-            return ""
+def to_utf8(body, charset):
+    """The body as valid UTF-8 bytes, transcoding only when it is not UTF-8 already."""
+    if body.isascii():
+        return body
+    if charset == 'utf-8' and is_utf8(body):
+        return body
+    return body.decode(charset, errors='replace').encode('utf-8')
+
+def is_utf8(body):
+    """Whether body is valid UTF-8, checked a chunk at a time rather than decoded whole."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    view = memoryview(body)
+    try:
+        for start in range(0, len(view), FETCH_CHUNK_BYTES):
+            decoder.decode(view[start:start + FETCH_CHUNK_BYTES])
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+def response_socket(raw):
+    """The socket a streamed urllib3 response reads from, or None when it cannot be found.
+
+    The connection drops its reference once a closing response starts, so the
+    http.client response's socket file is tried next.
+    """
+    sock = getattr(getattr(raw, 'connection', None), 'sock', None)
+    if sock is None:
+        fp = getattr(getattr(raw, '_fp', None), 'fp', None)
+        sock = getattr(getattr(fp, 'raw', None), '_sock', None)
+    return sock if hasattr(sock, 'settimeout') else None
+
+def read_capped(resp, max_bytes, deadline):
+    """Stream a response body up to max_bytes or the deadline. Returns (body, truncated reason).
+
+    Each read returns whatever has arrived and the socket never waits past the
+    deadline, so a server dripping a few bytes at a time cannot hold the fetch
+    open; what arrived by then is returned as truncated.
+    """
+    import socket
+    import requests
+    from urllib3.exceptions import ReadTimeoutError
+
+    raw = resp.raw
+    # urllib3 < 2 has no read1(); its read() waits for the whole chunk
+    read = getattr(raw, 'read1', None) or raw.read
+    sock = response_socket(raw)
+    read_timeout = sock.gettimeout() if sock is not None else None
+    body = io.BytesIO()
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return body.getvalue(), 'deadline'
+        wait = remaining if read_timeout is None else min(remaining, read_timeout)
+        if sock is not None:
+            try:
+                sock.settimeout(wait)
+            except OSError:
+                sock = None  # closed: the body has been read in full
         try:
-            # Use trafilatura with better settings for article extraction
-            text = trafilatura.extract(
-                html, 
-                include_comments=False, 
-                include_tables=True,  # Keep tables as they might have useful info
-                include_links=False,  # Remove links to reduce noise
-                favour_recall=True,   # Get more content rather than being too strict
-                deduplicate=True      # Remove duplicate content
-            )
-            if text:
-                # Clean up the extracted text
-                cleaned_text = re.sub(r'\s+', ' ', text.strip())  # Normalize whitespace
-                # Filter out common navigation text
-                nav_patterns = [
-                    r'menu\s*close\s*close\s*menu',
-                    r'keyboard_arrow_\w+\s*back\s*to\s*previous',
-                    r'back\s*to\s*previous\s*menu',
-                    r'close\s*menu',
-                    r'skip\s*to\s*content',
-                    r'toggle\s*navigation'
-                ]
-                for pattern in nav_patterns:
-                    cleaned_text = re.sub(pattern, '', cleaned_text, flags=re.IGNORECASE)
-                
-                return cleaned_text[:max_chars]
+            chunk = read(FETCH_CHUNK_BYTES, decode_content=True)
+        except (ReadTimeoutError, socket.timeout) as e:
+            if sock is None or wait < remaining:
+                # The server stalled for the whole read timeout: a failed fetch, as before
+                raise requests.exceptions.ReadTimeout(str(e)) from e
+            return body.getvalue(), 'deadline'
+        if not chunk:
+            return body.getvalue(), None
+        # One growing buffer rather than a list of chunks joined at the end
+        body.write(chunk)
+        if body.tell() >= max_bytes:
+            body.truncate(max_bytes)
+            return body.getvalue(), 'max_bytes'
+
+def retry_after_seconds(resp):
+    """Retry-After of a response in seconds (only the delta-seconds form), or None."""
+    value = (resp.headers.get('Retry-After') or '').strip()
+    return int(value) if value.isdigit() else None
+
+def fetch_page_html(url: str, timeout: int = 10, cache=None, cache_stats=None, refresh_cache=False,
+                    fetch_info=None, max_bytes=None, deadline=None, health=None) -> bytes:
+    """Download the HTML for a page as UTF-8 bytes. Returns b'' on failure.
+
+    The body is streamed: anything but a 200 text/html response is dropped without
+    reading it, at most `max_bytes` (KR_FETCH_MAX_BYTES) are kept and reading stops
+    `deadline` (KR_FETCH_DEADLINE) seconds after the request started; a cut-off page
+    is still returned, but never cached.
+    With a PageCache, fresh pages are served from disk without a request, stale ones are
+    revalidated with a conditional GET (a 304 is served from disk) and new 200 HTML
+    responses are stored. `refresh_cache` always goes to the origin (still conditional).
+    cache_stats counts 'hits' (served fresh), 'revalidated' (304) and 'misses'.
+    With a HostHealth table, a host whose circuit is open is not contacted at all
+    (source 'skipped', or a stale cached copy is served), the timeout adapts to the
+    host's usual latency and every outcome is recorded; pages are fetched through the
+    host's own pooled session.
+    fetch_info, if given, receives 'source' (cache/revalidated/network/skipped/failed),
+    'status', the 'bytes' downloaded, the 'charset', 'truncated' (max_bytes/deadline)
+    and the adaptive 'timeout' used.
+    """
+    if fetch_info is None:
+        fetch_info = {}
+    fetch_info.update({'source': 'failed', 'status': None, 'bytes': 0})
+    max_bytes = max_bytes or FETCH_MAX_BYTES
+    deadline = deadline or FETCH_DEADLINE
+    timeout = min(timeout, deadline)
+    deadline += time.monotonic()
+    entry = None
+    if cache is not None:
+        try:
+            entry = cache.get(url)
         except Exception as e:
-            logging.warning(f"Trafilatura failed: {str(e)}")
-        return ""
-except ImportError:
-    from bs4 import BeautifulSoup
+            logging.warning(f"Page cache read failed for {url}: {str(e)}")
+        if entry and entry['fresh'] and not refresh_cache:
+            count_stat(cache_stats, 'hits')
+            fetch_info['source'] = 'cache'
+            return entry['body']
+
+    host = urllib.parse.urlsplit(url).hostname or ''
+    row = health.get(host) if health is not None and host else None
+    if health is not None and host and not health.allow(row):
+        # Circuit open: a stale copy beats nothing, otherwise move straight on to the next result
+        fetch_info['skipped'] = 'circuit_open'
+        if entry:
+            count_stat(cache_stats, 'hits')
+            fetch_info['source'] = 'cache'
+            return entry['body']
+        fetch_info['source'] = 'skipped'
+        return b""
+    if health is not None and host:
+        timeout = health.timeout_for(row, timeout)
+        fetch_info['timeout'] = round(timeout, 2)
+        user_agent = health.user_agent(host, row)
+    else:
+        user_agent = get_random_user_agent()
+
+    outcome = None  # (status, latency, failed, retry_after) for the health table
     try:
-        from readability import Document  # type: ignore
+        headers = {"User-Agent": user_agent}
+        if entry:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        session = get_host_session(host) if host else get_http_session()
+        with session.get(url, headers=headers, timeout=timeout, allow_redirects=True, stream=True) as resp:
+            fetch_info['status'] = resp.status_code
+            # Blocks, rate limits and server errors count against the host; a 404 does not
+            failed = resp.status_code in (403, 429) or resp.status_code >= 500
+            outcome = (resp.status_code, resp.elapsed.total_seconds(), failed,
+                       retry_after_seconds(resp) if failed else None)
+            if resp.status_code == 304 and entry:
+                count_stat(cache_stats, 'revalidated')
+                fetch_info['source'] = 'revalidated'
+                cache.touch(url)
+                return entry['body']
+            if cache is not None:
+                count_stat(cache_stats, 'misses')
+            content_type = resp.headers.get("content-type", "")
+            if resp.status_code != 200 or "text/html" not in content_type:
+                # Error pages, PDFs and other binaries are never downloaded
+                return b""
+            body, truncated = read_capped(resp, max_bytes, deadline)
+        fetch_info['bytes'] = len(body)
+        if truncated:
+            fetch_info['truncated'] = truncated
+            logging.warning(f"Truncated {url} at {len(body)} bytes ({truncated})")
+        charset = detect_charset(content_type, body)
+        fetch_info['charset'] = charset
+        html = to_utf8(body, charset)
+        if cache is not None and html and not truncated:
+            try:
+                cache.put(url, html, resp.headers.get('ETag'), resp.headers.get('Last-Modified'))
+            except Exception as e:
+                logging.warning(f"Page cache write failed for {url}: {str(e)}")
+        fetch_info['source'] = 'network'
+        return html
+    except Exception as e:
+        import requests
+        if isinstance(e, requests.exceptions.Timeout):
+            outcome = ('timeout', None, True, None)
+        elif isinstance(e, requests.exceptions.ConnectionError):
+            outcome = ('error', None, True, None)
+        logging.warning(f"Failed to fetch {url}: {str(e)}")
+    finally:
+        if health is not None and host and outcome:
+            try:
+                health.record(host, *outcome)
+            except Exception as e:
+                logging.warning(f"Host health write failed for {host}: {str(e)}")
+    return b""
 
-        def extract_main_text(html: str, max_chars: int = 20000) -> str:
+# trafilatura builds its output from the whole page, so a huge page costs memory in
+# proportion to its text although only max_chars of it are kept. The tree handed to it
+# is cut after this much text; real articles finish well before that.
+EXTRACT_MAX_INPUT_CHARS = int(os.environ.get('KR_EXTRACT_MAX_INPUT_CHARS', '') or 200000)
+
+def truncate_tree_text(root, max_chars):
+    """Drop everything after the first max_chars of text of an lxml tree, in document order.
+
+    Returns whether anything was dropped.
+    """
+    seen = 0
+    for element in root.iter():
+        seen += len(element.text or '') + len(element.tail or '')
+        if seen > max_chars:
+            break
+    else:
+        return False
+    # Keep the element and what precedes it: remove the following siblings at every level
+    node = element
+    while node is not None:
+        parent = node.getparent()
+        if parent is not None:
+            for sibling in list(node.itersiblings()):
+                parent.remove(sibling)
+        node = parent
+    return True
+
+def _no_extractor_state():
+    pass
+
+def _load_extractor():
+    """Import the best available main-content extractor: trafilatura → readability-lxml → BS4.
+
+    Returns (extract_main_text, reset_extractor_state, name).
+    """
+    try:
+        import trafilatura  # type: ignore
+        try:
+            from trafilatura.deduplication import LRU_TEST as _TRAFILATURA_SEEN  # type: ignore
+        except ImportError:
+            try:
+                from trafilatura.filters import LRU_TEST as _TRAFILATURA_SEEN  # type: ignore
+            except ImportError:
+                _TRAFILATURA_SEEN = None
+
+        def reset_extractor_state():
+            """Forget the text segments trafilatura has seen so far.
+
+            deduplicate=True counts repeated segments in a process-wide LRU, so in a persistent
+            worker a page already seen by earlier requests would come back with no main text.
+            """
+            if _TRAFILATURA_SEEN is not None:
+                _TRAFILATURA_SEEN.clear()
+
+        def extract_main_text(html, max_chars: int = 20000) -> str:
             if not html:
                 return ""
             try:
-                doc = Document(html)
-                summary_html = doc.summary()
-                soup = BeautifulSoup(summary_html, 'html.parser')
-                text = soup.get_text(separator=" ", strip=True)
-                # Clean up the extracted text
-                cleaned_text = re.sub(r'\s+', ' ', text.strip())  # Normalize whitespace
-                # Filter out common navigation text
-                nav_patterns = [
-                    r'menu\s*close\s*close\s*menu',
-                    r'keyboard_arrow_\w+\s*back\s*to\s*previous',
-                    r'back\s*to\s*previous\s*menu',
-                    r'close\s*menu',
-                    r'skip\s*to\s*content',
-                    r'toggle\s*navigation'
-                ]
-                for pattern in nav_patterns:
-                    cleaned_text = re.sub(pattern, '', cleaned_text, flags=re.IGNORECASE)
-                return cleaned_text[:max_chars]
+                if isinstance(html, bytes):
+                    # Hand over a tree parsed from the UTF-8 bytes so trafilatura does not
+                    # decode them again with its charset detector (same parser options)
+                    html = lxml_html.fromstring(html, parser=utf8_html_parser(
+                        collect_ids=False, default_doctype=False, remove_comments=True, remove_pis=True
+                    ))
+                    truncate_tree_text(html, EXTRACT_MAX_INPUT_CHARS)
+                # Use trafilatura with better settings for article extraction
+                text = trafilatura.extract(
+                    html, 
+                    include_comments=False, 
+                    include_tables=True,  # Keep tables as they might have useful info
+                    include_links=False,  # Remove links to reduce noise
+                    favour_recall=True,   # Get more content rather than being too strict
+                    deduplicate=True      # Remove duplicate content
+                )
+                if text:
+                    # Clean up the extracted text
+                    cleaned_text = re.sub(r'\s+', ' ', text.strip())  # Normalize whitespace
+                    # Filter out common navigation text
+                    nav_patterns = [
+                        r'menu\s*close\s*close\s*menu',
+                        r'keyboard_arrow_\w+\s*back\s*to\s*previous',
+                        r'back\s*to\s*previous\s*menu',
+                        r'close\s*menu',
+                        r'skip\s*to\s*content',
+                        r'toggle\s*navigation'
+                    ]
+                    for pattern in nav_patterns:
+                        cleaned_text = re.sub(pattern, '', cleaned_text, flags=re.IGNORECASE)
+                
+                    return cleaned_text[:max_chars]
             except Exception as e:
-                logging.warning(f"Readability failed: {str(e)}")
-                # fall through to simple cleanup
-                soup = BeautifulSoup(html, 'html.parser')
+                logging.warning(f"Trafilatura failed: {str(e)}")
+            return ""
+
+        return extract_main_text, reset_extractor_state, 'trafilatura'
+    except ImportError:
+        from bs4 import BeautifulSoup
+
+        def page_soup(html):
+            # Fetched pages are UTF-8 bytes; skip BeautifulSoup's encoding detection
+            if isinstance(html, bytes):
+                return BeautifulSoup(html, 'html.parser', from_encoding='utf-8')
+            return BeautifulSoup(html, 'html.parser')
+
+        try:
+            from readability import Document  # type: ignore
+
+            def extract_main_text(html, max_chars: int = 20000) -> str:
+                if not html:
+                    return ""
+                try:
+                    doc = Document(html.decode('utf-8') if isinstance(html, bytes) else html)
+                    summary_html = doc.summary()
+                    soup = BeautifulSoup(summary_html, 'html.parser')
+                    text = soup.get_text(separator=" ", strip=True)
+                    # Clean up the extracted text
+                    cleaned_text = re.sub(r'\s+', ' ', text.strip())  # Normalize whitespace
+                    # Filter out common navigation text
+                    nav_patterns = [
+                        r'menu\s*close\s*close\s*menu',
+                        r'keyboard_arrow_\w+\s*back\s*to\s*previous',
+                        r'back\s*to\s*previous\s*menu',
+                        r'close\s*menu',
+                        r'skip\s*to\s*content',
+                        r'toggle\s*navigation'
+                    ]
+                    for pattern in nav_patterns:
+                        cleaned_text = re.sub(pattern, '', cleaned_text, flags=re.IGNORECASE)
+                    return cleaned_text[:max_chars]
+                except Exception as e:
+                    logging.warning(f"Readability failed: {str(e)}")
+                    # fall through to simple cleanup
+                    soup = page_soup(html)
+                    # Remove more navigation and non-content elements
+                    for tag in soup(['script', 'style', 'header', 'footer', 'nav', 'aside', 'form', 'iframe', 'button', 'input']):
+                        tag.decompose()
+                    # Remove elements with navigation-related classes/ids
+                    for element in soup.find_all(attrs={'class': re.compile(r'(nav|menu|breadcrumb|sidebar|footer|header)', re.I)}):
+                        element.decompose()
+                    for element in soup.find_all(attrs={'id': re.compile(r'(nav|menu|breadcrumb|sidebar|footer|header)', re.I)}):
+                        element.decompose()
+                    text = " ".join(soup.stripped_strings)
+                    # Clean up the extracted text
+                    cleaned_text = re.sub(r'\s+', ' ', text.strip())  # Normalize whitespace
+                    # Filter out common navigation text
+                    nav_patterns = [
+                        r'menu\s*close\s*close\s*menu',
+                        r'keyboard_arrow_\w+\s*back\s*to\s*previous',
+                        r'back\s*to\s*previous\s*menu',
+                        r'close\s*menu',
+                        r'skip\s*to\s*content',
+                        r'toggle\s*navigation'
+                    ]
+                    for pattern in nav_patterns:
+                        cleaned_text = re.sub(pattern, '', cleaned_text, flags=re.IGNORECASE)
+                    return cleaned_text[:max_chars]
+
+            return extract_main_text, _no_extractor_state, 'readability'
+        except ImportError:
+            def extract_main_text(html, max_chars: int = 20000) -> str:
+                if not html:
+                    return ""
+                soup = page_soup(html)
                 # Remove more navigation and non-content elements
                 for tag in soup(['script', 'style', 'header', 'footer', 'nav', 'aside', 'form', 'iframe', 'button', 'input']):
                     tag.decompose()
@@ -623,44 +2703,1258 @@ except ImportError:
                 for pattern in nav_patterns:
                     cleaned_text = re.sub(pattern, '', cleaned_text, flags=re.IGNORECASE)
                 return cleaned_text[:max_chars]
-    except ImportError:
-        from bs4 import BeautifulSoup
 
-        def extract_main_text(html: str, max_chars: int = 20000) -> str:
-            if not html:
-                return ""
-            soup = BeautifulSoup(html, 'html.parser')
-            # Remove more navigation and non-content elements
-            for tag in soup(['script', 'style', 'header', 'footer', 'nav', 'aside', 'form', 'iframe', 'button', 'input']):
-                tag.decompose()
-            # Remove elements with navigation-related classes/ids
-            for element in soup.find_all(attrs={'class': re.compile(r'(nav|menu|breadcrumb|sidebar|footer|header)', re.I)}):
-                element.decompose()
-            for element in soup.find_all(attrs={'id': re.compile(r'(nav|menu|breadcrumb|sidebar|footer|header)', re.I)}):
-                element.decompose()
-            text = " ".join(soup.stripped_strings)
-            # Clean up the extracted text
-            cleaned_text = re.sub(r'\s+', ' ', text.strip())  # Normalize whitespace
-            # Filter out common navigation text
-            nav_patterns = [
-                r'menu\s*close\s*close\s*menu',
-                r'keyboard_arrow_\w+\s*back\s*to\s*previous',
-                r'back\s*to\s*previous\s*menu',
-                r'close\s*menu',
-                r'skip\s*to\s*content',
-                r'toggle\s*navigation'
+            return extract_main_text, _no_extractor_state, 'bs4'
+
+_extractor = None
+
+def get_extractor():
+    """The (extract, reset, name) extractor tuple, imported on first use."""
+    global _extractor
+    if _extractor is None:
+        with _lazy_lock:
+            if _extractor is None:
+                _extractor = _load_extractor()
+    return _extractor
+
+def extract_main_text(html, max_chars: int = 20000) -> str:
+    """Main article text of a page, str or UTF-8 bytes (empty string when nothing usable is found)."""
+    if not html:
+        return ""
+    return get_extractor()[0](html, max_chars)
+
+def reset_extractor_state():
+    """Clear per-process extractor state between requests (no-op unless trafilatura is used)."""
+    if _extractor is not None:
+        _extractor[1]()
+
+# --- Near-duplicate detection -----------------------------------------------------
+# Syndicated and boilerplate-heavy pages often fill several SERP slots. Each page's
+# main text gets a 64-bit SimHash of its word shingles; a page within
+# DEDUP_MAX_DISTANCE bits of a better-ranked page kept in the same run is skipped
+# so the next candidate takes its slot. Kept pages also go to the FingerprintIndex,
+# which recognises content seen before under another URL.
+DEDUP = os.environ.get('KR_DEDUP') != '0'
+DEDUP_MAX_DISTANCE = int(os.environ.get('KR_DEDUP_MAX_DISTANCE', '') or 3)
+SIMHASH_SHINGLE_WORDS = 3
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+def simhash(text, shingle_words=SIMHASH_SHINGLE_WORDS):
+    """64-bit SimHash of the text's word shingles, weighted by count (None without words)."""
+    words = WORD_TOKEN_RE.findall(text.lower()) if text else []
+    if not words:
+        return None
+    size = min(shingle_words, len(words))
+    shingles = Counter(' '.join(words[i:i + size]) for i in range(len(words) - size + 1))
+    digests = b''.join(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest() for shingle in shingles)
+    weights = list(shingles.values())
+    total = sum(weights)
+    np = get_numpy()
+    if np is not None:
+        # One row of 64 bits per shingle (most significant first); a bit is set when
+        # the shingles having it outweigh those that do not
+        bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(-1, 8), axis=1)
+        ones = np.asarray(weights, dtype=np.int64) @ bits
+        return int.from_bytes(np.packbits(2 * ones > total).tobytes(), 'big')
+    ones = [0] * 64
+    for i, weight in enumerate(weights):
+        value = int.from_bytes(digests[8 * i:8 * i + 8], 'big')
+        for bit in range(64):
+            if value >> (63 - bit) & 1:
+                ones[bit] += weight
+    return int(''.join('1' if 2 * count > total else '0' for count in ones), 2)
+
+def find_near_duplicate(fingerprint, kept, max_distance=None):
+    """URL of the first (url, fingerprint) in `kept` within max_distance bits, or None."""
+    max_distance = DEDUP_MAX_DISTANCE if max_distance is None else max_distance
+    if fingerprint is None:
+        return None
+    for url, other in kept:
+        if other is not None and hamming_distance(fingerprint, other) <= max_distance:
+            return url
+    return None
+
+def recognise_seen_pages(results, index, metrics=None):
+    """Mark kept pages whose content was analyzed before under another URL, then index them.
+
+    Such pages get `seen_as` ({url, distance}); every kept page is (re)stored in the
+    FingerprintIndex for later runs.
+    """
+    seen = 0
+    for r in results:
+        fingerprint = r.get('fingerprint')
+        if fingerprint is None or r.get('document') is None:
+            continue
+        url = r.get('url', '')
+        try:
+            match = index.near(fingerprint, DEDUP_MAX_DISTANCE, exclude_url=url)
+            if match:
+                r['seen_as'] = {'url': match[0], 'distance': match[2]}
+                seen += 1
+            index.add(url, r.get('content_hash', ''), fingerprint)
+        except Exception as e:
+            logging.warning(f"Fingerprint index failed for {url}: {str(e)}")
+            return
+    if metrics is not None:
+        metrics.count('seen_pages', seen)
+
+# Max number of article fetches in flight at once
+FETCH_CONCURRENCY = max(1, int(os.environ.get('KR_FETCH_CONCURRENCY', '5') or 5))
+
+def scrape_candidate(url, metrics=None, artifacts=None, **fetch_kwargs):
+    """Fetch one SERP result and reduce it to what the analysis needs.
+
+    Returns (document, main_text, content_hash, fingerprint): the page parsed into a
+    ParsedDocument (None if it could not be fetched), its extracted main text and the
+    main text's simhash() (None with KR_DEDUP=0 or no text). The raw HTML is dropped
+    before returning, so it never outlives the fetch thread.
+    With `artifacts` ({'store', 'stats', 'refresh'}) the main text of a page version
+    that was extracted before is read from the ArtifactStore instead.
+    """
+    fetch_info = {}
+    started = time.perf_counter()
+    with stage_timer(metrics, 'fetch'):
+        html_page = fetch_page_html(url, fetch_info=fetch_info, **fetch_kwargs)
+    fetched = time.perf_counter()
+    page_hash = content_hash(html_page) if html_page else ''
+    with stage_timer(metrics, 'extract'):
+        main_text = None
+        if html_page and artifacts and artifacts.get('store') is not None:
+            key = (url, page_hash)
+            kind = 'main_text:' + get_extractor()[2]
+            main_text = load_artifact(artifacts, key, kind, 'main_text')
+            fetch_info['main_text_cached'] = main_text is not None
+            if main_text is None:
+                main_text = extract_main_text(html_page)
+                store_artifact(artifacts, key, kind, main_text)
+        else:
+            main_text = extract_main_text(html_page)
+    extracted = time.perf_counter()
+    document = None
+    if html_page:
+        with stage_timer(metrics, 'parse'):
+            document = parse_document(html_page)
+    del html_page
+    fingerprint = None
+    if DEDUP and main_text:
+        with stage_timer(metrics, 'fingerprint'):
+            fingerprint = simhash(main_text)
+    if metrics is not None:
+        metrics.count('bytes_downloaded', fetch_info['bytes'])
+        metrics.add_page(dict(
+            fetch_info, url=url,
+            fetch_ms=round((fetched - started) * 1000, 1),
+            extract_ms=round((extracted - fetched) * 1000, 1),
+            parse_ms=round((time.perf_counter() - extracted) * 1000, 1),
+        ))
+    return document, main_text, page_hash, fingerprint
+
+def scrape_top_results(results, needed=3, max_workers=None, fetch_kwargs=None, metrics=None, artifacts=None):
+    """Fetch and extract SERP results concurrently until `needed` good articles are in hand.
+
+    Candidates are started in SERP order with at most `max_workers` fetches in flight.
+    Outcomes are counted in SERP order only, so once the `needed`-th accessible &
+    scrapable page is known every better-ranked candidate has finished: candidates
+    ranked below it are then dropped if queued and abandoned if in flight (daemon
+    threads, so they never hold up the response). Winners are therefore the
+    best-ranked good pages whatever order the fetches finish in; results that were
+    not needed are left untouched, exactly as the old serial loop left them.
+    `fetch_kwargs` are passed through to fetch_page_html(); per-page timings go to
+    `metrics` (a RunMetrics) when given and `artifacts` to scrape_candidate().
+    Pages kept get their parsed `document`, `content_hash` and `fingerprint`; no raw
+    HTML is kept. A page whose main text is a near-duplicate of a better-ranked kept
+    page is not kept: it gets scrape_error 'near_duplicate' and `duplicate_of`, and
+    the next candidate takes its place.
+    """
+    max_workers = max_workers or FETCH_CONCURRENCY
+    fetch_kwargs = fetch_kwargs or {}
+
+    # Results already attempted (e.g. re-entry) count toward the target
+    good_count = sum(1 for r in results if r.get('accessible') and r.get('scrapable'))
+    kept = [(r.get('url', ''), r.get('fingerprint')) for r in results if r.get('accessible') and r.get('scrapable')]
+    candidates = [(rank, r) for rank, r in enumerate(results) if 'accessible' not in r]
+    if good_count >= needed or not candidates:
+        return
+
+    tasks = queue.Queue()
+    done = queue.Queue()
+    stop = threading.Event()
+    for item in candidates:
+        tasks.put(item)
+
+    def worker():
+        while not stop.is_set():
+            try:
+                rank, res = tasks.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                outcome = scrape_candidate(res.get('url', ''), metrics=metrics, artifacts=artifacts, **fetch_kwargs)
+            except Exception as e:
+                logging.warning(f"Failed to scrape {res.get('url', '')}: {str(e)}")
+                outcome = (None, '', '', None)
+            done.put((rank, outcome))
+
+    for _ in range(min(max_workers, len(candidates))):
+        threading.Thread(target=worker, daemon=True).start()
+
+    outcomes = {}
+    found = good_count
+    distinct = list(kept)
+    settled = 0  # candidates[:settled] have finished and been counted
+    while settled < len(candidates) and found < needed:
+        rank, outcome = done.get()
+        outcomes[rank] = outcome
+        # A page counts only once every better-ranked candidate has finished, so a
+        # fast low-ranked page never takes the place of a slower better-ranked one
+        while settled < len(candidates) and found < needed and candidates[settled][0] in outcomes:
+            rank = candidates[settled][0]
+            document, main_text, _, fingerprint = outcomes[rank]
+            # Near-duplicates of a page already in hand do not count toward the target
+            if document is not None and main_text and find_near_duplicate(fingerprint, distinct) is None:
+                distinct.append((results[rank].get('url', ''), fingerprint))
+                found += 1
+            settled += 1
+    # Cancel everything ranked below the winners; in-flight fetches finish in the background
+    stop.set()
+
+    # Apply outcomes in SERP order so the best-ranked good pages win
+    for rank, res in candidates:
+        if good_count >= needed:
+            break
+        if rank not in outcomes:
+            continue
+        document, main_text, page_hash, fingerprint = outcomes[rank]
+
+        accessible = document is not None
+        scrapable  = bool(main_text)
+        duplicate_of = find_near_duplicate(fingerprint, kept) if accessible and scrapable else None
+        if duplicate_of is not None:
+            # Skipped: analyzing it would count the same text twice
+            document = None
+            scrapable = False
+            res['duplicate_of'] = duplicate_of
+            if metrics is not None:
+                metrics.count('near_duplicates', 1)
+
+        # Store diagnostic flags and data
+        if document is not None:
+            res['document']    = document  # analysis input, dropped after analysis
+            res['fingerprint'] = fingerprint
+        res['content_hash'] = page_hash
+        res['main_text']   = main_text
+        res['accessible']  = accessible
+        res['scrapable']   = scrapable
+        if not accessible:
+            res['scrape_error'] = 'fetch_failed'
+        elif duplicate_of is not None:
+            res['scrape_error'] = 'near_duplicate'
+        elif not scrapable:
+            res['scrape_error'] = 'no_main_text'
+        else:
+            res['scrape_error'] = ''
+            kept.append((res.get('url', ''), fingerprint))
+            good_count += 1
+
+# SERP positions searched at most, and how many more are requested at a time (the
+# calls of one step run concurrently) when the first page has fewer than 3 usable pages
+SERP_MAX_RESULTS = min(CSE_MAX_RESULTS, int(os.environ.get('KR_SERP_MAX_RESULTS', '') or 30))
+SERP_DEEPEN_RESULTS = max(1, int(os.environ.get('KR_SERP_DEEPEN_RESULTS', '') or 10))
+
+# Identical requests in flight in this process (batch items, socket clients) share one run
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+def research_key(input_data):
+    """Identity of a research request for coalescing, or None when it must run on its own."""
+    if input_data.get('profile') or not isinstance(input_data.get('keyword', ''), str):
+        return None
+    # The projection is applied per caller, so it does not split otherwise identical runs
+    normalized = {k: v for k, v in input_data.items() if k not in ('id', 'created_by', 'output')}
+    for name in ('keyword', 'location'):
+        normalized[name] = ' '.join(str(normalized.get(name) or '').lower().split())
+    try:
+        return json.dumps(normalized, sort_keys=True)
+    except (TypeError, ValueError):
+        return None
+
+def run_research(input_data, progress=None):
+    """Run one keyword research request and return the result dict (with its `metrics`).
+
+    `"profile": "cprofile"|"tracemalloc"` in the input (or KR_PROFILE) also writes a
+    profile capture for the run; its path is returned under metrics.profile.
+    A request identical to one already running in this process waits for it and gets
+    a copy of its result (metrics.coalesced is true) instead of searching again.
+    `"output": {...}` trims the result before it is returned (see output_projection).
+    progress, if given, is called with keyword arguments (`stage`, plus counts) as the
+    run moves through search, fetch and analysis.
+    """
+    input_data = input_data or {}
+    try:
+        projection = output_projection(input_data.get('output'))
+    except ValueError as e:
+        return {'status': 'error', 'message': f'Invalid output spec: {str(e)}'}
+    result = _run_research_coalesced(input_data, progress)
+    return project_output(result, projection) if projection else result
+
+def _run_research_coalesced(input_data, progress=None):
+    key = research_key(input_data)
+    if key is None:
+        return _run_research_measured(input_data, progress)
+
+    with _inflight_lock:
+        shared = _inflight.get(key)
+        leader = shared is None
+        if leader:
+            shared = _inflight[key] = {'done': threading.Event(), 'result': None}
+    if not leader:
+        if progress is not None:
+            progress(stage='waiting', coalesced=True)
+        shared['done'].wait()
+        result = copy.deepcopy(shared['result'])
+        if isinstance(result, dict) and isinstance(result.get('metrics'), dict):
+            result['metrics']['coalesced'] = True
+        return result
+
+    try:
+        shared['result'] = _run_research_measured(input_data, progress)
+    except Exception as e:
+        shared['result'] = {'status': 'error', 'message': str(e)}
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        shared['done'].set()
+    return shared['result']
+
+def _run_research_measured(input_data, progress=None):
+    global _research_runs
+    metrics = RunMetrics()
+    profile_mode = str(input_data.get('profile') or os.environ.get('KR_PROFILE') or '').strip().lower()
+    profile_info = {}
+    label = f"{input_data.get('keyword', '')} {input_data.get('location', '')}"
+    with profile_capture(profile_mode, label, profile_info):
+        result = _run_research(input_data, metrics, progress)
+    if isinstance(result, dict):
+        result['metrics'] = metrics.as_dict()
+        if profile_info:
+            result['metrics']['profile'] = profile_info
+    _research_runs += 1
+    return result
+
+def _run_research(input_data, metrics, progress=None):
+    reset_extractor_state()
+    report = progress or (lambda **info: None)
+    # Extract inputs
+    keyword = str(input_data.get('keyword', '')).strip()
+    location = str(input_data.get('location', '')).strip()
+
+    api_key = os.environ.get("GOOGLE_CSE_API_KEY", "")
+    cx = os.environ.get("GOOGLE_CSE_CX", "")
+    # logging.info(f"Received input - keyword: {keyword}, location: {location}")
+
+    # Combine keyword and location
+    search_query = f"{keyword} {location}".strip()
+    # logging.info(f"Combined search query: {search_query}")
+
+    if not search_query:
+        logging.error("No search query provided")
+        return {
+            "status": "error",
+            "message": "No search query provided"
+        }
+
+    # `bypass_cache` skips cache reads for this run (fresh responses are still stored)
+    bypass_cache = bool(input_data.get('bypass_cache'))
+    cache_stats = {
+        'cse': {'hits': 0, 'misses': 0},
+        'pages': {'hits': 0, 'revalidated': 0, 'misses': 0},
+        'artifacts': {'main_text': {'hits': 0, 'misses': 0}, 'analysis': {'hits': 0, 'misses': 0}},
+    }
+    # Page artifacts (main text, per-document counts) reused across keywords
+    artifacts = {'store': get_artifact_store(), 'stats': cache_stats['artifacts'], 'refresh': bypass_cache}
+
+    # Perform the search
+    # logging.info("Performing Google search")
+    # Every API call waits for the shared token bucket (queued, not failed, near the limit)
+    limiter = get_cse_limiter()
+    report(stage='search')
+    with metrics.stage('search'):
+        search_results = google_search_api(
+            query=search_query,
+            api_key=api_key,
+            cx=cx,
+            num_results=10,
+            language='lang_en',
+            country_restrict='countryAU',
+            cache=get_search_cache(),
+            cache_stats=cache_stats['cse'],
+            refresh_cache=bypass_cache,
+            limiter=limiter
+        )
+    search_results['cache_stats'] = cache_stats
+    cse_calls = search_results.pop('cse_calls', 0)
+    quota_wait_ms = search_results.pop('quota_wait_ms', 0)
+    quota_remaining = search_results.pop('quota_remaining', None)
+    searched = 10
+
+    # NEW: fetch pages until we gather 3 good articles (accessible&scrapable)
+    if search_results.get('status') == 'success' and 'results' in search_results:
+        results = search_results['results']
+        fetch_kwargs = {
+            'cache': get_page_cache(),
+            'cache_stats': cache_stats['pages'],
+            'refresh_cache': bypass_cache,
+            'health': get_host_health(),
+        }
+        report(stage='fetch', results=len(results))
+        scrape_top_results(results, needed=3, fetch_kwargs=fetch_kwargs, metrics=metrics, artifacts=artifacts)
+
+        # Too few scrapable pages: request deeper SERP pages (only now) and scrape those
+        while (sum(1 for r in results if r.get('accessible') and r.get('scrapable')) < 3
+               and searched < SERP_MAX_RESULTS):
+            with metrics.stage('search'):
+                deeper = google_search_api(
+                    query=search_query,
+                    api_key=api_key,
+                    cx=cx,
+                    num_results=min(SERP_DEEPEN_RESULTS, SERP_MAX_RESULTS - searched),
+                    start_index=searched + 1,
+                    language='lang_en',
+                    country_restrict='countryAU',
+                    cache=get_search_cache(),
+                    cache_stats=cache_stats['cse'],
+                    refresh_cache=bypass_cache,
+                    seen_urls=[r.get('url', '') for r in results],
+                    limiter=limiter
+                )
+            searched += SERP_DEEPEN_RESULTS
+            cse_calls += deeper.get('cse_calls', 0)
+            quota_wait_ms += deeper.get('quota_wait_ms', 0)
+            if deeper.get('quota_remaining') is not None:
+                quota_remaining = deeper['quota_remaining']
+            if deeper.get('status') != 'success' or not deeper.get('results'):
+                break
+            results.extend(deeper['results'])
+            report(stage='fetch', results=len(results))
+            scrape_top_results(results, needed=3, fetch_kwargs=fetch_kwargs, metrics=metrics, artifacts=artifacts)
+
+        # Recognise pages seen before under another URL and remember the kept ones
+        fingerprint_index = get_fingerprint_index()
+        if fingerprint_index is not None:
+            recognise_seen_pages(results, fingerprint_index, metrics)
+    search_results['cse_calls'] = cse_calls
+    search_results['serp_depth'] = min(searched, SERP_MAX_RESULTS)
+    if limiter is not None:
+        if quota_remaining is None:
+            try:
+                quota_remaining = limiter.remaining()
+            except Exception:
+                pass
+        search_results['cse_quota'] = {'wait_ms': round(quota_wait_ms, 1), 'remaining_today': quota_remaining}
+    metrics.count('cse_calls', cse_calls)
+
+    if search_results['status'] == 'success' and 'results' in search_results:
+        # logging.info(f"Found {len(search_results['results'])} search results")
+
+        # Validate search results structure
+        if not isinstance(search_results['results'], list):
+            logging.error("Search results is not a list, converting to empty list")
+            search_results['results'] = []
+
+        # One document per search result (parsed page or snippet block)
+        documents = extract_documents(search_results['results'])
+
+        # Fetched pages are keyed by URL + content hash in the artifact store
+        artifact_keys = [
+            (r.get('url', ''), r['content_hash']) if r.get('document') is not None and r.get('content_hash') else None
+            for r in search_results['results']
+        ]
+        pages = sum(1 for key in artifact_keys if key)
+        # From here on `documents` holds the only reference to each page
+        for r in search_results['results']:
+            r.pop('document', None)
+
+        # Analyze every page / snippet block on its own (in parallel when large) and merge
+        report(stage='analyze', documents=len(documents), pages=pages)
+        tokenizer_stats = {}
+        phrase_scores = []
+        single_words, phrases, headers, header_hierarchy = analyze_documents(
+            documents, tokenizer_stats=tokenizer_stats, metrics=metrics,
+            artifact_keys=artifact_keys, artifacts=artifacts,
+            scores=phrase_scores, score_top_n=score_top_n(input_data)
+        )
+        for stats in cache_stats['artifacts'].values():
+            stats['hit_rate'] = hit_rate(stats)
+        # logging.info(f"Keyword analysis completed - {len(single_words)} words, {len(phrases)} phrases")
+
+        # Validate keyword analysis results
+        if not isinstance(single_words, list):
+            logging.warning("Single words is not a list, converting to empty list")
+            single_words = []
+        if not isinstance(phrases, list):
+            logging.warning("Phrases is not a list, converting to empty list")
+            phrases = []
+        if not isinstance(headers, dict):
+            logging.warning("Headers is not a dict, using default structure")
+            headers = {'h1': [], 'h2': [], 'h3': []}
+
+        # Format phrases for output
+        formatted_phrases = []
+        for phrase_data in phrases:
+            # Validate phrase data structure
+            if not isinstance(phrase_data, (list, tuple)) or len(phrase_data) < 3:
+                logging.warning(f"Invalid phrase data format: {phrase_data}")
+                continue
+
+            phrase, frequency, metadata = phrase_data
+            formatted_phrase = {
+                'phrase': phrase,
+                'frequency': frequency,
+                'in_h1': metadata['in_h1'],
+                'in_h2': metadata['in_h2'],
+                'in_h3': metadata['in_h3'],
+                'h1_frequency': metadata['h1_frequency'],
+                'h2_frequency': metadata['h2_frequency'],
+                'h3_frequency': metadata['h3_frequency'],
+                'hierarchy_levels': metadata['hierarchy_levels'],
+                'common_parent_header': metadata['common_parent_header']
+            }
+            formatted_phrases.append(formatted_phrase)
+
+        # Add keyword analysis to the results
+        search_results['keyword_analysis'] = {
+            'single_words': single_words,
+            'phrases': formatted_phrases,
+            'phrase_scores': phrase_scores
+        }
+        search_results['header_analysis'] = headers
+        search_results['header_hierarchy'] = header_hierarchy
+        search_results['tokenizer_stats'] = tokenizer_stats
+
+        # Garbage / nav tokens (DIRTY_TOKENS) are already dropped before counting
+
+        # Strip internal fields before returning to backend to lighten payload
+        for r in search_results['results']:
+            r.pop('content_hash', None)
+            r.pop('fingerprint', None)
+
+        # Re-order results so that accessible & scrapable ones come first
+        search_results['results'].sort(key=lambda x: (not x.get('accessible', False), not x.get('scrapable', False)))
+
+        # logging.debug("Added keyword analysis and header analysis to results")
+    else:
+        logging.error(f"Search failed: {search_results.get('message', 'Unknown error')}")
+
+    return search_results
+
+# --- Output
+
+# Kept by every projection so callers can always tell success from failure
+OUTPUT_ALWAYS = ('status', 'message', 'code')
+OUTPUT_SPEC_KEYS = ('fields', 'result_fields', 'main_text_chars', 'snippet_chars')
+
+def output_projection(spec):
+    """Validate the input's `output` spec; None when the full result is wanted.
+
+    {"fields": [...]}          top-level keys to keep (status/message/code always are)
+    {"result_fields": [...]}   keys kept on each search result
+    {"main_text_chars": N}     cut main_text to N chars (0 drops it); results that
+                               were not scraped lose it altogether
+    {"snippet_chars": N}       cut longer snippets to N chars plus "..."
+    """
+    if spec is None:
+        return None
+    if not isinstance(spec, dict):
+        raise ValueError('output must be an object')
+    unknown = set(spec) - set(OUTPUT_SPEC_KEYS)
+    if unknown:
+        raise ValueError(f"unknown keys: {', '.join(sorted(unknown))}")
+    for name in ('fields', 'result_fields'):
+        value = spec.get(name)
+        if value is not None and not (isinstance(value, list) and all(isinstance(v, str) for v in value)):
+            raise ValueError(f'{name} must be a list of strings')
+    for name in ('main_text_chars', 'snippet_chars'):
+        value = spec.get(name)
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 0):
+            raise ValueError(f'{name} must be a non-negative integer')
+    return {
+        'fields': set(spec['fields']) | set(OUTPUT_ALWAYS) if spec.get('fields') is not None else None,
+        'result_fields': set(spec['result_fields']) if spec.get('result_fields') is not None else None,
+        'main_text_chars': spec.get('main_text_chars'),
+        'snippet_chars': spec.get('snippet_chars'),
+    }
+
+def project_search_result(item, projection):
+    """Copy of one search result trimmed by the projection."""
+    if not isinstance(item, dict):
+        return item
+    keep = projection['result_fields']
+    item = {k: v for k, v in item.items() if keep is None or k in keep}
+    limit = projection['main_text_chars']
+    if limit is not None and 'main_text' in item:
+        if limit and item.get('scrapable'):
+            item['main_text'] = (item['main_text'] or '')[:limit]
+        else:
+            del item['main_text']
+    limit = projection['snippet_chars']
+    snippet = item.get('snippet')
+    if limit is not None and isinstance(snippet, str) and len(snippet) > limit:
+        item['snippet'] = f"{snippet[:limit]}..."
+    return item
+
+def project_output(result, projection):
+    """Copy of a result with only the projected fields and sizes (the result is not modified)."""
+    if not isinstance(result, dict):
+        return result
+    fields = projection['fields']
+    output = {k: v for k, v in result.items() if fields is None or k in fields}
+    if isinstance(output.get('results'), list):
+        output['results'] = [project_search_result(item, projection) for item in output['results']]
+    return output
+
+def dumps_json(obj):
+    """Serialize a result as UTF-8 JSON bytes, with orjson when it is installed."""
+    orjson = get_orjson()
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            pass  # a type orjson does not handle; json below raises or copes
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def write_json_line(obj, out=None):
+    """Write one JSON document plus a newline straight to the stream's bytes buffer."""
+    out = out or sys.stdout
+    data = dumps_json(obj) + b"\n"
+    buffer = getattr(out, 'buffer', None)
+    if buffer is None:
+        out.write(data.decode('utf-8'))
+        out.flush()
+    else:
+        out.flush()  # anything already written as text goes first
+        buffer.write(data)
+        buffer.flush()
+
+def handle_request_line(line, worker=None):
+    """Run one JSON-lines request and return the JSON-lines response (without newline).
+
+    Request:  {"id": <any>, "keyword": ..., "location": ...}  or  {"id": <any>, "op": "ping"}
+    Response: {"id": <same id>, "result": {...}}, as UTF-8 bytes
+    worker, if given (prefork workers), is a dict of worker stats added to pings and
+    to metrics.worker together with the worker's current memory.
+    """
+    try:
+        payload = json.loads(line)
+        if not isinstance(payload, dict):
+            raise ValueError("request must be a JSON object")
+    except ValueError as e:
+        logging.error(f"Failed to parse request line: {str(e)}")
+        return dumps_json({'id': None, 'result': {'status': 'error', 'message': f'Invalid input JSON: {str(e)}'}})
+
+    request_id = payload.pop('id', None)
+    try:
+        if payload.get('op') == 'ping':
+            result = {'status': 'ok', 'pid': os.getpid(), 'nlp_loaded': _nlp is not None}
+            if worker is not None:
+                result['worker'] = dict(worker, **process_memory())
+        else:
+            result = run_research(payload)
+            if worker is not None and isinstance(result, dict) and isinstance(result.get('metrics'), dict):
+                result['metrics']['worker'] = dict(worker, **process_memory())
+    except Exception as e:
+        logging.error(f"Error handling request: {str(e)}")
+        result = {'status': 'error', 'message': str(e)}
+    return dumps_json({'id': request_id, 'result': result})
+
+# Requests a --serve worker runs at once; more lines wait for a free slot. Each one
+# fans out to FETCH_CONCURRENCY fetches and holds its own analysis memory.
+SERVE_CONCURRENCY = max(1, int(os.environ.get('KR_SERVE_CONCURRENCY', '') or 4))
+
+def serve_stdin():
+    """Persistent worker: one JSON request per stdin line, one JSON response per stdout line.
+
+    Requests run on up to SERVE_CONCURRENCY threads, so a slow request does not hold
+    up the ones behind it and identical requests coalesce; further lines queue for a
+    free thread. Responses are written as they finish; callers match them by id.
+    When stdin closes, queued and running requests are finished before the worker exits.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    preload()
+    write_lock = threading.Lock()
+
+    def handle(line):
+        response = handle_request_line(line) + b"\n"
+        with write_lock:
+            sys.stdout.buffer.write(response)
+            sys.stdout.buffer.flush()
+
+    logging.info(f"Keyword search worker {os.getpid()} serving on stdin "
+                 f"({SERVE_CONCURRENCY} requests at a time)")
+    with ThreadPoolExecutor(max_workers=SERVE_CONCURRENCY, thread_name_prefix='serve-request') as pool:
+        for line in sys.stdin:
+            if line.strip():
+                pool.submit(handle, line)
+        logging.info(f"Keyword search worker {os.getpid()} stdin closed, finishing its requests before exiting")
+
+def serve_socket(socket_path):
+    """Persistent worker listening on a local unix socket (same JSON-lines protocol as stdin)."""
+    import socketserver
+
+    class RequestHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for raw in self.rfile:
+                line = raw.decode('utf-8', errors='replace')
+                if not line.strip():
+                    continue
+                self.wfile.write(handle_request_line(line) + b"\n")
+                self.wfile.flush()
+
+    preload()
+
+    # Remove a stale socket left behind by a previous worker
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    with socketserver.ThreadingUnixStreamServer(socket_path, RequestHandler) as server:
+        os.chmod(socket_path, 0o600)
+        logging.info(f"Keyword search worker {os.getpid()} serving on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            try:
+                os.unlink(socket_path)
+            except OSError:
+                pass
+
+# --- Prefork server ---------------------------------------------------------------
+# The parent loads the model, stopwords and extractor, freezes the GC generations and
+# forks request workers that inherit the listening socket and share those pages
+# copy-on-write. A worker exits after PREFORK_MAX_REQUESTS requests and is replaced.
+PREFORK_WORKERS = max(1, int(os.environ.get('KR_PREFORK_WORKERS', '') or min(4, os.cpu_count() or 1)))
+# Requests a worker serves before it is recycled (0 = never)
+PREFORK_MAX_REQUESTS = max(0, int(os.environ.get('KR_PREFORK_MAX_REQUESTS', '') or 500))
+
+def process_memory():
+    """Resident memory of this process in MB: rss, plus private/shared where /proc has them.
+
+    `shared` is what is still shared with the parent (and siblings) copy-on-write.
+    """
+    memory = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line and not line.startswith(' '))
+        kb = lambda *names: sum(int(fields.get(name, '0 kB').split()[0]) for name in names)
+        memory['rss_mb'] = round(kb('Rss') / 1024, 1)
+        memory['private_mb'] = round(kb('Private_Clean', 'Private_Dirty') / 1024, 1)
+        memory['shared_mb'] = round(kb('Shared_Clean', 'Shared_Dirty') / 1024, 1)
+    except (OSError, ValueError):
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            memory['peak_rss_mb'] = round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+        except (ImportError, OSError):
+            pass
+    return memory
+
+def _prefork_worker(listener, index, max_requests):
+    """Body of one forked worker: serve connections until recycled or told to stop."""
+    import signal
+
+    stats = {'pid': os.getpid(), 'index': index, 'requests': 0, 'max_requests': max_requests}
+    state = {'busy': False, 'stop': False}
+
+    def on_term(signum, frame):
+        # Idle workers leave at once; busy ones after the current request
+        state['stop'] = True
+        if not state['busy']:
+            os._exit(0)
+
+    signal.signal(signal.SIGTERM, on_term)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    random.seed()
+
+    while not state['stop'] and not (max_requests and stats['requests'] >= max_requests):
+        try:
+            conn, _ = listener.accept()
+        except InterruptedError:
+            continue
+        with conn, conn.makefile('rb') as rfile:
+            for raw in rfile:
+                line = raw.decode('utf-8', errors='replace')
+                if not line.strip():
+                    continue
+                state['busy'] = True
+                stats['requests'] += 1
+                try:
+                    conn.sendall(handle_request_line(line, worker=stats) + b"\n")
+                except OSError:
+                    break  # client went away
+                finally:
+                    state['busy'] = False
+                # A recycled worker closes the connection; clients reconnect
+                if state['stop'] or (max_requests and stats['requests'] >= max_requests):
+                    break
+    memory = process_memory()
+    logging.info(f"Prefork worker {stats['pid']} exiting after {stats['requests']} requests ({memory})")
+    os._exit(0)
+
+def serve_prefork(socket_path, workers=None, max_requests=None):
+    """Prefork server on a unix socket (same JSON-lines protocol as --socket).
+
+    `workers` processes (KR_PREFORK_WORKERS) each serve one connection at a time, so
+    that many requests are analyzed in parallel without loading the model again.
+    Workers are recycled after `max_requests` (KR_PREFORK_MAX_REQUESTS) requests;
+    the client sees its connection closed and reconnects. Each result carries
+    metrics.worker ({pid, index, requests, rss_mb, private_mb, shared_mb}).
+    """
+    import gc
+    import signal
+    import socket
+
+    if not hasattr(os, 'fork'):
+        raise RuntimeError('--prefork needs os.fork (use --socket on this platform)')
+    workers = workers or PREFORK_WORKERS
+    max_requests = PREFORK_MAX_REQUESTS if max_requests is None else max_requests
+
+    # Forked workers are already parallel; a nested analysis pool would oversubscribe
+    global ANALYSIS_PROCESSES
+    ANALYSIS_PROCESSES = 1
+    preload(pool=False)
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    os.chmod(socket_path, 0o600)
+    listener.listen(128)
+
+    # Objects created so far (model, vocab, stopwords) move to the permanent
+    # generation, so collections in the workers do not write to their pages
+    gc.collect()
+    gc.freeze()
+
+    children = {}
+    stopping = []
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _prefork_worker(listener, index, max_requests)
+            finally:
+                os._exit(1)
+        children[pid] = index
+
+    def on_term(signum, frame):
+        stopping.append(signum)
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, on_term)
+    signal.signal(signal.SIGINT, on_term)
+    logging.info(f"Keyword search prefork server {os.getpid()} serving on {socket_path} "
+                 f"with {workers} workers ({process_memory()})")
+    for index in range(workers):
+        spawn(index)
+    try:
+        while children:
+            try:
+                pid, status, usage = os.wait4(-1, 0)
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            index = children.pop(pid, None)
+            if index is None:
+                continue
+            peak = round(usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+            logging.info(f"Prefork worker {pid} exited with status {status} (peak RSS {peak} MB)")
+            if not stopping:
+                spawn(index)
+    finally:
+        listener.close()
+        try:
+            os.unlink(socket_path)
+        except OSError:
+            pass
+
+# Batch items researched at once (each item still fetches its pages concurrently)
+BATCH_CONCURRENCY = max(1, int(os.environ.get('KR_BATCH_CONCURRENCY', '2') or 2))
+
+def parse_input_text(raw):
+    """Parse stdin as one JSON document, or as JSON lines (returned as a list)."""
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError as first_error:
+        lines = [line for line in raw.splitlines() if line.strip()]
+        if len(lines) < 2:
+            raise first_error
+        return [json.loads(line) for line in lines]
+
+def run_batch(items, out=None):
+    """Research many {keyword, location} items, writing one JSON line per item as it finishes.
+
+    All items share the loaded model, HTTP session and caches. A failing item only
+    produces an error line: {"index", "keyword", "location", "result": {"status": "error", ...}}.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    out = out or sys.stdout
+    write_lock = threading.Lock()
+
+    def run_item(index, item):
+        keyword = location = ''
+        try:
+            if not isinstance(item, dict):
+                raise ValueError('batch item must be a JSON object')
+            keyword = str(item.get('keyword', '')).strip()
+            location = str(item.get('location', '')).strip()
+            result = run_research(item)
+        except Exception as e:
+            logging.error(f"Batch item {index} failed: {str(e)}")
+            result = {'status': 'error', 'message': str(e)}
+        with write_lock:
+            write_json_line({'index': index, 'keyword': keyword, 'location': location, 'result': result}, out)
+
+    with ThreadPoolExecutor(max_workers=min(BATCH_CONCURRENCY, max(1, len(items)))) as pool:
+        for index, item in enumerate(items):
+            pool.submit(run_item, index, item)
+
+# --- Job queue ------------------------------------------------------------------
+# Research requests can also be queued: a job server (--jobs) runs them on a pool of
+# threads and announces each finished job on stdout, so the web server can return a
+# job id at once and write the keyword_research row when the result arrives.
+JOB_CONCURRENCY = max(1, int(os.environ.get('KR_JOB_CONCURRENCY', '') or 2))
+# Finished and failed jobs are deleted this many seconds after they finished
+JOB_RETENTION = int(os.environ.get('KR_JOB_RETENTION', '') or 7 * 24 * 3600)
+# Idle workers look for jobs queued by other job servers this often
+JOB_POLL_SECONDS = 2.0
+
+def pid_alive(pid):
+    """Whether a process with this pid exists on this machine."""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+class JobQueue:
+    """Durable queue of research jobs (jobs.sqlite3), shared by every job server.
+
+    A job goes queued -> running -> finished (result kept until the caller has stored
+    it) -> done, or ends in error. claim() hands out the highest-priority, oldest
+    queued job under BEGIN IMMEDIATE, so two servers never run the same job, and
+    recover() takes over jobs left running or unstored by a server that has exited.
+    """
+
+    COLUMNS = ('id', 'status', 'priority', 'meta', 'progress', 'error', 'research_id',
+               'created_at', 'started_at', 'finished_at')
+
+    def __init__(self, filename='jobs.sqlite3', retention=None):
+        self.retention = retention if retention is not None else JOB_RETENTION
+        self.lock = threading.Lock()
+        self.conn = open_cache_db(filename)
+        self.conn.isolation_level = None  # explicit BEGIN IMMEDIATE below
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT, status TEXT NOT NULL, priority INTEGER NOT NULL,'
+            ' input TEXT NOT NULL, meta TEXT, progress TEXT, result BLOB, error TEXT, owner INTEGER,'
+            ' research_id INTEGER, created_at REAL NOT NULL, started_at REAL, finished_at REAL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, id)')
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+
+    def enqueue(self, input_data, priority=0, meta=None):
+        """Queue a research input; returns the job id. Old finished jobs are purged here."""
+        now = time.time()
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM jobs WHERE status IN ('done', 'error') AND finished_at < ?",
+                         (now - self.retention,))
+            cur = conn.execute(
+                "INSERT INTO jobs (status, priority, input, meta, created_at) VALUES ('queued', ?, ?, ?, ?)",
+                (int(priority), json.dumps(input_data), json.dumps(meta or {}), now)
+            )
+            return cur.lastrowid
+
+    def claim(self, owner):
+        """Take the next queued job for `owner` (a pid): (id, input, meta), or None."""
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT id, input, meta FROM jobs WHERE status = 'queued' ORDER BY priority DESC, id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET status = 'running', owner = ?, started_at = ? WHERE id = ?",
+                         (owner, time.time(), row[0]))
+        return row[0], json.loads(row[1]), json.loads(row[2] or '{}')
+
+    def set_progress(self, job_id, info):
+        with self.lock:
+            self.conn.execute('UPDATE jobs SET progress = ? WHERE id = ?', (json.dumps(info), job_id))
+
+    def finish(self, job_id, result):
+        """Record a job's result: kept until stored() for a success, an error otherwise."""
+        now = time.time()
+        with self.lock:
+            if isinstance(result, dict) and result.get('status') == 'success':
+                blob = zlib.compress(json.dumps(result, separators=(',', ':')).encode('utf-8'), 6)
+                self.conn.execute("UPDATE jobs SET status = 'finished', result = ?, finished_at = ? WHERE id = ?",
+                                  (blob, now, job_id))
+            else:
+                message = (result or {}).get('message') if isinstance(result, dict) else None
+                self.conn.execute("UPDATE jobs SET status = 'error', error = ?, finished_at = ? WHERE id = ?",
+                                  (message or 'Unknown error', now, job_id))
+
+    def stored(self, job_id, research_id=None, error=None):
+        """The caller has written (or failed to write) the row for a finished job."""
+        with self.lock:
+            if error:
+                self.conn.execute("UPDATE jobs SET status = 'error', error = ?, result = NULL WHERE id = ?",
+                                  (str(error), job_id))
+            else:
+                self.conn.execute("UPDATE jobs SET status = 'done', research_id = ?, result = NULL WHERE id = ?",
+                                  (research_id, job_id))
+
+    def get(self, job_id):
+        """Public view of a job (no input or result), with its queue position when queued."""
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            job = dict(zip(self.COLUMNS, row))
+            if job['status'] == 'queued':
+                job['position'] = self.conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND (priority > ? OR (priority = ? AND id < ?))",
+                    (job['priority'], job['priority'], job_id)
+                ).fetchone()[0]
+        job['meta'] = json.loads(job['meta'] or '{}')
+        job['progress'] = json.loads(job['progress']) if job['progress'] else None
+        return job
+
+    def recover(self, owner):
+        """Requeue jobs whose server died mid-run and take over their unstored results.
+
+        Returns [(id, meta, result)] of finished jobs now owned by `owner`.
+        """
+        taken = []
+        with self.transaction() as conn:
+            rows = conn.execute("SELECT id, status, owner FROM jobs WHERE status IN ('running', 'finished')").fetchall()
+            for job_id, status, previous in rows:
+                if previous == owner or pid_alive(previous):
+                    continue
+                if status == 'running':
+                    conn.execute("UPDATE jobs SET status = 'queued', owner = NULL, started_at = NULL, progress = NULL"
+                                 " WHERE id = ?", (job_id,))
+                else:
+                    conn.execute('UPDATE jobs SET owner = ? WHERE id = ?', (owner, job_id))
+                    taken.append(job_id)
+            finished = [
+                conn.execute('SELECT id, meta, result FROM jobs WHERE id = ?', (job_id,)).fetchone() for job_id in taken
             ]
-            for pattern in nav_patterns:
-                cleaned_text = re.sub(pattern, '', cleaned_text, flags=re.IGNORECASE)
-            return cleaned_text[:max_chars]
+        return [(job_id, json.loads(meta or '{}'), json.loads(zlib.decompress(blob)))
+                for job_id, meta, blob in finished if blob]
+
+def serve_jobs():
+    """Job server: JSON-lines requests on stdin, KR_JOB_CONCURRENCY research threads.
+
+    Requests, each answered with {"id", "result"}:
+      {"op": "enqueue", "input": {...}, "priority": 0, "meta": {...}}  -> {"status": "ok", "job": {...}}
+      {"op": "status", "job_id": n}                                    -> {"status": "ok", "job": {...}}
+      {"op": "stored", "job_id": n, "research_id": m}  (or "error": message)
+      {"op": "ping"}
+    A finished job is announced as {"event": "job_finished", "job", "meta", "result"};
+    the caller writes its row and acknowledges it with "stored". Unacknowledged jobs
+    of a server that exited are announced again by the next one. Closing stdin stops
+    claiming new jobs and exits once the running ones are finished.
+    """
+    jobs = JobQueue()
+    owner = os.getpid()
+    write_lock = threading.Lock()
+    wake = threading.Semaphore(0)
+    stopping = threading.Event()
+
+    def emit(obj):
+        with write_lock:
+            write_json_line(obj)
+
+    def announce(job_id, meta, result):
+        emit({'event': 'job_finished', 'job': jobs.get(job_id), 'meta': meta, 'result': result})
+
+    def work():
+        while not stopping.is_set():
+            try:
+                claimed = jobs.claim(owner)
+            except sqlite3.Error as e:
+                logging.warning(f"Job claim failed: {str(e)}")
+                claimed = None
+            if claimed is None:
+                wake.acquire(timeout=JOB_POLL_SECONDS)
+                continue
+            job_id, input_data, meta = claimed
+
+            def progress(**info):
+                try:
+                    jobs.set_progress(job_id, info)
+                except sqlite3.Error:
+                    pass
+
+            try:
+                result = run_research(input_data, progress=progress)
+            except Exception as e:
+                logging.error(f"Job {job_id} failed: {str(e)}")
+                result = {'status': 'error', 'message': str(e)}
+            jobs.finish(job_id, result)
+            announce(job_id, meta, result)
+
+    def handle(payload):
+        op = payload.get('op')
+        if op == 'ping':
+            return {'status': 'ok', 'pid': owner, 'nlp_loaded': _nlp is not None}
+        if op == 'enqueue':
+            input_data = payload.get('input')
+            if not isinstance(input_data, dict) or not str(input_data.get('keyword', '')).strip():
+                raise ValueError('enqueue needs an input object with a keyword')
+            job_id = jobs.enqueue(input_data, int(payload.get('priority') or 0), payload.get('meta'))
+            wake.release()
+            return {'status': 'ok', 'job': jobs.get(job_id)}
+        if op == 'status':
+            job = jobs.get(int(payload.get('job_id') or 0))
+            if job is None:
+                return {'status': 'error', 'message': 'Job not found', 'code': 'JOB_NOT_FOUND'}
+            return {'status': 'ok', 'job': job}
+        if op == 'stored':
+            jobs.stored(int(payload['job_id']), payload.get('research_id'), payload.get('error'))
+            return {'status': 'ok'}
+        raise ValueError(f'unknown op: {op}')
+
+    preload()
+    for job_id, meta, result in jobs.recover(owner):
+        announce(job_id, meta, result)
+    workers = [threading.Thread(target=work, name=f'job-worker-{i}', daemon=True) for i in range(JOB_CONCURRENCY)]
+    for worker in workers:
+        worker.start()
+    logging.info(f"Keyword search job server {owner} running {JOB_CONCURRENCY} workers")
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        request_id = None
+        try:
+            payload = json.loads(line)
+            if not isinstance(payload, dict):
+                raise ValueError('request must be a JSON object')
+            request_id = payload.get('id')
+            result = handle(payload)
+        except Exception as e:
+            result = {'status': 'error', 'message': str(e)}
+        emit({'id': request_id, 'result': result})
+
+    stopping.set()
+    for _ in workers:
+        wake.release()
+    for worker in workers:
+        worker.join()
+    logging.info(f"Keyword search job server {owner} stdin closed, exiting")
+
+# Module import finished here; runs report it in metrics.import
+IMPORT_TIMES = (time.perf_counter() - _IMPORT_STARTED[0], time.process_time() - _IMPORT_STARTED[1])
+# Research runs served by this process (the first one is the cold start)
+_research_runs = 0
+
+def import_metrics():
+    """Module import and (once it has happened) spaCy model load cost for this process."""
+    metrics = {
+        'wall_ms': round(IMPORT_TIMES[0] * 1000, 1),
+        'cpu_ms': round(IMPORT_TIMES[1] * 1000, 1),
+        'cold': not _research_runs,
+    }
+    if MODEL_LOAD_TIMES is not None:
+        metrics['model_load_wall_ms'] = round(MODEL_LOAD_TIMES[0] * 1000, 1)
+        metrics['model_load_cpu_ms'] = round(MODEL_LOAD_TIMES[1] * 1000, 1)
+    return metrics
+
+def preload(pool=True):
+    """Load the tokenizer, stopwords and extractor up front (persistent workers only).
+
+    The analysis pool's workers are forked here too, before the caller starts any
+    request threads (unless pool is False: prefork workers are processes already
+    and analyze in-process).
+    """
+    get_nlp()
+    load_stop_words()
+    get_extractor()
+    get_numpy()
+    get_orjson()
+    if pool:
+        start_analysis_pool()
 
 def main():
+    # Persistent worker modes keep spaCy/NLTK loaded between requests:
+    #   keyword_search.py --serve            JSON lines over stdin/stdout
+    #   keyword_search.py --socket PATH      JSON lines over a unix socket
+    #   keyword_search.py --prefork PATH     the same, served by forked worker processes
+    # Batch mode (a JSON array or JSON lines on stdin, or forced with --batch)
+    # streams one JSON line per item.
+    #   keyword_search.py --jobs             queued research jobs (see serve_jobs)
+    #   keyword_search.py --warm-up          download models/data once (deploy step)
+    args = sys.argv[1:]
+    if '--warm-up' in args:
+        print(json.dumps(warm_up()))
+        return
+    if '--serve' in args:
+        serve_stdin()
+        return
+    if '--jobs' in args:
+        serve_jobs()
+        return
+    if '--socket' in args:
+        idx = args.index('--socket')
+        if idx + 1 >= len(args):
+            print(json.dumps({'status': 'error', 'message': '--socket requires a path'}))
+            return
+        serve_socket(args[idx + 1])
+        return
+    if '--prefork' in args:
+        idx = args.index('--prefork')
+        if idx + 1 >= len(args):
+            print(json.dumps({'status': 'error', 'message': '--prefork requires a path'}))
+            return
+        serve_prefork(args[idx + 1])
+        return
+
     # logging.info("Starting keyword search process")
     try:
         # Read input from stdin if available
         if not sys.stdin.isatty():
             try:
-                input_data = json.load(sys.stdin)
+                input_data = parse_input_text(sys.stdin.read())
             except json.JSONDecodeError as e:
                 logging.error(f"Failed to parse input JSON: {str(e)}")
                 print(json.dumps({
@@ -668,161 +3962,20 @@ def main():
                     'message': f'Invalid input JSON: {str(e)}'
                 }))
                 return
-            # Extract inputs
-            keyword = str(input_data.get('keyword', '')).strip()
-            location = str(input_data.get('location', '')).strip()
-            
-            api_key = os.environ.get("GOOGLE_CSE_API_KEY", "")
-            cx = os.environ.get("GOOGLE_CSE_CX", "")
-            # logging.info(f"Received input - keyword: {keyword}, location: {location}")
         else:
-            keyword = ""
-            location = ""
+            input_data = {}
             logging.warning("No input received, using default empty values")
-        
-        # Combine keyword and location
-        search_query = f"{keyword} {location}".strip()
-        # logging.info(f"Combined search query: {search_query}")
-        
-        if not search_query:
-            logging.error("No search query provided")
-            result = {
-                "status": "error",
-                "message": "No search query provided"
-            }
-        else:
-            # Use environment credentials obtained above
-            
-            # Perform the search
-            # logging.info("Performing Google search")
-            search_results = google_search_api(
-                query=search_query,
-                api_key=api_key,
-                cx=cx,
-                num_results=10,
-                language='lang_en',
-                country_restrict='countryAU'
-            )
-            
-            # NEW: fetch pages until we gather 3 good articles (accessible&scrapable)
-            if search_results.get('status') == 'success' and 'results' in search_results:
-                good_count = 0
-                for res in search_results['results']:
-                    if good_count >= 3:
-                        break
-                    # Skip if we already attempted this one
-                    if 'accessible' in res:
-                        if res.get('accessible') and res.get('scrapable'):
-                            good_count += 1
-                        continue
-
-                    html_page = fetch_page_html(res.get('url', ''))
-
-                    accessible = bool(html_page)
-                    main_text  = extract_main_text(html_page)
-                    scrapable  = bool(main_text)
-
-                    # Store diagnostic flags and data
-                    res['html']        = html_page  # keep raw until later cleanup
-                    res['main_text']   = main_text
-                    res['accessible']  = accessible
-                    res['scrapable']   = scrapable
-                    if not accessible:
-                        res['scrape_error'] = 'fetch_failed'
-                    elif not scrapable:
-                        res['scrape_error'] = 'no_main_text'
-                    else:
-                        res['scrape_error'] = ''
-                        good_count += 1
-            
-            if search_results['status'] == 'success' and 'results' in search_results:
-                # logging.info(f"Found {len(search_results['results'])} search results")
-                
-                # Validate search results structure
-                if not isinstance(search_results['results'], list):
-                    logging.error("Search results is not a list, converting to empty list")
-                    search_results['results'] = []
-                
-                # Extract all text from search results for keyword analysis
-                combined_text = extract_combined_text(search_results['results'])
-                
-                # Analyze keywords in the combined text
-                single_words, phrases, headers, header_hierarchy = analyze_keywords(combined_text)
-                # logging.info(f"Keyword analysis completed - {len(single_words)} words, {len(phrases)} phrases")
-                
-                # Validate keyword analysis results
-                if not isinstance(single_words, list):
-                    logging.warning("Single words is not a list, converting to empty list")
-                    single_words = []
-                if not isinstance(phrases, list):
-                    logging.warning("Phrases is not a list, converting to empty list")
-                    phrases = []
-                if not isinstance(headers, dict):
-                    logging.warning("Headers is not a dict, using default structure")
-                    headers = {'h1': [], 'h2': [], 'h3': []}
-                
-                # Format phrases for output
-                formatted_phrases = []
-                for phrase_data in phrases:
-                    # Validate phrase data structure
-                    if not isinstance(phrase_data, (list, tuple)) or len(phrase_data) < 3:
-                        logging.warning(f"Invalid phrase data format: {phrase_data}")
-                        continue
-                        
-                    phrase, frequency, metadata = phrase_data
-                    formatted_phrase = {
-                        'phrase': phrase,
-                        'frequency': frequency,
-                        'in_h1': metadata['in_h1'],
-                        'in_h2': metadata['in_h2'],
-                        'in_h3': metadata['in_h3'],
-                        'h1_frequency': metadata['h1_frequency'],
-                        'h2_frequency': metadata['h2_frequency'],
-                        'h3_frequency': metadata['h3_frequency'],
-                        'hierarchy_levels': metadata['hierarchy_levels'],
-                        'common_parent_header': metadata['common_parent_header']
-                    }
-                    formatted_phrases.append(formatted_phrase)
-                
-                # Add keyword analysis to the results
-                search_results['keyword_analysis'] = {
-                    'single_words': single_words,
-                    'phrases': formatted_phrases
-                }
-                search_results['header_analysis'] = headers
-                search_results['header_hierarchy'] = header_hierarchy
-                
-                # --- Garbage / nav-token filtering ---------------------------------
-                DIRTY_TOKENS = {
-                    'menu', 'close', 'keyboard_arrow_left', 'keyboard_arrow_right',
-                    'back', 'previous', 'close menu', 'menu close'
-                }
 
-                # Filter single words
-                single_words = [sw for sw in single_words if sw[0] not in DIRTY_TOKENS]
+        if '--batch' in args or isinstance(input_data, list):
+            run_batch(input_data if isinstance(input_data, list) else [input_data])
+            return
 
-                # Filter phrases containing any dirty token
-                formatted_phrases = [fp for fp in formatted_phrases if not any(tok in fp['phrase'] for tok in DIRTY_TOKENS)]
+        result = run_research(input_data)
 
-                # ------------------------------------------------------------------
-                
-                # Strip raw HTML before returning to backend to lighten payload
-                for r in search_results['results']:
-                    r.pop('html', None)
-                
-                # Re-order results so that accessible & scrapable ones come first
-                search_results['results'].sort(key=lambda x: (not x.get('accessible', False), not x.get('scrapable', False)))
-                
-                # logging.debug("Added keyword analysis and header analysis to results")
-            else:
-                logging.error(f"Search failed: {search_results.get('message', 'Unknown error')}")
-            
-            result = search_results
-        
-        # Print results as JSON
-        print(json.dumps(result))
+        # Write the result straight to the stdout pipe
+        write_json_line(result)
         # logging.info("Successfully completed and returned results")
-        
+
     except Exception as e:
         logging.error(f"Error in main function: {str(e)}")
         print(json.dumps({
@@ -831,4 +3984,4 @@ def main():
         }))
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main() 
@@ -0,0 +1,48 @@
+#!/usr/bin/env node
+// Rebuild the keyword_research_terms index from keyword_research, streaming rows in id
+// order a batch at a time. Rows are re-indexed one by one, so the app keeps serving
+// lookups while it runs.
+//
+//   node scripts/rebuild_keyword_index.mjs                 # re-index every row
+//   node scripts/rebuild_keyword_index.mjs --from-id 5000  # only rows with id > 5000
+//   node scripts/rebuild_keyword_index.mjs --fresh         # clear the index first
+//   node scripts/rebuild_keyword_index.mjs --batch-size 500
+//
+// Reads the same DB_* / BUSINESS_DB_* environment variables as the app.
+import { createRequire } from 'module';
+
+// logger.js loads fs/path through require(), which plain ESM does not define
+globalThis.require = globalThis.require || createRequire(import.meta.url);
+// Thousands of INSERTs: skip the per-query access log like production does
+process.env.NODE_ENV = process.env.NODE_ENV || 'production';
+
+const args = process.argv.slice(2);
+const option = (name, fallback) => {
+  const i = args.indexOf(name);
+  return i >= 0 && args[i + 1] !== undefined ? args[i + 1] : fallback;
+};
+
+const batchSize = parseInt(option('--batch-size', '200'), 10);
+const fromId = parseInt(option('--from-id', '0'), 10);
+const fresh = args.includes('--fresh');
+
+const { rebuildKeywordIndex } = await import('../src/lib/keywordIndex.js');
+const { closePool } = await import('../src/lib/database.js');
+
+const started = Date.now();
+try {
+  const totals = await rebuildKeywordIndex({
+    batchSize,
+    fromId,
+    fresh,
+    onBatch: ({ lastId, rows, terms }) => {
+      process.stderr.write(`indexed ${rows} rows (${terms} terms), last id ${lastId}\n`);
+    },
+  });
+  process.stdout.write(`${JSON.stringify({ ...totals, seconds: (Date.now() - started) / 1000 })}\n`);
+} catch (e) {
+  process.stderr.write(`Rebuild failed: ${e.message}\n`);
+  process.exitCode = 1;
+} finally {
+  await closePool();
+}
@@ -0,0 +1,247 @@
+import { executeBusinessQuery, executeBusinessTransaction } from './database.js';
+import logger from './logger.js';
+
+// Inverted index over keyword_research (keyword_research_terms): every phrase, single
+// word and result URL of a research row points back to the row with its frequency,
+// so "which researches contain X" is one indexed lookup instead of parsing every
+// search_results / extracted_keywords blob. insertKeywordResearch() indexes each new
+// row; rows deleted from keyword_research drop out through ON DELETE CASCADE, and
+// scripts/rebuild_keyword_index.mjs rebuilds the whole index offline.
+
+export const TERM_TYPES = ['phrase', 'word', 'url'];
+
+// Longest term stored (the column is VARCHAR(512)); longer ones are skipped
+const MAX_TERM_CHARS = 512;
+// Rows per multi-row INSERT
+const INSERT_BATCH = 500;
+// Researches a related-keyword suggestion looks at (the ones using the term most)
+const SUGGEST_SEED_RESEARCHES = 200;
+
+/**
+ * Normalize a term the way it is stored: phrases and words lowercased with single
+ * spaces, URLs without their fragment.
+ * @param {string} type - 'phrase', 'word' or 'url'
+ * @param {string} term
+ * @returns {string}
+ */
+export function normalizeTerm(type, term) {
+  const text = String(term ?? '').trim();
+  if (type !== 'url') {
+    return text.toLowerCase().split(/\s+/).filter(Boolean).join(' ');
+  }
+  try {
+    const url = new URL(text);
+    url.hash = '';
+    return url.href;
+  } catch {
+    return text;
+  }
+}
+
+/**
+ * The index entries of one research row.
+ * @param {{searchResults?: Array, extractedKeywords?: Object}} research - Parsed column values
+ * @returns {Array<[string, string, number]>} - [type, term, frequency]
+ */
+export function researchTerms({ searchResults, extractedKeywords }) {
+  const counts = new Map();
+  const add = (type, term, frequency) => {
+    const normalized = normalizeTerm(type, term);
+    if (!normalized || normalized.length > MAX_TERM_CHARS) return;
+    const key = `${type}\u0000${normalized}`;
+    const n = Number.isFinite(Number(frequency)) && Number(frequency) > 0 ? Math.round(Number(frequency)) : 1;
+    counts.set(key, (counts.get(key) || 0) + n);
+  };
+
+  for (const p of extractedKeywords?.phrases || []) {
+    // Stored as {phrase, frequency, ...}; older rows may hold [phrase, frequency]
+    if (Array.isArray(p)) add('phrase', p[0], p[1]);
+    else if (p?.phrase) add('phrase', p.phrase, p.frequency);
+  }
+  for (const w of extractedKeywords?.single_words || []) {
+    if (Array.isArray(w)) add('word', w[0], w[1]);
+  }
+  for (const r of searchResults || []) {
+    if (r?.url) add('url', r.url, 1);
+  }
+
+  return [...counts].map(([key, frequency]) => {
+    const [type, term] = key.split('\u0000');
+    return [type, term, frequency];
+  });
+}
+
+/**
+ * Parse the JSON columns of a keyword_research row (strings or already parsed).
+ * @returns {{searchResults: Array, extractedKeywords: Object}}
+ */
+export function parseResearchRow(row) {
+  const parse = (value, fallback) => {
+    if (value && typeof value === 'object') return value;
+    try { return JSON.parse(value || '') ?? fallback; } catch { return fallback; }
+  };
+  return {
+    searchResults: parse(row?.search_results, []),
+    extractedKeywords: parse(row?.extracted_keywords, {}),
+  };
+}
+
+/**
+ * (Re)index one research row: its previous entries are replaced.
+ * @param {number} keywordResearchId
+ * @param {{searchResults?: Array, extractedKeywords?: Object}} research
+ * @returns {Promise<number>} - Entries written
+ */
+export async function indexKeywordResearch(keywordResearchId, research) {
+  const terms = researchTerms(research);
+  // One transaction, so readers never see the row half indexed
+  const queries = [
+    { query: 'DELETE FROM keyword_research_terms WHERE keyword_research_id = ?', params: [keywordResearchId] },
+  ];
+  for (let i = 0; i < terms.length; i += INSERT_BATCH) {
+    const batch = terms.slice(i, i + INSERT_BATCH);
+    const params = [];
+    for (const [type, term, frequency] of batch) {
+      params.push(type, term, keywordResearchId, frequency);
+    }
+    queries.push({
+      query: `INSERT INTO keyword_research_terms (term_type, term, keyword_research_id, frequency)
+              VALUES ${batch.map(() => '(?, ?, ?, ?)').join(', ')}`,
+      params,
+    });
+  }
+  await executeBusinessTransaction(queries);
+  return terms.length;
+}
+
+/**
+ * Best-effort indexing after an insert: a missing table or failed write never fails
+ * the research request (rebuild_keyword_index.mjs catches up later).
+ */
+export async function indexKeywordResearchSafe(keywordResearchId, research) {
+  try {
+    return await indexKeywordResearch(keywordResearchId, research);
+  } catch (e) {
+    logger.warn('[keywordIndex] Failed to index keyword research', { id: keywordResearchId, error: e.message });
+    return 0;
+  }
+}
+
+const checkType = (type) => {
+  if (!TERM_TYPES.includes(type)) {
+    throw new Error(`Unknown term type "${type}" (expected ${TERM_TYPES.join(', ')})`);
+  }
+};
+
+const clampLimit = (limit, fallback, max = 100) => {
+  const n = parseInt(String(limit ?? ''), 10);
+  return Number.isFinite(n) && n > 0 ? Math.min(n, max) : fallback;
+};
+
+/**
+ * Past researches containing a phrase, word or URL, highest frequency first.
+ * @param {string} type - 'phrase', 'word' or 'url'
+ * @param {string} term
+ * @param {{limit?: number}} options
+ * @returns {Promise<Array<{id: number, keyword: string, location: string, created_at: string, frequency: number}>>}
+ */
+export async function findResearch(type, term, { limit } = {}) {
+  checkType(type);
+  const rows = await executeBusinessQuery(
+    `SELECT kr.id, kr.keyword, kr.location, kr.created_at, t.frequency
+       FROM keyword_research_terms t
+       JOIN keyword_research kr ON kr.id = t.keyword_research_id
+      WHERE t.term_type = ? AND t.term = ?
+      ORDER BY t.frequency DESC, kr.id DESC
+      LIMIT ${clampLimit(limit, 20)}`,
+    [type, normalizeTerm(type, term)]
+  );
+  return rows.map((r) => ({ ...r, frequency: Number(r.frequency) }));
+}
+
+/**
+ * Related keywords for a phrase, word or URL, from the researches that contain it:
+ * the keywords those researches were run for, and the phrases found alongside it
+ * (ranked by how many of those researches share them, then total frequency).
+ * @returns {Promise<{keywords: Array<{keyword: string, researches: number}>, phrases: Array<{phrase: string, researches: number, frequency: number}>}>}
+ */
+export async function suggestKeywords(type, term, { limit } = {}) {
+  checkType(type);
+  const normalized = normalizeTerm(type, term);
+  const max = clampLimit(limit, 20);
+  // The researches using the term most; every suggestion comes from these
+  const seed = `SELECT keyword_research_id FROM keyword_research_terms
+                 WHERE term_type = ? AND term = ?
+                 ORDER BY frequency DESC, keyword_research_id DESC
+                 LIMIT ${SUGGEST_SEED_RESEARCHES}`;
+
+  const keywords = await executeBusinessQuery(
+    `SELECT LOWER(kr.keyword) AS keyword, COUNT(*) AS researches
+       FROM (${seed}) s
+       JOIN keyword_research kr ON kr.id = s.keyword_research_id
+      GROUP BY LOWER(kr.keyword)
+      ORDER BY researches DESC, keyword
+      LIMIT ${max}`,
+    [type, normalized]
+  );
+  const phrases = await executeBusinessQuery(
+    `SELECT t.term AS phrase, COUNT(*) AS researches, SUM(t.frequency) AS frequency
+       FROM (${seed}) s
+       JOIN keyword_research_terms t ON t.keyword_research_id = s.keyword_research_id AND t.term_type = 'phrase'
+      WHERE t.term <> ?
+      GROUP BY t.term
+      ORDER BY researches DESC, frequency DESC, phrase
+      LIMIT ${max}`,
+    [type, normalized, normalized]
+  );
+
+  return {
+    keywords: keywords.map((r) => ({ keyword: r.keyword, researches: Number(r.researches) })),
+    phrases: phrases.map((r) => ({ phrase: r.phrase, researches: Number(r.researches), frequency: Number(r.frequency) })),
+  };
+}
+
+/**
+ * Rebuild the index from keyword_research, streaming rows in id order `batchSize` at a
+ * time (keyset pagination, so memory stays flat however many rows there are).
+ * @param {{batchSize?: number, fromId?: number, fresh?: boolean, onBatch?: Function}} options
+ *   fresh: clear the whole index first; onBatch({lastId, rows, terms}) reports progress
+ * @returns {Promise<{rows: number, terms: number, lastId: number}>}
+ */
+export async function rebuildKeywordIndex({ batchSize = 200, fromId = 0, fresh = false, onBatch } = {}) {
+  if (fresh) {
+    await executeBusinessQuery('DELETE FROM keyword_research_terms');
+  }
+  const size = clampLimit(batchSize, 200, 5000);
+  const totals = { rows: 0, terms: 0, lastId: Number(fromId) || 0 };
+  for (;;) {
+    const rows = await executeBusinessQuery(
+      `SELECT id, search_results, extracted_keywords FROM keyword_research
+        WHERE id > ? ORDER BY id LIMIT ${size}`,
+      [totals.lastId]
+    );
+    if (!rows.length) break;
+    let terms = 0;
+    for (const row of rows) {
+      terms += await indexKeywordResearch(row.id, parseResearchRow(row));
+      totals.lastId = row.id;
+    }
+    totals.rows += rows.length;
+    totals.terms += terms;
+    if (onBatch) onBatch({ lastId: totals.lastId, rows: totals.rows, terms: totals.terms });
+    if (rows.length < size) break;
+  }
+  return totals;
+}
+
+export default {
+  TERM_TYPES,
+  normalizeTerm,
+  researchTerms,
+  parseResearchRow,
+  indexKeywordResearch,
+  indexKeywordResearchSafe,
+  findResearch,
+  suggestKeywords,
+  rebuildKeywordIndex,
+};
@@ -0,0 +1,184 @@
+import { spawn } from 'child_process';
+import readline from 'readline';
+import logger from './logger.js';
+import { insertKeywordResearch } from './keywordResearch.js';
+
+// Queued keyword research (keyword_search.py --jobs).
+// The job server keeps its queue in SQLite (jobs.sqlite3 in the script's cache dir)
+// and runs KR_JOB_CONCURRENCY jobs at a time, highest priority first. We send it
+// {"id", "op", ...} lines and read back {"id", "result"}; finished jobs arrive as
+// {"event": "job_finished", "job", "meta", "result"} and are inserted into
+// keyword_research exactly like the inline path, then acknowledged with "stored".
+
+const OP_TIMEOUT_MS = 15000;
+const STDERR_TAIL_CHARS = 2000;
+
+// Single job server per server process (survives hot reloads like the DB pools)
+let server = globalThis.__app_krJobServer || null;
+
+const failPending = (s, err) => {
+  for (const { reject, timer } of s.pending.values()) {
+    clearTimeout(timer);
+    reject(err);
+  }
+  s.pending.clear();
+};
+
+const sendOp = (s, op) => {
+  const id = s.nextId++;
+  return new Promise((resolve, reject) => {
+    const timer = setTimeout(() => {
+      s.pending.delete(id);
+      reject(new Error(`Job server did not answer "${op.op}" within ${OP_TIMEOUT_MS}ms`));
+    }, OP_TIMEOUT_MS);
+    s.pending.set(id, { resolve, reject, timer });
+    try {
+      s.child.stdin.write(`${JSON.stringify({ ...op, id })}\n`);
+    } catch (e) {
+      clearTimeout(timer);
+      s.pending.delete(id);
+      reject(new Error(`Failed to write to job server: ${e.message}`));
+    }
+  });
+};
+
+// Write the keyword_research row for a finished job and tell the job server
+const storeFinishedJob = async (s, { job, meta, result }) => {
+  if (!job?.id || job.status !== 'finished') return;
+  try {
+    const { id } = await insertKeywordResearch({
+      keyword: meta?.keyword,
+      location: meta?.location,
+      createdBy: meta?.created_by || 'System',
+      pyResult: result || {},
+    });
+    await sendOp(s, { op: 'stored', job_id: job.id, research_id: id });
+    logger.info('[keywordJobs] Job stored', { job: job.id, id, keyword: meta?.keyword });
+  } catch (e) {
+    logger.warn('[keywordJobs] Failed to store job result', { job: job.id, error: e.message });
+    try {
+      await sendOp(s, { op: 'stored', job_id: job.id, error: e.message });
+    } catch {}
+  }
+};
+
+const startServer = (pythonPath, scriptPath) => {
+  const child = spawn(pythonPath, [scriptPath, '--jobs'], {
+    stdio: ['pipe', 'pipe', 'pipe'],
+    env: process.env,
+  });
+
+  const s = {
+    child,
+    pythonPath,
+    scriptPath,
+    pending: new Map(),
+    nextId: 1,
+    stderrTail: '',
+    alive: true,
+  };
+
+  const rl = readline.createInterface({ input: child.stdout });
+  rl.on('line', (line) => {
+    let msg;
+    try {
+      msg = JSON.parse(line);
+    } catch {
+      logger.debug('[keywordJobs] Ignoring non-JSON job server output', { line: line.slice(0, 200) });
+      return;
+    }
+    if (msg?.event === 'job_finished') {
+      storeFinishedJob(s, msg);
+      return;
+    }
+    const entry = s.pending.get(msg?.id);
+    if (!entry) return;
+    clearTimeout(entry.timer);
+    s.pending.delete(msg.id);
+    entry.resolve(msg.result);
+  });
+
+  child.stderr.on('data', (chunk) => {
+    s.stderrTail = (s.stderrTail + chunk.toString()).slice(-STDERR_TAIL_CHARS);
+  });
+
+  const onGone = (reason) => {
+    if (!s.alive) return;
+    s.alive = false;
+    if (server === s) {
+      server = null;
+      globalThis.__app_krJobServer = null;
+    }
+    const tail = s.stderrTail ? ` | stderr: ${s.stderrTail.slice(-800)}` : '';
+    failPending(s, new Error(`Job server ${reason}${tail}`));
+  };
+
+  child.on('error', (err) => onGone(`failed: ${err.message}`));
+  child.on('exit', (code, signal) => onGone(`exited with code ${code}${signal ? ` (${signal})` : ''}`));
+  child.stdin.on('error', (err) => onGone(`stdin error: ${err.message}`));
+
+  logger.info('[keywordJobs] Started Python job server', { pid: child.pid, python: pythonPath, scriptPath });
+  return s;
+};
+
+const getServer = (pythonPath, scriptPath) => {
+  if (server && server.alive && server.pythonPath === pythonPath && server.scriptPath === scriptPath) {
+    return server;
+  }
+  if (server && server.alive) {
+    stopJobServer();
+  }
+  server = startServer(pythonPath, scriptPath);
+  globalThis.__app_krJobServer = server;
+  return server;
+};
+
+const request = async (pythonPath, scriptPath, op) => {
+  const result = await sendOp(getServer(pythonPath, scriptPath), op);
+  if (result?.status !== 'ok') {
+    const err = new Error(result?.message || 'Job server request failed');
+    err.code = result?.code;
+    throw err;
+  }
+  return result;
+};
+
+/**
+ * Queue a research request.
+ * @param {string} pythonPath - Python executable
+ * @param {string} scriptPath - Path to keyword_search.py
+ * @param {Object} inputJson - Same input object the one-shot script reads from stdin
+ * @param {{priority?: number, meta: {keyword: string, location: string, created_by: string}}} options
+ * @returns {Promise<Object>} - The queued job (id, status, priority, position, ...)
+ */
+export const enqueueResearch = async (pythonPath, scriptPath, inputJson, { priority = 0, meta } = {}) => {
+  const { job } = await request(pythonPath, scriptPath, { op: 'enqueue', input: inputJson, priority, meta });
+  return job;
+};
+
+/**
+ * Current state of a job: status (queued, running, finished, done, error), progress,
+ * queue position and, once done, the keyword_research id.
+ * @returns {Promise<Object>}
+ */
+export const getJob = async (pythonPath, scriptPath, jobId) => {
+  const { job } = await request(pythonPath, scriptPath, { op: 'status', job_id: jobId });
+  return job;
+};
+
+// Stop the job server (it finishes its running jobs; queued ones wait for the next start)
+export const stopJobServer = () => {
+  const s = server;
+  if (!s) return;
+  server = null;
+  globalThis.__app_krJobServer = null;
+  s.alive = false;
+  failPending(s, new Error('Job server stopped'));
+  try { s.child.stdin.end(); } catch {}
+};
+
+export default {
+  enqueueResearch,
+  getJob,
+  stopJobServer,
+};
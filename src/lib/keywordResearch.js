@@ -0,0 +1,192 @@
+import { executeBusinessQuery } from './database.js';
+import logger from './logger.js';
+import { indexKeywordResearchSafe } from './keywordIndex.js';
+import { promises as fs } from 'fs';
+import path from 'path';
+
+// Shared helpers for the keyword research endpoints that run scripts/keyword_search.py
+// (python_search.js for one keyword, python_search_bulk.js for many).
+
+/**
+ * Resolve the Python binary and keyword_search.py path.
+ * Prefers KR_PYTHON / PYTHON_BIN, then a local virtualenv, then python3;
+ * KR_PY_SCRIPT overrides the script path.
+ * @returns {Promise<{pythonPath: string, scriptPath: string}>}
+ */
+export async function resolvePythonPaths() {
+  // Prefer local virtualenv if present
+  let PYTHON_BIN = process.env.KR_PYTHON || process.env.PYTHON_BIN || null;
+  if (!PYTHON_BIN) {
+    const venvCandidates = [
+      path.join(process.cwd(), '.venv', 'bin', 'python'),
+      path.join(process.cwd(), 'venv', 'bin', 'python'),
+    ];
+    for (const cand of venvCandidates) {
+      try { await fs.access(cand); PYTHON_BIN = cand; break; } catch {}
+    }
+    if (!PYTHON_BIN) PYTHON_BIN = 'python3';
+  }
+  // Allow explicit override of script path via env
+  let scriptPath = process.env.KR_PY_SCRIPT || null;
+  if (scriptPath) {
+    try {
+      await fs.access(scriptPath);
+    } catch {
+      // Log and fall back to default candidates
+      logger.warn('[keywordResearch] KR_PY_SCRIPT not found, falling back to default candidates', { scriptPath });
+      scriptPath = null;
+    }
+  }
+
+  if (!scriptPath) {
+    // Prefer project scripts/keyword_search.py; fallback to Doc reference path if needed
+    const scriptCandidates = [
+      path.join(process.cwd(), 'scripts', 'keyword_search.py'),
+      path.join(process.cwd(), 'Doc', 'Reference', 'admin_api', 'keyword_research', 'keyword_search.py'),
+    ];
+    for (const cand of scriptCandidates) {
+      try { await fs.access(cand); scriptPath = cand; break; } catch {}
+    }
+    if (!scriptPath) {
+      throw new Error('Python script not found. Expected at scripts/keyword_search.py or KR_PY_SCRIPT');
+    }
+  }
+
+  return { pythonPath: PYTHON_BIN, scriptPath };
+}
+
+// What keyword_search.py should send back (its `output` projection): only the fields
+// stored or returned here, snippets cut like buildResearchPayload does, and main_text
+// only for scraped pages, cut to what blog generation reads (5000 chars)
+export const RESEARCH_OUTPUT = {
+  fields: ['results', 'total_results', 'search_time', 'keyword_analysis', 'header_analysis', 'metrics'],
+  main_text_chars: 5000,
+  snippet_chars: 300,
+};
+
+// Identical research requests in flight in this server share one Python run
+// (kept on globalThis so it survives hot reloads like the DB pools)
+const inflight = globalThis.__app_krInflight || new Map();
+globalThis.__app_krInflight = inflight;
+
+/**
+ * Identity of a research request: keyword and location are compared case- and
+ * whitespace-insensitively, every other input field exactly.
+ * @param {Object} pythonInput - Input object for keyword_search.py
+ * @returns {string}
+ */
+export function researchKey(pythonInput) {
+  const norm = (v) => String(v || '').toLowerCase().split(/\s+/).filter(Boolean).join(' ');
+  const normalized = { ...pythonInput, keyword: norm(pythonInput.keyword), location: norm(pythonInput.location) };
+  return JSON.stringify(Object.keys(normalized).sort().map((k) => [k, normalized[k]]));
+}
+
+/**
+ * Run `run()` for a research request unless an identical one is already running,
+ * in which case its result is shared (its metrics are marked `coalesced`).
+ * @param {Object} pythonInput - Input object for keyword_search.py
+ * @param {() => Promise<Object>} run - Produces the script result
+ * @returns {Promise<Object>}
+ */
+export function coalesceResearch(pythonInput, run) {
+  const key = researchKey(pythonInput);
+  const existing = inflight.get(key);
+  if (existing) {
+    logger.info('[keywordResearch] Sharing in-flight research', { keyword: pythonInput.keyword, location: pythonInput.location });
+    return existing.then((result) => (result?.metrics ? { ...result, metrics: { ...result.metrics, coalesced: true } } : result));
+  }
+  const promise = Promise.resolve()
+    .then(run)
+    .finally(() => inflight.delete(key));
+  inflight.set(key, promise);
+  return promise;
+}
+
+/**
+ * Shape a successful keyword_search.py result into the keyword_research columns.
+ * @param {Object} pyResult - Script output
+ * @returns {{reducedResults: Array, extractedKeywords: Object}}
+ */
+export function buildResearchPayload(pyResult) {
+  // Extract fields similar to PHP implementation
+  const searchResults = Array.isArray(pyResult.results) ? pyResult.results : [];
+  // Ensure non-scrapable results don't carry main_text to reduce payload, like PHP
+  const reducedResults = searchResults.map((r) => {
+    const obj = { ...(r || {}) };
+    if (!obj.scrapable) delete obj.main_text;
+    if (typeof obj.snippet === 'string' && obj.snippet.length > 300) {
+      obj.snippet = `${obj.snippet.slice(0, 300)}...`;
+    }
+    return obj;
+  });
+
+  const headerAnalysis = pyResult.header_analysis || { h1: [], h2: [], h3: [] };
+  const keywordAnalysis = pyResult.keyword_analysis || { single_words: [], phrases: [] };
+
+  // Ensure required keys
+  const extractedKeywords = {
+    single_words: Array.isArray(keywordAnalysis.single_words) ? keywordAnalysis.single_words : [],
+    phrases: Array.isArray(keywordAnalysis.phrases) ? keywordAnalysis.phrases : [],
+    headers: headerAnalysis || { h1: [], h2: [], h3: [] },
+  };
+  // Ranked quality scores (TF-IDF, coverage, header points), when the script computed them
+  if (Array.isArray(keywordAnalysis.phrase_scores)) {
+    extractedKeywords.phrase_scores = keywordAnalysis.phrase_scores;
+  }
+
+  return { reducedResults, extractedKeywords };
+}
+
+/**
+ * Insert one keyword_research row from a script result (plus its metrics, when present)
+ * and add it to the keyword_research_terms index. Throws when the script reported an error.
+ * @returns {Promise<{id: number, reducedResults: Array, extractedKeywords: Object}>}
+ */
+export async function insertKeywordResearch({ keyword, location, createdBy, pyResult }) {
+  if (pyResult?.status === 'error') {
+    throw new Error(`Python script returned an error: ${pyResult.message || 'Unknown error'}`);
+  }
+
+  const { reducedResults, extractedKeywords } = buildResearchPayload(pyResult);
+
+  // Store in DB
+  const searchResultsJson = JSON.stringify(reducedResults);
+  const extractedKeywordsJson = JSON.stringify(extractedKeywords);
+
+  const insertSql = `INSERT INTO keyword_research (keyword, location, search_results, extracted_keywords, created_by, blog_generated)
+                     VALUES (?, ?, ?, ?, ?, 0)`;
+
+  const result = await executeBusinessQuery(insertSql, [
+    keyword,
+    location,
+    searchResultsJson,
+    extractedKeywordsJson,
+    createdBy,
+  ]);
+
+  const id = result?.insertId;
+  if (id && pyResult.metrics) {
+    await saveResearchMetrics(id, pyResult.metrics);
+  }
+  if (id) {
+    await indexKeywordResearchSafe(id, { searchResults: reducedResults, extractedKeywords });
+  }
+
+  return { id, reducedResults, extractedKeywords };
+}
+
+/**
+ * Keep the script's per-stage metrics next to the research row (keyword_research_metrics).
+ * Best-effort: a missing table or failed insert never fails the research request.
+ */
+export async function saveResearchMetrics(keywordResearchId, metrics) {
+  try {
+    const totalMs = Number.isFinite(metrics?.total?.wall_ms) ? Math.round(metrics.total.wall_ms) : null;
+    await executeBusinessQuery(
+      'INSERT INTO keyword_research_metrics (keyword_research_id, total_ms, metrics) VALUES (?, ?, ?)',
+      [keywordResearchId, totalMs, JSON.stringify(metrics)]
+    );
+  } catch (e) {
+    logger.warn('[keywordResearch] Failed to store research metrics', { id: keywordResearchId, error: e.message });
+  }
+}
@@ -0,0 +1,225 @@
+import { spawn } from 'child_process';
+import net from 'net';
+import readline from 'readline';
+import logger from './logger.js';
+
+// Persistent keyword_search.py worker (started with --serve).
+// The worker keeps spaCy/NLTK loaded and answers one JSON line per request,
+// so each research request skips the Python cold start.
+// Protocol: we write {"id", ...input} and read back {"id", "result"}. The worker
+// runs requests concurrently and answers in completion order, matched by id.
+// When a request times out its worker is retired: new requests go to a fresh
+// worker, and the old one is killed once its other requests have been answered,
+// so the abandoned request stops using CPU there.
+// With KR_PY_WORKER_SOCKET set, requests go instead to an already running
+// `keyword_search.py --prefork <socket>` server, one connection per request, so
+// several requests are analyzed at once by its forked workers.
+
+// Helper to parse integer envs safely
+const envInt = (val, fallback) => {
+  const n = parseInt(String(val ?? ''), 10);
+  return Number.isFinite(n) && n > 0 ? n : fallback;
+};
+
+const REQUEST_TIMEOUT_MS = envInt(process.env.KR_PY_WORKER_TIMEOUT_MS, 180000);
+const WORKER_SOCKET = process.env.KR_PY_WORKER_SOCKET || '';
+const STDERR_TAIL_CHARS = 2000;
+
+// Single worker per server process (survives hot reloads like the DB pools)
+let worker = globalThis.__app_krWorker || null;
+
+export const isWorkerEnabled = () => process.env.KR_PY_WORKER !== '0';
+
+const makeUnavailableError = (message) => {
+  const err = new Error(message);
+  err.code = 'KR_WORKER_UNAVAILABLE';
+  return err;
+};
+
+const failPending = (w, err) => {
+  for (const { reject, timer } of w.pending.values()) {
+    clearTimeout(timer);
+    reject(err);
+  }
+  w.pending.clear();
+};
+
+// Kill a retired worker once nothing but abandoned requests is left on it
+const killIfIdle = (w) => {
+  if (w.pending.size || !w.alive) return;
+  logger.info('[keywordWorker] Killing retired Python worker', { pid: w.child.pid });
+  try { w.child.kill('SIGKILL'); } catch {}
+};
+
+// Stop routing requests to a worker and kill it when its other requests are done
+const retireWorker = (w) => {
+  if (w.retired) return;
+  w.retired = true;
+  if (worker === w) {
+    worker = null;
+    globalThis.__app_krWorker = null;
+  }
+  killIfIdle(w);
+};
+
+const startWorker = (pythonPath, scriptPath) => {
+  const child = spawn(pythonPath, [scriptPath, '--serve'], {
+    stdio: ['pipe', 'pipe', 'pipe'],
+    env: process.env,
+  });
+
+  const w = {
+    child,
+    pythonPath,
+    scriptPath,
+    pending: new Map(),
+    nextId: 1,
+    stderrTail: '',
+    alive: true,
+    retired: false,
+  };
+
+  const rl = readline.createInterface({ input: child.stdout });
+  rl.on('line', (line) => {
+    let msg;
+    try {
+      msg = JSON.parse(line);
+    } catch {
+      // Anything that is not a protocol line (e.g. third-party prints) is ignored
+      logger.debug('[keywordWorker] Ignoring non-JSON worker output', { line: line.slice(0, 200) });
+      return;
+    }
+    const entry = w.pending.get(msg?.id);
+    if (!entry) return;
+    clearTimeout(entry.timer);
+    w.pending.delete(msg.id);
+    entry.resolve(msg.result);
+    if (w.retired) killIfIdle(w);
+  });
+
+  child.stderr.on('data', (chunk) => {
+    w.stderrTail = (w.stderrTail + chunk.toString()).slice(-STDERR_TAIL_CHARS);
+  });
+
+  const onGone = (reason) => {
+    if (!w.alive) return;
+    w.alive = false;
+    if (worker === w) {
+      worker = null;
+      globalThis.__app_krWorker = null;
+    }
+    const tail = w.stderrTail ? ` | stderr: ${w.stderrTail.slice(-800)}` : '';
+    failPending(w, makeUnavailableError(`Python worker ${reason}${tail}`));
+  };
+
+  child.on('error', (err) => onGone(`failed: ${err.message}`));
+  child.on('exit', (code, signal) => onGone(`exited with code ${code}${signal ? ` (${signal})` : ''}`));
+  child.stdin.on('error', (err) => onGone(`stdin error: ${err.message}`));
+
+  logger.info('[keywordWorker] Started persistent Python worker', { pid: child.pid, python: pythonPath, scriptPath });
+  return w;
+};
+
+const getWorker = (pythonPath, scriptPath) => {
+  if (worker && worker.alive && worker.pythonPath === pythonPath && worker.scriptPath === scriptPath) {
+    return worker;
+  }
+  if (worker && worker.alive) {
+    // Python binary or script changed (e.g. env edit in dev) - replace the worker
+    stopWorker();
+  }
+  worker = startWorker(pythonPath, scriptPath);
+  globalThis.__app_krWorker = worker;
+  return worker;
+};
+
+// One request over its own connection to the prefork server
+const runSocketRequest = (socketPath, inputJson) => new Promise((resolve, reject) => {
+  const conn = net.createConnection(socketPath);
+  let settled = false;
+  let answered = false;
+  const finish = (fn, value) => {
+    if (settled) return;
+    settled = true;
+    clearTimeout(timer);
+    conn.destroy();
+    fn(value);
+  };
+  const timer = setTimeout(() => {
+    finish(reject, new Error(`Python worker timed out after ${REQUEST_TIMEOUT_MS}ms`));
+  }, REQUEST_TIMEOUT_MS);
+
+  const rl = readline.createInterface({ input: conn });
+  rl.on('line', (line) => {
+    let msg;
+    try {
+      msg = JSON.parse(line);
+    } catch {
+      return;
+    }
+    answered = true;
+    finish(resolve, msg.result);
+  });
+  rl.on('error', () => {}); // socket errors are handled below
+  conn.on('connect', () => conn.write(`${JSON.stringify({ ...inputJson, id: 1 })}\n`));
+  // Refused / missing socket: the server is not running, so callers fall back
+  conn.on('error', (err) => finish(reject, makeUnavailableError(`Prefork server unavailable: ${err.message}`)));
+  conn.on('close', () => {
+    if (!answered) finish(reject, makeUnavailableError('Prefork server closed the connection without a response'));
+  });
+});
+
+/**
+ * Send one research request to the persistent worker.
+ * Rejects with code KR_WORKER_UNAVAILABLE when the worker cannot be started or dies,
+ * so callers can fall back to a one-shot run.
+ * @param {string} pythonPath - Python executable
+ * @param {string} scriptPath - Path to keyword_search.py
+ * @param {Object} inputJson - Same input object the one-shot script reads from stdin
+ * @returns {Promise<Object>} - The script's result JSON
+ */
+export const runWorkerRequest = (pythonPath, scriptPath, inputJson) => {
+  if (WORKER_SOCKET) return runSocketRequest(WORKER_SOCKET, inputJson);
+  let w;
+  try {
+    w = getWorker(pythonPath, scriptPath);
+  } catch (e) {
+    return Promise.reject(makeUnavailableError(`Failed to start Python worker: ${e.message}`));
+  }
+
+  const id = w.nextId++;
+  return new Promise((resolve, reject) => {
+    const timer = setTimeout(() => {
+      w.pending.delete(id);
+      reject(new Error(`Python worker timed out after ${REQUEST_TIMEOUT_MS}ms`));
+      logger.warn('[keywordWorker] Request timed out, retiring Python worker', { pid: w.child.pid, pending: w.pending.size });
+      retireWorker(w);
+    }, REQUEST_TIMEOUT_MS);
+    w.pending.set(id, { resolve, reject, timer });
+
+    try {
+      w.child.stdin.write(`${JSON.stringify({ ...inputJson, id })}\n`);
+    } catch (e) {
+      clearTimeout(timer);
+      w.pending.delete(id);
+      reject(makeUnavailableError(`Failed to write to Python worker: ${e.message}`));
+    }
+  });
+};
+
+// Stop the worker (closing stdin lets it finish the running requests and exit)
+export const stopWorker = () => {
+  const w = worker;
+  if (!w) return;
+  worker = null;
+  globalThis.__app_krWorker = null;
+  w.alive = false;
+  failPending(w, makeUnavailableError('Python worker stopped'));
+  try { w.child.stdin.end(); } catch {}
+};
+
+export default {
+  isWorkerEnabled,
+  runWorkerRequest,
+  stopWorker,
+};
@@ -0,0 +1,32 @@
+import logger from '../../../../lib/logger.js';
+import { TERM_TYPES, findResearch, suggestKeywords } from '../../../../lib/keywordIndex.js';
+
+// Past researches containing a phrase, word or URL, from the keyword_research_terms
+// index: GET ?phrase=solar panels (or ?word= / ?url=), optional limit, and
+// suggest=1 for related keywords and phrases from those researches.
+export default async function handler(req, res) {
+  if (req.method !== 'GET') {
+    res.setHeader('Allow', ['GET']);
+    return res.status(405).json({ status: 'error', message: 'Method Not Allowed' });
+  }
+
+  const type = TERM_TYPES.find((t) => typeof req.query[t] === 'string' && req.query[t].trim());
+  if (!type) {
+    return res.status(400).json({ status: 'error', message: 'One of phrase, word or url is required' });
+  }
+  const term = req.query[type];
+
+  try {
+    const started = Date.now();
+    const researches = await findResearch(type, term, { limit: req.query.limit });
+    const response = { status: 'success', type, term, researches };
+    if (req.query.suggest === '1') {
+      response.suggestions = await suggestKeywords(type, term, { limit: req.query.limit });
+    }
+    response.took_ms = Date.now() - started;
+    return res.status(200).json(response);
+  } catch (e) {
+    logger.error('[index_search] Index lookup failed', { type, term, error: e.message });
+    return res.status(500).json({ status: 'error', message: 'Index lookup failed', technical_details: e.message });
+  }
+}
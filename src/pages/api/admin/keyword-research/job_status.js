@@ -0,0 +1,44 @@
+import logger from '../../../../lib/logger.js';
+import { getJob } from '../../../../lib/keywordJobs.js';
+import { resolvePythonPaths } from '../../../../lib/keywordResearch.js';
+
+// Status of a research job queued with python_search.js ({ "async": true }).
+// status: queued (with position), running (with progress), finished (row being
+// written), done (with the keyword_research id) or error (with the message).
+export default async function handler(req, res) {
+  if (req.method !== 'GET') {
+    res.setHeader('Allow', ['GET']);
+    return res.status(405).json({ status: 'error', message: 'Method Not Allowed' });
+  }
+
+  const jobId = parseInt(String(req.query.id ?? ''), 10);
+  if (!Number.isFinite(jobId) || jobId <= 0) {
+    return res.status(400).json({ status: 'error', message: 'ID parameter is required' });
+  }
+
+  try {
+    const { pythonPath, scriptPath } = await resolvePythonPaths();
+    const job = await getJob(pythonPath, scriptPath, jobId);
+    return res.status(200).json({
+      status: 'success',
+      job_id: job.id,
+      job_status: job.status,
+      priority: job.priority,
+      position: job.position,
+      progress: job.progress,
+      id: job.research_id,
+      error: job.error,
+      keyword: job.meta?.keyword,
+      location: job.meta?.location,
+      created_at: job.created_at,
+      started_at: job.started_at,
+      finished_at: job.finished_at,
+    });
+  } catch (e) {
+    if (e.code === 'JOB_NOT_FOUND') {
+      return res.status(404).json({ status: 'error', message: `Job ${jobId} not found` });
+    }
+    logger.error('[job_status] Failed to read job', { job: jobId, error: e.message });
+    return res.status(500).json({ status: 'error', message: 'Failed to read job status', technical_details: e.message });
+  }
+}
@@ -0,0 +1,135 @@
+import logger from '../../../../lib/logger.js';
+import { resolvePythonPaths, insertKeywordResearch, RESEARCH_OUTPUT } from '../../../../lib/keywordResearch.js';
+import { spawn } from 'child_process';
+import readline from 'readline';
+
+// Bulk keyword research: one keyword_search.py --batch run for many keywords.
+// Items are written to the script as JSON lines; each finished item comes back as
+// {"index", "keyword", "location", "result"} and is inserted as soon as it arrives.
+
+const MAX_ITEMS = 50;
+
+/**
+ * Run keyword_search.py in batch mode, calling onItem for every streamed result line.
+ * @returns {Promise<void>} Resolves when the script exits
+ */
+function runPythonBatch(pythonPath, scriptPath, items, onItem) {
+  return new Promise((resolve, reject) => {
+    const child = spawn(pythonPath, [scriptPath, '--batch'], {
+      stdio: ['pipe', 'pipe', 'pipe'],
+      env: process.env,
+    });
+
+    let stderrTail = '';
+    const pendingInserts = [];
+
+    const rl = readline.createInterface({ input: child.stdout });
+    rl.on('line', (line) => {
+      let msg;
+      try {
+        msg = JSON.parse(line);
+      } catch {
+        logger.debug('[python_search_bulk] Ignoring non-JSON output', { line: line.slice(0, 200) });
+        return;
+      }
+      if (!Number.isInteger(msg?.index)) return;
+      pendingInserts.push(onItem(msg));
+    });
+
+    child.stderr.on('data', (chunk) => {
+      stderrTail = (stderrTail + chunk.toString()).slice(-2000);
+    });
+
+    child.on('error', reject);
+    child.on('close', (code) => {
+      Promise.allSettled(pendingInserts).then(() => {
+        if (code === 0) return resolve();
+        const first = stderrTail ? stderrTail.slice(-800) : '';
+        reject(new Error(`Python exited with code ${code}${first ? ` | stderr: ${first}` : ''}`));
+      });
+    });
+
+    child.stdin.on('error', () => {});
+    child.stdin.end(items.map((item) => JSON.stringify(item)).join('\n') + '\n');
+  });
+}
+
+export default async function handler(req, res) {
+  if (req.method !== 'POST') {
+    res.setHeader('Allow', ['POST']);
+    return res.status(405).json({ status: 'error', message: 'Invalid request method. Only POST is allowed.' });
+  }
+
+  try {
+    const body = typeof req.body === 'string' ? JSON.parse(req.body || '{}') : (req.body || {});
+
+    const rawItems = Array.isArray(body.items) ? body.items : [];
+    if (rawItems.length === 0) {
+      throw new Error('items must be a non-empty array of { keyword, location }');
+    }
+    if (rawItems.length > MAX_ITEMS) {
+      throw new Error(`At most ${MAX_ITEMS} keywords can be researched per request`);
+    }
+
+    const createdBy = body.created_by || 'System';
+    const defaultLocation = body.location || 'Australia';
+    const defaultEngine = body.search_engine || 'google.com.au';
+
+    const items = rawItems.map((item) => {
+      const keyword = typeof item === 'string' ? item : item?.keyword;
+      if (!keyword || typeof keyword !== 'string') {
+        throw new Error('Every item needs a keyword');
+      }
+      const pythonInput = {
+        keyword,
+        location: item?.location || defaultLocation,
+        search_engine: item?.search_engine || defaultEngine,
+        output: RESEARCH_OUTPUT,
+      };
+      if (body.use_gemini_enhancement) pythonInput.use_gemini_enhancement = true;
+      if (body.company_info) pythonInput.company_info = body.company_info;
+      return pythonInput;
+    });
+
+    const { pythonPath: PYTHON_BIN, scriptPath } = await resolvePythonPaths();
+    logger.info('[python_search_bulk] Executing Python batch', { python: PYTHON_BIN, scriptPath, count: items.length });
+
+    const results = new Array(items.length).fill(null);
+    await runPythonBatch(PYTHON_BIN, scriptPath, items, async ({ index, result }) => {
+      const { keyword, location } = items[index] || {};
+      if (!keyword) return;
+      try {
+        const { id } = await insertKeywordResearch({ keyword, location, createdBy, pyResult: result || {} });
+        results[index] = { index, keyword, location, status: 'success', id };
+      } catch (e) {
+        logger.warn('[python_search_bulk] Item failed', { index, keyword, error: e.message });
+        results[index] = { index, keyword, location, status: 'error', message: e.message };
+      }
+    });
+
+    // Items the script never reported (e.g. it crashed mid-batch)
+    items.forEach((item, index) => {
+      if (!results[index]) {
+        results[index] = { index, keyword: item.keyword, location: item.location, status: 'error', message: 'No result returned' };
+      }
+    });
+
+    const succeeded = results.filter((r) => r.status === 'success').length;
+    return res.status(200).json({ status: 'success', total: items.length, succeeded, results });
+  } catch (e) {
+    try {
+      logger.error('[python_search_bulk] Bulk keyword research failed', { error: e.message, stack: e.stack });
+    } catch {}
+    const hint = (!process.env.GOOGLE_CSE_API_KEY || !process.env.GOOGLE_CSE_CX)
+      ? 'Missing GOOGLE_CSE_API_KEY or GOOGLE_CSE_CX environment variables.'
+      : undefined;
+    // Mirror python_search.js: 200 with error json
+    return res.status(200).json({
+      status: 'error',
+      message: 'There was an issue with your bulk keyword research request. Please try again.',
+      technical_details: e.message,
+      hint,
+      code: 'KEYWORD_RESEARCH_ERROR',
+    });
+  }
+}
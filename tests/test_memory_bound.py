@@ -0,0 +1,138 @@
+"""Peak memory of the fetch -> parse -> analyze path grows far slower than the page.
+
+Pages are served by a stubbed HTTP session, so the test runs offline: each page
+goes through fetch_page_html()'s streamed read, scrape_candidate()'s parse (the
+raw HTML is dropped there) and the chunked per-document analysis, exactly as in
+run_research(). Larger pages repeat the same paragraphs, so the counts do not
+grow; what is bounded is the working memory of the pipeline.
+
+Run with:  python -m pytest -q tests
+"""
+import datetime
+import html
+import io
+import os
+import sys
+import tracemalloc
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+
+import keyword_search as ks  # noqa: E402
+
+PAGES_DIR = os.path.join(ROOT, 'scripts', 'benchmark', 'fixtures', 'pages')
+# Page sizes, as multiples of the base page (itself a few tokenizer chunks long)
+SCALES = (1, 2, 4)
+# Allowed peak growth from the base page to each larger one. Only the page's own
+# text is kept whole, so the peak grows about 1.2x at 4x; holding all of its tokens
+# and normalized text at once, as before streaming, reaches about 3x.
+MAX_RATIO = 1.3
+
+
+class StubRaw:
+    """urllib3-like body stream handing out whatever is asked for, as read1() does."""
+    connection = None
+
+    def __init__(self, body):
+        self.stream = io.BytesIO(body)
+
+    def read1(self, amt=-1, decode_content=True):
+        return self.stream.read1(amt)
+
+
+class StubResponse:
+    status_code = 200
+    elapsed = datetime.timedelta(0)
+
+    def __init__(self, body):
+        self.headers = {'content-type': 'text/html; charset=utf-8'}
+        self.raw = StubRaw(body)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class StubSession:
+    def __init__(self, pages):
+        self.pages = pages
+
+    def get(self, url, **kwargs):
+        return StubResponse(self.pages[url])
+
+
+def base_paragraphs():
+    """Paragraphs of the fixture page with the most text, repeated to two tokenizer chunks.
+
+    They appear at least twice, so even the base page ends with its counts complete
+    and the pages differ only in length, not in vocabulary.
+    """
+    largest = ''
+    for name in sorted(os.listdir(PAGES_DIR)):
+        if name.endswith('.html'):
+            with open(os.path.join(PAGES_DIR, name), 'rb') as f:
+                text = ks.parse_document(f.read()).text
+            if len(text) > len(largest):
+                largest = text
+    words = largest.split()
+    paragraphs = [html.escape(' '.join(words[i:i + 80])) for i in range(0, len(words), 80)]
+    grown = paragraphs * 2
+    while sum(len(p) + 1 for p in grown) < 2 * ks.TOKENIZE_CHUNK_CHARS:
+        grown += paragraphs
+    return grown
+
+
+def build_page(paragraphs, copies, index):
+    body = ''.join(f'<p>{p}</p>\n' for p in paragraphs * copies)
+    return (f'<html><head><title>Guide {index}</title></head><body>'
+            f'<h1>Guide {index}</h1><h2>Overview</h2>{body}</body></html>').encode('utf-8')
+
+
+def research_peak_mb(pages):
+    """Peak traced memory of scraping and analyzing `pages` ({url: html bytes})."""
+    results = [{'url': url, 'title': '', 'snippet': ''} for url in pages]
+    ks.get_extractor()[1]()  # trafilatura's seen-segment cache, as run_research() clears it
+    tracemalloc.start()
+    try:
+        ks.scrape_top_results(results, needed=len(results))
+        single, phrases, _, _ = ks.analyze_documents(ks.extract_documents(results))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert all(r.get('document') is not None for r in results)
+    assert 'html' not in results[0]
+    assert single and phrases
+    return peak / (1024 * 1024)
+
+
+@pytest.fixture
+def stub_http(monkeypatch):
+    """Serve pages from memory instead of the network."""
+    pages = {}
+    session = StubSession(pages)
+    monkeypatch.setattr(ks, 'get_host_session', lambda host: session)
+    monkeypatch.setattr(ks, 'get_http_session', lambda: session)
+    return pages
+
+
+def test_peak_memory_stays_bounded_as_pages_grow(stub_http, monkeypatch):
+    monkeypatch.setattr(ks, 'ANALYSIS_PROCESSES', 1)  # traced memory is this process only
+    paragraphs = base_paragraphs()
+
+    peaks = {}
+    for scale in SCALES:
+        stub_http.clear()
+        stub_http[f'http://example.test/{scale}'] = build_page(paragraphs, scale, scale)
+        research_peak_mb(stub_http)  # warm-up: model, vocab and regex caches
+        peaks[scale] = research_peak_mb(stub_http)
+
+    base = peaks[SCALES[0]]
+    for scale in SCALES[1:]:
+        assert peaks[scale] / base <= MAX_RATIO, (
+            f'peak {peaks[scale]:.1f}MB for a {scale}x page vs {base:.1f}MB for 1x '
+            f'(limit {MAX_RATIO}x): {peaks}'
+        )